@@ -3,4 +3,24 @@ APPAUTHOR = "wetenschaap"
 from .flir import *
 from .thor import *
 from .dummy import *
-from .connect import *
\ No newline at end of file
+from .replay import *
+from .framebuffer import *
+from .metadata import *
+from .waiting import *
+from .scheduling import *
+from .stages import *
+from .recorder import *
+from .aio import *
+from .group import *
+from .workers import *
+from .accumulators import *
+from .demosaic import *
+from .backends import *
+from .sessions import *
+from .instrumentation import *
+from .autoexposure import *
+from .hdr import *
+from .broadcast import *
+from .calibration import *
+from .simulators import *
+from .connect import *
@@ -0,0 +1,21 @@
+"""
+Command line entry point, run as `python -m pyunicam <command>`. Available commands:
+
+    bench   benchmark the capture hot paths of a camera, see pyunicam.bench
+"""
+import sys
+
+def main(argv : list|None = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(__doc__.strip())
+        return
+    command, rest = argv[0], argv[1:]
+    if command == "bench":
+        from .bench import main as benchMain
+        benchMain(rest)
+    else:
+        sys.exit(f"unknown command '{command}', try `python -m pyunicam --help`")
+
+if __name__ == "__main__":
+    main()
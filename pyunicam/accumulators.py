@@ -0,0 +1,162 @@
+"""
+Streaming per-pixel statistics of a stack of frames, without keeping the stack. A FrameStatistics is a capture stage (see pyunicam.stages) that updates the per-pixel mean, variance, minimum and maximum in place as frames arrive, and optionally an approximate median (or other percentile). This way, a background image of 10000 frames takes about as much memory as a background image of 10 frames.
+"""
+import numpy as np
+from .stages import CaptureStage
+
+class FrameStatistics(CaptureStage):
+    def __init__(self, median : bool = False, percentile : float = 50, medianBase : int = 11):
+        """
+        Accumulate per-pixel statistics of every captured frame. Attach to a camera using cam.addStage, or feed frames yourself using update. Statistics are reset at every startCapture.
+
+        Parameters
+        ----------
+        median : bool, optional
+            Also estimate the per-pixel median (or other percentile), see Remedian, by default False. This costs some memory and time per frame.
+        percentile : float, optional
+            Percentile to estimate if median, by default 50 (the median).
+        medianBase : int, optional
+            Number of frames per level of the median estimate, see Remedian, by default 11.
+
+        Example
+        ------
+        stats = FrameStatistics(median = True)
+        cam.addStage(stats)
+        cam.startCapture()
+        time.sleep(60)
+        cam.stopCapture()
+        background = stats.median()
+        """
+        self.remedian = Remedian(medianBase, percentile) if median else None
+        self.reset()
+
+    def reset(self):
+        """
+        Forget all frames seen so far.
+        """
+        self.count = 0
+        self.mean = None
+        self.min = None
+        self.max = None
+        self._m2 = None # sum of squared differences from the mean, see Welford's algorithm
+        self._delta = None
+        if self.remedian is not None:
+            self.remedian.reset()
+
+    def start(self, cam):
+        self.reset()
+
+    def process(self, frame : np.ndarray, meta : np.ndarray):
+        self.update(frame)
+
+    def update(self, frame : np.ndarray):
+        """
+        Add a frame to the statistics.
+        """
+        if self.count == 0:
+            self.mean = frame.astype(np.float64)
+            self._m2 = np.zeros(frame.shape, dtype=np.float64)
+            self._delta = np.empty(frame.shape, dtype=np.float64)
+            self.min = frame.copy()
+            self.max = frame.copy()
+        else:
+            # Welford's algorithm, in place: with delta = frame - mean, mean += delta/n and m2 += delta**2 * (n-1)/n
+            n = self.count + 1
+            np.subtract(frame, self.mean, out=self._delta)
+            self._delta *= 1 / n
+            self.mean += self._delta
+            np.multiply(self._delta, self._delta, out=self._delta)
+            self._delta *= n * (n - 1)
+            self._m2 += self._delta
+            np.minimum(self.min, frame, out=self.min)
+            np.maximum(self.max, frame, out=self.max)
+        self.count += 1
+        if self.remedian is not None:
+            self.remedian.update(frame)
+
+    def variance(self, ddof : int = 0) -> np.ndarray:
+        """
+        Per-pixel variance, with ddof like numpy.var.
+        """
+        self._checkCount()
+        return self._m2 / max(self.count - ddof, 1)
+
+    def std(self, ddof : int = 0) -> np.ndarray:
+        """
+        Per-pixel standard deviation, with ddof like numpy.std.
+        """
+        return np.sqrt(self.variance(ddof))
+
+    def sum(self) -> np.ndarray:
+        """
+        Per-pixel sum of all frames.
+        """
+        self._checkCount()
+        return self.mean * self.count
+
+    def median(self) -> np.ndarray:
+        """
+        Approximate per-pixel median (or the percentile given at construction), see Remedian.
+        """
+        if self.remedian is None:
+            raise ValueError("the median is only estimated if you ask for it, use FrameStatistics(median = True)")
+        self._checkCount()
+        return self.remedian.result()
+
+    def _checkCount(self):
+        if self.count == 0:
+            raise ValueError("no frames were added yet")
+
+class Remedian(object):
+    def __init__(self, base : int = 11, percentile : float = 50):
+        """
+        Approximate per-pixel median of a stream of frames, using the remedian (Rousseeuw & Bassett, 1990). Frames are collected in a buffer of base frames; once full, its median goes into the buffer of the next level, and so on. Memory grows with the logarithm of the number of frames: 10000 frames take 4 levels of 11 frames (for base 11).
+
+        The estimate is exact for fewer than base frames, and close to the true median for larger stacks. Other percentiles are estimated the same way, but get biased towards the median at every level, so use them with care.
+
+        Parameters
+        ----------
+        base : int, optional
+            Number of frames per level, by default 11. Larger is more accurate but uses more memory.
+        percentile : float, optional
+            Percentile to estimate, by default 50 (the median).
+        """
+        self.base = base
+        self.percentile = percentile
+        self.reset()
+
+    def reset(self):
+        self.levels = list() # one buffer of base frames per level
+        self.counts = list() # number of frames in each buffer
+
+    def update(self, frame : np.ndarray):
+        """
+        Add a frame.
+        """
+        self._push(0, frame)
+
+    def _push(self, level : int, values : np.ndarray):
+        if level == len(self.levels):
+            dtype = values.dtype if level == 0 else np.float32 # level 0 holds raw frames
+            self.levels.append(np.empty((self.base,) + values.shape, dtype=dtype))
+            self.counts.append(0)
+        self.levels[level][self.counts[level]] = values
+        self.counts[level] += 1
+        if self.counts[level] == self.base:
+            self.counts[level] = 0
+            self._push(level + 1, np.percentile(self.levels[level], self.percentile, axis=0))
+
+    def result(self) -> np.ndarray:
+        """
+        Return the current estimate. Combines the partially filled buffers of all levels, weighing every value by the number of frames it stands for.
+        """
+        entries = [buffer[:count] for buffer, count in zip(self.levels, self.counts) if count > 0]
+        if len(entries) == 1 and self.counts[0] > 0:
+            return np.percentile(entries[0], self.percentile, axis=0)
+        weights = np.concatenate([np.full(count, self.base ** level) for level, count in enumerate(self.counts) if count > 0])
+        values = np.concatenate([e.astype(np.float32) for e in entries])
+        order = np.argsort(values, axis=0)
+        values = np.take_along_axis(values, order, axis=0)
+        cumulative = np.cumsum(weights[order], axis=0)
+        index = np.argmax(cumulative >= cumulative[-1] * self.percentile / 100, axis=0)
+        return np.take_along_axis(values, index[np.newaxis], axis=0)[0]
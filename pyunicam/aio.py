@@ -0,0 +1,94 @@
+"""
+Asyncio interface to the cameras. A single acquisition thread per camera (see pyunicam.stages) collects the frames into a small buffer and wakes up the event loop, so one event loop can serve several cameras without a thread hop per frame:
+
+    async with cam.capture():
+        async for frame in cam.frames():
+            ...
+
+Blocking calls like setProperty have awaitable versions on the camera (setPropertyAsync, etc.), which run on a worker thread of their own per camera.
+"""
+import asyncio
+from .stages import CaptureStage
+from .framebuffer import FrameRingBuffer
+from .metadata import FRAME_METADATA_DTYPE
+
+class AsyncCapture(CaptureStage):
+    def __init__(self, cam, maxQueuedFrames : int = 32, overflowPolicy : str = "dropOldest"):
+        """
+        Capture frames from cam for use with asyncio. Use as an async context manager, which starts and stops capturing. Made by cam.capture().
+
+        Parameters
+        ----------
+        cam : UniversalCam
+            Camera to capture with.
+        maxQueuedFrames : int, optional
+            Number of frames that can wait for the event loop, by default 32.
+        overflowPolicy : str, optional
+            What to do with new frames if the event loop does not keep up, see pyunicam.framebuffer.OVERFLOW_POLICIES, by default "dropOldest".
+        """
+        self.cam = cam
+        self.maxQueuedFrames = maxQueuedFrames
+        self.overflowPolicy = overflowPolicy
+        self.buffer = None
+        self.stopped = True
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        self.frameReady = asyncio.Event()
+        self.cam.addStage(self)
+        self.cam.asyncCapture = self
+        try:
+            await self.cam._runAsync(self.cam.startCapture)
+        except Exception:
+            self.cam.removeStage(self)
+            self.cam.asyncCapture = None
+            raise
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        try:
+            await self.cam._runAsync(self.cam.stopCapture)
+        finally:
+            self.cam.removeStage(self)
+            self.cam.asyncCapture = None
+
+    def __aiter__(self):
+        return self.frames()
+
+    def start(self, cam):
+        self.buffer = None
+        self.stopped = False
+
+    def process(self, frame, meta):
+        if self.buffer is None:
+            self.buffer = FrameRingBuffer(self.maxQueuedFrames, frame.shape, frame.dtype, self.overflowPolicy, metaDtype = FRAME_METADATA_DTYPE)
+        self.buffer.put(frame, meta = meta)
+        if not self.frameReady.is_set(): # only wake up the event loop if it is not awake already
+            self.loop.call_soon_threadsafe(self.frameReady.set)
+
+    def interrupt(self):
+        if self.buffer is not None:
+            self.buffer.close() # a "block" put returns, queued frames can still be collected
+
+    def stop(self):
+        self.stopped = True
+        self.loop.call_soon_threadsafe(self.frameReady.set)
+
+    async def frames(self, withMetadata : bool = False):
+        """
+        Yield captured frames (or (frame, metadata record) tuples if withMetadata) until capturing stops and all frames are collected.
+        """
+        while True:
+            try:
+                if self.buffer is None:
+                    raise TimeoutError
+                frame, meta = self.buffer.getWithMetadata(timeout = 0)
+            except TimeoutError:
+                if self.stopped:
+                    return
+                self.frameReady.clear()
+                if self.buffer is not None and len(self.buffer) > 0:
+                    continue # a frame arrived just before clearing
+                await self.frameReady.wait()
+                continue
+            yield (frame, meta) if withMetadata else frame
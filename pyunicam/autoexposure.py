@@ -0,0 +1,87 @@
+"""
+Auto exposure on the computer, for cameras that cannot do it themselves (like Thorlabs cameras). Switch it on with cam.setProperty('exposureTimeAuto', True): while capturing, every frame that is handed out is metered, and the exposure time is adjusted on the running camera until the frames are as bright as asked for.
+
+Metering looks at a strided subsample of the frame (every stride-th pixel in both directions), which is plenty to estimate a brightness percentile and costs next to nothing. Since pixel values scale linearly with exposure time, a single correction usually gets there; saturated frames are corrected in large steps first. After every change a few frames are skipped, because they may have been exposed before the change took effect.
+"""
+import numpy as np
+
+SATURATED_STEP = 0.25 # factor to shorten the exposure time by when the metered percentile is saturated, since then it is unknown by how much
+
+class AutoExposure(object):
+    def __init__(self, target : float = 0.8, percentile : float = 99, stride : int = 8, tolerance : float = 0.05, settleFrames : int = 2, maxStep : float = 8.0, minExposureTime : float = 10, maxExposureTime : float = 1e6):
+        """
+        Settings and state of the auto exposure of a camera (cam.softwareAutoExposure). Change the settings at any time, they take effect at the next frame.
+
+        Parameters
+        ----------
+        target : float, optional
+            Brightness to aim for, as a fraction of the maximum pixel value, by default 0.8.
+        percentile : float, optional
+            Percentile of the pixel values that should be at target, by default 99 (so only 1% of the pixels is brighter). Use 50 to expose for the median instead.
+        stride : int, optional
+            Meter every stride-th pixel in both directions, by default 8.
+        tolerance : float, optional
+            Relative deviation from target that is left alone, by default 0.05. Keeps the exposure time from chasing noise.
+        settleFrames : int, optional
+            Frames to skip after changing the exposure time, by default 2.
+        maxStep : float, optional
+            Largest factor by which a single correction changes the exposure time, by default 8.
+        minExposureTime, maxExposureTime : float, optional
+            Range (µs) to keep the exposure time in, by default 10 µs to 1 s.
+        """
+        self.target = target
+        self.percentile = percentile
+        self.stride = stride
+        self.tolerance = tolerance
+        self.settleFrames = settleFrames
+        self.maxStep = maxStep
+        self.minExposureTime = minExposureTime
+        self.maxExposureTime = maxExposureTime
+        self.reset(None)
+
+    def reset(self, exposureTime : float|None, maxValue : float|None = None):
+        """
+        Start over from exposureTime (µs), the current exposure time of the camera. maxValue is the maximum pixel value of the camera, by default the maximum of the pixel type of the frames.
+        """
+        self.exposureTime = exposureTime
+        self.maxValue = maxValue
+        self.level = np.nan # last metered brightness, as fraction of maxValue
+        self.converged = False
+        self.adjustments = 0
+        self._skip = 0
+
+    def measure(self, frame : np.ndarray) -> float:
+        """
+        Metered brightness of frame: its percentile pixel value (over all colour channels) as a fraction of the maximum pixel value.
+        """
+        sample = frame[::self.stride, ::self.stride]
+        maxValue = self.maxValue
+        if maxValue is None:
+            maxValue = np.iinfo(frame.dtype).max if frame.dtype.kind in "ui" else 1.0
+        return float(np.percentile(sample, self.percentile)) / maxValue
+
+    def update(self, frame : np.ndarray) -> float|None:
+        """
+        Meter frame, and return the new exposure time (µs) if it should change, otherwise None.
+        """
+        if self._skip > 0:
+            self._skip -= 1
+            return None
+        self.level = self.measure(frame)
+        if self.level >= 1:
+            ratio = SATURATED_STEP
+        elif self.level <= 0:
+            ratio = self.maxStep
+        else:
+            ratio = self.target / self.level
+        self.converged = abs(ratio - 1) <= self.tolerance
+        if self.converged:
+            return None
+        ratio = min(max(ratio, 1 / self.maxStep), self.maxStep)
+        exposureTime = min(max(self.exposureTime * ratio, self.minExposureTime), self.maxExposureTime)
+        if exposureTime == self.exposureTime:
+            return None # at the end of the range, nothing more to do
+        self.exposureTime = exposureTime
+        self.adjustments += 1
+        self._skip = self.settleFrames
+        return exposureTime
@@ -0,0 +1,76 @@
+"""
+Registry of camera backends, used by connect_cam to turn a camtype like "thor" into a camera class. Backends are registered as "module:Class" strings, so a backend module (and the vendor SDK it needs) is only imported the first time somebody connects to such a camera.
+
+Other packages can add their own backends, either by calling registerBackend, or by declaring an entry point in the "pyunicam.backends" group, like this in their pyproject.toml:
+
+    [project.entry-points."pyunicam.backends"]
+    mycam = "mypackage.mycam:MyCam"
+"""
+import importlib
+import threading
+
+ENTRY_POINT_GROUP = "pyunicam.backends"
+
+_backends = dict() # camtype : camera class, or "module:Class" string until first use
+_backendsLock = threading.Lock()
+_entryPointsLoaded = False
+
+def registerBackend(camtype : str, backend, replace : bool = False):
+    """
+    Make a camera class available to connect_cam under the name camtype.
+
+    Parameters
+    ----------
+    camtype : str
+        Name to pass to connect_cam, like "thor".
+    backend : type | str
+        A subclass of UniversalCam, or a "module:Class" string to import it from when it is first needed. The class is called with the keyword arguments of connect_cam (like serialNumber).
+    replace : bool, optional
+        Replace an existing backend with the same name, by default False (which raises a ValueError).
+    """
+    with _backendsLock:
+        if camtype in _backends and not replace:
+            raise ValueError(f"a backend named '{camtype}' is already registered, pass replace=True to replace it")
+        _backends[camtype] = backend
+
+def getBackend(camtype : str) -> type:
+    """
+    Return the camera class for camtype, importing it if this is the first time it is used. For backwards compatibility, a camtype that contains the name of a backend (like "thorcam") works as well.
+    """
+    _loadEntryPoints()
+    with _backendsLock:
+        name = camtype if camtype in _backends else next((name for name in _backends if name in camtype), None)
+        if name is None:
+            raise ValueError(f"No valid camera found with name {camtype}, available are: {list(_backends)}")
+        backend = _backends[name]
+        if isinstance(backend, str):
+            moduleName, className = backend.split(":")
+            backend = getattr(importlib.import_module(moduleName), className)
+            _backends[name] = backend
+        return backend
+
+def availableBackends() -> list:
+    """
+    Return the names of all registered backends (whether their SDK is installed or not).
+    """
+    _loadEntryPoints()
+    with _backendsLock:
+        return list(_backends)
+
+def _loadEntryPoints():
+    """
+    Register the backends other packages declared as entry points, once.
+    """
+    global _entryPointsLoaded
+    if _entryPointsLoaded:
+        return
+    _entryPointsLoaded = True
+    from importlib.metadata import entry_points
+    for entryPoint in entry_points(group=ENTRY_POINT_GROUP):
+        with _backendsLock:
+            _backends.setdefault(entryPoint.name, entryPoint.value)
+
+registerBackend("flir", "pyunicam.flir:FlirCam")
+registerBackend("thor", "pyunicam.thor:ThorCam")
+registerBackend("dummy", "pyunicam.dummy:DummyCam")
+registerBackend("replay", "pyunicam.replay:ReplayCam")
@@ -0,0 +1,232 @@
+"""
+Benchmarks for the capture hot paths. Run them from the command line with
+
+    python -m pyunicam bench --camera dummy --frames 500 --output bench.json
+
+Add --simulate to benchmark the thor or flir backend without the camera (or its SDK), see pyunicam.simulators.
+
+Results are collected in a (json serializable) dict, so runs can be compared across releases.
+"""
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from .connect import connect_cam
+from .metadata import countDroppedFrames
+
+def runBenchmarks(camtype : str = "dummy", frames : int = 200, thorFramerate : float = 5) -> dict:
+    """
+    Connect to a camera and run all benchmarks that make sense for it.
+
+    Parameters
+    ----------
+    camtype : str, optional
+        Camera to benchmark, anything connect_cam accepts, by default "dummy".
+    frames : int, optional
+        Number of frames (or property round-trips) per benchmark, by default 200.
+    thorFramerate : float, optional
+        Framerate used to benchmark the software-enforced framerate of Thor cameras, by default 5.
+
+    Returns
+    -------
+    dict
+        Description of the setup, plus a dict of results per benchmark. Times are in ms, memory in bytes.
+    """
+    report = {
+        "pyunicam" : _version(),
+        "python" : sys.version.split()[0],
+        "numpy" : np.__version__,
+        "platform" : platform.platform(),
+        "camera" : camtype,
+        "frames" : frames,
+        "date" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results" : {},
+    }
+    with connect_cam(camtype) as cam:
+        report["metadata"] = {k : str(v) for k, v in cam.getMetadata().items()}
+        results = report["results"]
+        results["takeOneImage"] = benchTakeOneImage(cam, max(frames // 10, 2))
+        results["getImages"] = benchGetImages(cam, frames)
+        results["grabFrames"] = benchGrabFrames(cam, frames)
+        results["propertyRoundTrip"] = benchPropertyRoundTrip(cam, frames)
+        if cam.camType == "thor":
+            results["thorFramerate"] = benchThorFramerate(cam, max(frames // 10, 2), thorFramerate)
+    return report
+
+def benchTakeOneImage(cam, n : int) -> dict:
+    """
+    Time n calls to cam.takeOneImage.
+    """
+    def run(m):
+        with m:
+            for _ in range(n):
+                cam.takeOneImage()
+                m.tick()
+    return _measure(run)
+
+def benchGetImages(cam, n : int) -> dict:
+    """
+    Stream n frames by calling cam.getImages in a loop (the README way).
+    """
+    def run(m):
+        cam.startCapture()
+        try:
+            with m:
+                for _ in range(n):
+                    cam.getImages()
+                    m.tick()
+        finally:
+            cam.stopCapture()
+    return _measure(run)
+
+def benchGrabFrames(cam, n : int) -> dict:
+    """
+    Stream n frames into a single stack with cam.grabFrames. Latencies follow from the arrival times in the frame metadata. Also reports frames the camera dropped.
+    """
+    def run(m):
+        cam.startCapture()
+        try:
+            with m:
+                _, metadata = cam.grabFrames(n)
+        finally:
+            cam.stopCapture()
+        m.ticks = list(metadata["hostTimestamp"])
+        return {"droppedFrames" : countDroppedFrames(metadata)}
+    return _measure(run)
+
+def benchPropertyRoundTrip(cam, n : int) -> dict:
+    """
+    Time n setProperty/getProperty round-trips of the exposure time, alternating between two values so the camera has to do something.
+    """
+    original = cam.getProperty("exposureTime")
+    values = (original, original * 1.5)
+    def run(m):
+        try:
+            with m:
+                for i in range(n):
+                    cam.setProperty("exposureTime", values[i % 2])
+                    cam.getProperty("exposureTime")
+                    m.tick()
+        finally:
+            cam.setProperty("exposureTime", original)
+    return _measure(run)
+
+def benchThorFramerate(cam, n : int, fps : float) -> dict:
+    """
+    Stream n frames using the software-enforced framerate of Thor cameras. Also reports the frames dropped because the buffer overflowed, and how well the trigger deadlines were met.
+    """
+    def run(m):
+        cam.setProperty("acquisitionFramerate", fps)
+        try:
+            cam.startCapture()
+            try:
+                with m:
+                    for _ in range(n):
+                        cam.getImages()
+                        m.tick()
+            finally:
+                cam.stopCapture()
+        finally:
+            cam.setProperty("acquisitionFramerate", -1)
+        return {"targetFps" : fps, "droppedFrames" : cam.getDroppedFrames(), "schedule" : cam.getFramerateStats()}
+    return _measure(run)
+
+def _measure(run) -> dict:
+    """
+    Run a benchmark twice: once with tracemalloc on, only to see how much memory it uses, and once for the timings, without tracemalloc (which hooks every allocation, and would slow the hot paths down several times). run gets a _Measurement to use as with block, and may return extra results.
+    """
+    memory = _Measurement(traceMemory=True)
+    run(memory)
+    timing = _Measurement()
+    extra = run(timing)
+    result = timing.summary()
+    result["memoryGrowth"] = int(memory.memGrowth)
+    result["memoryPeak"] = int(memory.memPeak)
+    result.update(extra or {})
+    return result
+
+class _Measurement(object):
+    def __init__(self, traceMemory : bool = False):
+        """
+        Collects the time of every tick (a frame, a round-trip) plus the CPU time used in a with block, and the memory used if traceMemory is set (which distorts the timings, see _measure).
+        """
+        self.traceMemory = traceMemory
+        self.memGrowth = self.memPeak = 0
+
+    def __enter__(self):
+        self.ticks = list()
+        if self.traceMemory:
+            tracemalloc.start()
+            self.memStart = tracemalloc.get_traced_memory()[0]
+        self.cpuStart = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.wall = time.perf_counter() - self.start
+        self.cpu = time.process_time() - self.cpuStart
+        if self.traceMemory:
+            memEnd, memPeak = tracemalloc.get_traced_memory()
+            self.memGrowth = memEnd - self.memStart
+            self.memPeak = memPeak - self.memStart
+            tracemalloc.stop()
+
+    def tick(self):
+        self.ticks.append(time.perf_counter())
+
+    def summary(self) -> dict:
+        latencies = np.diff(np.concatenate([[self.start], self.ticks])) * 1e3
+        intervals = latencies[1:] if len(latencies) > 1 else latencies
+        return {
+            "count" : len(self.ticks),
+            "wallTime" : self.wall * 1e3,
+            "fps" : len(self.ticks) / self.wall if self.wall > 0 else float("inf"),
+            "latency" : {f"p{p}" : float(np.percentile(latencies, p)) for p in (50, 90, 99, 100)},
+            "jitter" : float(np.std(intervals)),
+            "cpuUsage" : self.cpu / self.wall if self.wall > 0 else 0.0, # 1.0 means one core fully busy
+            "memoryGrowth" : int(self.memGrowth),
+            "memoryPeak" : int(self.memPeak),
+        }
+
+def printReport(report : dict):
+    """
+    Print a benchmark report as a readable table.
+    """
+    print(f"pyunicam {report['pyunicam']} on {report['camera']} ({report['metadata'].get('DeviceModelName','?')}), {report['frames']} frames")
+    print(f"{'benchmark':<20}{'fps':>10}{'p50 ms':>10}{'p99 ms':>10}{'jitter ms':>11}{'cpu':>7}{'mem MB':>9}")
+    for name, r in report["results"].items():
+        print(f"{name:<20}{r['fps']:>10.1f}{r['latency']['p50']:>10.3f}{r['latency']['p99']:>10.3f}{r['jitter']:>11.3f}{r['cpuUsage']:>7.2f}{r['memoryGrowth']/1e6:>9.2f}")
+
+def main(argv : list|None = None):
+    import argparse
+    parser = argparse.ArgumentParser(prog="python -m pyunicam bench", description="Benchmark the capture hot paths of a camera.")
+    parser.add_argument("--camera", default="dummy", help="camera to benchmark, as passed to connect_cam (default: dummy)")
+    parser.add_argument("--frames", type=int, default=200, help="frames per benchmark (default: 200)")
+    parser.add_argument("--thor-framerate", type=float, default=5, help="framerate for the Thor software framerate benchmark (default: 5)")
+    parser.add_argument("--simulate", action="store_true", help="run the thor or flir backend against simulated SDKs instead of a real camera, see pyunicam.simulators")
+    parser.add_argument("--output", help="write the results as json to this file")
+    parser.add_argument("--json", action="store_true", help="print the results as json instead of a table")
+    args = parser.parse_args(argv)
+    if args.simulate:
+        from .simulators import Simulation
+        with Simulation():
+            report = runBenchmarks(args.camera, args.frames, args.thor_framerate)
+        report["simulated"] = True
+    else:
+        report = runBenchmarks(args.camera, args.frames, args.thor_framerate)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        printReport(report)
+
+def _version() -> str:
+    try:
+        from importlib.metadata import version
+        return version("pyunicam")
+    except Exception:
+        return "unknown"
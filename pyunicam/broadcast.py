@@ -0,0 +1,227 @@
+"""
+Share one capture between several consumers, like a live preview next to a full-rate recording. A FrameBroadcaster is a capture stage (see pyunicam.stages) that hands every frame to any number of subscriptions. Each subscription has its own maximum rate, downsampling and queue, so a slow consumer never holds up the others (unless it asks to).
+
+Frames are copied once, into a pooled buffer that all subscriptions share by reference: subscribers get read-only views, downsampled subscriptions a strided view of the same buffer. A buffer goes back to the pool once every subscription that got it has moved on to its next frame (or called release). Frames that no subscription wants at its rate are not copied at all.
+"""
+import collections
+import threading
+import numpy as np
+from .stages import CaptureStage
+from .framebuffer import OVERFLOW_POLICIES
+
+class FrameBroadcaster(CaptureStage):
+    def __init__(self):
+        """
+        Hand every captured frame to all subscriptions (see subscribe). Attach to a camera with cam.addStage.
+
+        Example
+        ------
+        broadcaster = FrameBroadcaster()
+        preview = broadcaster.subscribe(maxRate=10, downsample=4)
+        recording = broadcaster.subscribe(overflowPolicy="block")
+        cam.addStage(broadcaster)
+        cam.startCapture()
+        frame, meta = preview.get() # in the GUI thread
+        frame, meta = recording.get() # in the thread that saves frames
+        """
+        self.subscriptions = list()
+        self.framesBroadcast = 0 # frames that at least one subscription took
+        self._lock = threading.Lock() # guards the pool, reference counts and all subscription queues
+        self._pool = list() # free _SharedFrames
+        self._layout = None # (shape, dtype) of the frames in the pool
+
+    def subscribe(self, maxRate : float|None = None, downsample : int = 1, maxQueuedFrames : int = 4, overflowPolicy : str = "dropOldest") -> "Subscription":
+        """
+        Start receiving frames, possibly while capturing.
+
+        Parameters
+        ----------
+        maxRate : float | None, optional
+            Maximum number of frames per second to receive, by default None (every frame). Frames in between are skipped, following the frame timestamps.
+        downsample : int, optional
+            Only receive every downsample-th pixel in both directions, by default 1. This is a view, so it costs nothing; use pyunicam.roi.Binner on the result for averaging instead.
+        maxQueuedFrames : int, optional
+            Number of frames that can wait to be collected, by default 4.
+        overflowPolicy : str, optional
+            What to do with a frame when the queue is full, one of pyunicam.framebuffer.OVERFLOW_POLICIES, by default "dropOldest". "block" makes the capture wait for this subscription, use it for consumers that need every frame (like a recorder).
+        """
+        subscription = Subscription(self, maxRate, downsample, maxQueuedFrames, overflowPolicy)
+        with self._lock:
+            self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription : "Subscription"):
+        """
+        Stop sending frames to subscription. Frames it still holds are given back.
+        """
+        with self._lock:
+            self.subscriptions.remove(subscription)
+            subscription._close(release=True)
+
+    def start(self, cam):
+        with self._lock:
+            for subscription in self.subscriptions:
+                subscription._open()
+
+    def process(self, frame : np.ndarray, meta : np.ndarray):
+        now = float(meta["hostTimestamp"])
+        with self._lock:
+            wanting = [subscription for subscription in self.subscriptions if subscription._wants(now)]
+            if not wanting:
+                return
+            shared = self._takeFromPool(frame)
+        # only this thread knows about the buffer until it is handed out, so copy without holding the lock
+        np.copyto(shared.frame, frame)
+        shared.meta = meta.copy()
+        with self._lock:
+            for subscription in wanting:
+                subscription._put(shared)
+            if shared.references == 0:
+                self._giveBack(shared) # all dropped it straight away
+            self.framesBroadcast += 1
+
+    def interrupt(self):
+        with self._lock:
+            for subscription in self.subscriptions:
+                subscription._close() # wakes up process if it waits for a "block" subscription
+
+    def stop(self):
+        with self._lock:
+            for subscription in self.subscriptions:
+                subscription._close()
+
+    def _takeFromPool(self, frame : np.ndarray) -> "_SharedFrame":
+        layout = (frame.shape, frame.dtype)
+        if layout != self._layout:
+            self._pool.clear() # frame size changed, buffers still out there are simply not taken back
+            self._layout = layout
+        if self._pool:
+            return self._pool.pop()
+        return _SharedFrame(np.empty(frame.shape, dtype=frame.dtype))
+
+    def _release(self, shared : "_SharedFrame"):
+        shared.references -= 1
+        if shared.references == 0:
+            self._giveBack(shared)
+
+    def _giveBack(self, shared : "_SharedFrame"):
+        if (shared.frame.shape, shared.frame.dtype) == self._layout:
+            self._pool.append(shared)
+
+class Subscription(object):
+    def __init__(self, broadcaster : FrameBroadcaster, maxRate : float|None, downsample : int, maxQueuedFrames : int, overflowPolicy : str):
+        """
+        Frames of a FrameBroadcaster for a single consumer, made by FrameBroadcaster.subscribe. Collect them with get.
+        """
+        if overflowPolicy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflowPolicy must be one of {OVERFLOW_POLICIES}, not '{overflowPolicy}'")
+        if downsample < 1 or maxQueuedFrames < 1:
+            raise ValueError("downsample and maxQueuedFrames must be at least 1")
+        self.broadcaster = broadcaster
+        self.period = None if maxRate is None else 1 / maxRate
+        self.downsample = int(downsample)
+        self.maxQueuedFrames = maxQueuedFrames
+        self.overflowPolicy = overflowPolicy
+        self.droppedFrames = 0 # because the queue was full, frames skipped for the rate are not counted
+        self.receivedFrames = 0
+        self._queue = collections.deque()
+        self._current = None # _SharedFrame of the frame handed out last
+        self._closed = False
+        self._nextDue = None
+        self._notEmpty = threading.Condition(broadcaster._lock)
+        self._notFull = threading.Condition(broadcaster._lock)
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def get(self, timeout : float|None = None) -> tuple[np.ndarray, np.void]:
+        """
+        Return the oldest frame that was not collected yet, as a read-only view (downsampled if asked for) with (a copy of) its metadata record. The frame you got before is given back, so do not use that one anymore (copy it if you want to keep it).
+
+        Raises
+        ------
+        TimeoutError
+            If no frame arrived within timeout (s), or the capture stopped and all frames were collected.
+        """
+        with self.broadcaster._lock:
+            self._releaseCurrent()
+            if not self._notEmpty.wait_for(lambda: self._queue or self._closed, timeout) or not self._queue:
+                raise TimeoutError("no frame arrived for this subscription in time")
+            shared = self._current = self._queue.popleft()
+            self._notFull.notify()
+            meta = shared.meta.copy()
+        n = self.downsample
+        frame = shared.frame[::n, ::n] if n > 1 else shared.frame[...]
+        frame.flags.writeable = False # shared with the other subscriptions
+        return frame, meta
+
+    def release(self):
+        """
+        Give back the frame you got last, so its buffer can be reused before you call get again.
+        """
+        with self.broadcaster._lock:
+            self._releaseCurrent()
+
+    def _releaseCurrent(self):
+        if self._current is not None:
+            self.broadcaster._release(self._current)
+            self._current = None
+
+    def _wants(self, now : float) -> bool:
+        """
+        Check if the frame that arrived at now should be sent, given the maximum rate. Keeps to a fixed time grid, so the rate does not drift down with the jitter of the frames.
+        """
+        if self._closed:
+            return False
+        if self.period is None:
+            return True
+        if self._nextDue is not None and now < self._nextDue:
+            return False
+        late = self._nextDue is None or now >= self._nextDue + self.period
+        self._nextDue = (now if late else self._nextDue) + self.period
+        return True
+
+    def _put(self, shared : "_SharedFrame"):
+        if self._closed:
+            return # unsubscribed in the meantime
+        if len(self._queue) >= self.maxQueuedFrames:
+            if self.overflowPolicy == "dropNewest":
+                self.droppedFrames += 1
+                return
+            elif self.overflowPolicy == "dropOldest":
+                self.broadcaster._release(self._queue.popleft())
+                self.droppedFrames += 1
+            else:
+                self._notFull.wait_for(lambda: len(self._queue) < self.maxQueuedFrames or self._closed)
+                if self._closed:
+                    return
+        shared.references += 1
+        self._queue.append(shared)
+        self.receivedFrames += 1
+        self._notEmpty.notify()
+
+    def _open(self):
+        while self._queue:
+            self.broadcaster._release(self._queue.popleft()) # left over from the last capture
+        self._closed = False
+        self._nextDue = None
+
+    def _close(self, release : bool = False):
+        """
+        Stop receiving frames, and wake up anyone waiting. Queued frames can still be collected, unless release is set.
+        """
+        self._closed = True
+        if release:
+            self._releaseCurrent()
+            while self._queue:
+                self.broadcaster._release(self._queue.popleft())
+        self._notEmpty.notify_all()
+        self._notFull.notify_all()
+
+class _SharedFrame(object):
+    __slots__ = ("frame", "meta", "references")
+
+    def __init__(self, frame : np.ndarray):
+        self.frame = frame
+        self.meta = None
+        self.references = 0 # subscriptions holding this frame, queued or handed out
@@ -0,0 +1,177 @@
+"""
+Dark frame and flat field correction. A Calibration holds master dark frames (the mean of frames taken with the sensor covered) and master flat fields (the mean of frames of an evenly lit scene) of one camera, per exposure time, gain and frame size, and keeps them on disk so they only have to be taken once. Switch it on with cam.setCalibration(True); from then on every frame the camera hands out is corrected:
+
+    corrected = (frame - dark) * mean(flat - flatDark) / (flat - flatDark)
+
+as float32. The division by the flat field is done once, when a master is first used, so correcting a frame is a subtraction and a multiplication into preallocated buffers.
+
+Masters are stored per camera (model and serial number from cam.getMetadata()) in CALIBRATION_DIRECTORY, as .npy files named after their settings.
+"""
+import os
+import re
+import numpy as np
+from . import APPNAME
+
+CALIBRATION_DIRECTORY = os.path.join(os.path.expanduser("~"), "." + APPNAME, "calibration")
+CALIBRATION_KINDS = ("dark", "flat")
+_MASTER_NAME = re.compile(r"^(dark|flat)_(.+)us_(.+)dB_([0-9x]+)\.npy$")
+
+class Calibration(object):
+    def __init__(self, identity : str, directory : str|None = None):
+        """
+        Masters of the camera with the given identity (see cameraIdentity), stored in directory/identity. Use calibrationFor(cam) to get the calibration of a camera.
+
+        Parameters
+        ----------
+        identity : str
+            Identity of the camera, as made by cameraIdentity.
+        directory : str | None, optional
+            Where the masters of all cameras are kept, by default CALIBRATION_DIRECTORY.
+        """
+        self.identity = identity
+        self.directory = os.path.join(directory or CALIBRATION_DIRECTORY, identity)
+        self.mastersOnDisk = dict() # (kind, exposureTime, gain, shape) : path
+        self._masters = dict() # (kind, exposureTime, gain, shape) : master, as loaded
+        self._correction = (None, None, None) # (exposureTime, gain, shape), dark, flat factor of the last frame, see correct
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                match = _MASTER_NAME.match(name)
+                if match:
+                    kind, exposureTime, gain, shape = match.groups()
+                    key = (kind, float(exposureTime), float(gain), tuple(int(n) for n in shape.split("x")))
+                    self.mastersOnDisk[key] = os.path.join(self.directory, name)
+
+    def masters(self, kind : str) -> list:
+        """
+        Return the settings (exposureTime, gain, shape) of all masters of kind ("dark" or "flat").
+        """
+        return sorted(key[1:] for key in self.mastersOnDisk if key[0] == kind)
+
+    def addMaster(self, kind : str, master : np.ndarray, exposureTime : float, gain : float = np.nan) -> np.ndarray:
+        """
+        Store a master of kind ("dark" or "flat") for frames taken with exposureTime (µs) and gain (dB, NaN for cameras without gain), replacing any master with the same settings. Returns the master, as float32.
+        """
+        if kind not in CALIBRATION_KINDS:
+            raise ValueError(f"kind must be one of {CALIBRATION_KINDS}, not '{kind}'")
+        master = np.asarray(master, dtype=np.float32)
+        key = (kind, float(exposureTime), float(gain), master.shape)
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{kind}_{exposureTime:g}us_{gain:g}dB_{'x'.join(str(n) for n in master.shape)}.npy")
+        np.save(path, master)
+        for old in [old for old in self.mastersOnDisk if old[0] == kind and _sameSettings(old[1:], key[1:])]:
+            del self.mastersOnDisk[old]
+            self._masters.pop(old, None)
+        self.mastersOnDisk[key] = path
+        self._masters[key] = master
+        self._correction = (None, None, None) # the new master may be a better match
+        return master
+
+    def acquireDark(self, cam, frames : int = 32, exposureTimes : list|None = None, timeout : float|None = 10) -> list:
+        """
+        Take master dark frames: the mean of frames frames, with the sensor covered (do that first!), at the current settings of cam, or at each of exposureTimes (µs). Returns the masters.
+        """
+        return self._acquire("dark", cam, frames, exposureTimes, timeout)
+
+    def acquireFlat(self, cam, frames : int = 32, exposureTimes : list|None = None, timeout : float|None = 10) -> list:
+        """
+        Take master flat fields: the mean of frames frames of an evenly lit, featureless scene (keep it well below saturation), at the current settings of cam, or at each of exposureTimes (µs). Returns the masters. Take darks at the same settings as well.
+        """
+        return self._acquire("flat", cam, frames, exposureTimes, timeout)
+
+    def correct(self, frame : np.ndarray, out : np.ndarray|None = None, exposureTime : float = np.nan, gain : float = np.nan) -> np.ndarray:
+        """
+        Dark and flat correct frame, taken with exposureTime (µs) and gain (dB), into out (float32), or a new array if out is None. Uses the masters of the same gain and frame size with the nearest exposure time. Without any dark, nothing is subtracted; without any flat, nothing is divided.
+        """
+        settings = (exposureTime, gain, frame.shape)
+        if not _sameSettings(settings, self._correction[0]):
+            self._correction = (settings,) + self._prepare(exposureTime, gain, frame.shape)
+        _, dark, flatFactor = self._correction
+        if out is None:
+            out = np.empty(frame.shape, dtype=np.float32)
+        if dark is None:
+            np.copyto(out, frame, casting="unsafe")
+        else:
+            np.subtract(frame, dark, out=out, dtype=np.float32)
+        if flatFactor is not None:
+            np.multiply(out, flatFactor, out=out)
+        return out
+
+    def _acquire(self, kind : str, cam, frames : int, exposureTimes : list|None, timeout : float|None) -> list:
+        oldExposureTime = cam.getProperty("exposureTime")
+        calibration, cam.calibration = cam.calibration, None # masters are made of uncorrected frames
+        stages, cam.captureStages = cam.captureStages, list() # so getImages gets the frames, not the stages
+        masters = list()
+        try:
+            for exposureTime in exposureTimes or [None]:
+                if exposureTime is not None:
+                    cam.setProperty("exposureTime", exposureTime)
+                cam.startCapture()
+                try:
+                    frame = cam._getFrameInto(None, timeout)
+                    total = frame.astype(np.float64)
+                    for _ in range(frames - 1):
+                        total += cam._getFrameInto(frame, timeout)
+                finally:
+                    cam.stopCapture()
+                total /= frames
+                masters.append(self.addMaster(kind, total, cam._getPropertyOrNan("exposureTime"), cam._getPropertyOrNan("gain")))
+        finally:
+            cam.calibration = calibration
+            cam.captureStages = stages
+            if exposureTimes:
+                cam.setProperty("exposureTime", oldExposureTime)
+        return masters
+
+    def _prepare(self, exposureTime : float, gain : float, shape : tuple) -> tuple:
+        """
+        Return the dark to subtract and the factor to multiply with (or Nones) for frames of the given settings.
+        """
+        dark = self._nearest("dark", exposureTime, gain, shape)
+        flat = self._nearest("flat", exposureTime, gain, shape)
+        flatFactor = None
+        if flat is not None:
+            _, flatExposureTime, _, _ = self._nearestKey("flat", exposureTime, gain, shape)
+            flatDark = self._nearest("dark", flatExposureTime, gain, shape)
+            signal = flat if flatDark is None else flat - flatDark
+            flatFactor = np.ones(shape, dtype=np.float32)
+            lit = signal > 0 # dead pixels are left alone
+            flatFactor[lit] = signal[lit].mean() / signal[lit]
+        return dark, flatFactor
+
+    def _nearestKey(self, kind : str, exposureTime : float, gain : float, shape : tuple) -> tuple|None:
+        candidates = [key for key in self.mastersOnDisk if key[0] == kind and key[3] == tuple(shape) and _same(key[2], gain)]
+        if not candidates:
+            return None
+        if np.isnan(exposureTime):
+            return candidates[0]
+        return min(candidates, key=lambda key: abs(key[1] - exposureTime))
+
+    def _nearest(self, kind : str, exposureTime : float, gain : float, shape : tuple) -> np.ndarray|None:
+        key = self._nearestKey(kind, exposureTime, gain, shape)
+        if key is None:
+            return None
+        if key not in self._masters:
+            self._masters[key] = np.load(self.mastersOnDisk[key]).astype(np.float32, copy=False)
+        return self._masters[key]
+
+def cameraIdentity(cam) -> str:
+    """
+    Name that identifies a camera (its model and serial number, from cam.getMetadata()), usable as a directory name.
+    """
+    metadata = cam.getMetadata()
+    identity = f"{metadata.get('DeviceModelName', cam.camType)}_{metadata.get('DeviceSerialNumber', 'unknown')}"
+    return re.sub(r"[^A-Za-z0-9._-]+", "-", identity)
+
+def calibrationFor(cam, directory : str|None = None) -> Calibration:
+    """
+    Return the Calibration of cam, with the masters taken earlier (see Calibration).
+    """
+    return Calibration(cameraIdentity(cam), directory)
+
+def _same(a : float, b : float) -> bool:
+    return a == b or (np.isnan(a) and np.isnan(b))
+
+def _sameSettings(a : tuple|None, b : tuple|None) -> bool:
+    if a is None or b is None:
+        return False
+    return _same(a[0], b[0]) and _same(a[1], b[1]) and a[2] == b[2]
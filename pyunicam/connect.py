@@ -1,12 +1,8 @@
-from pyunicam import *
-from.universal import *
+from .universal import *
+from .backends import getBackend
 
-def connect_cam(camtype: str) -> UniversalCam:
-    if 'flir' in camtype:
-        return FlirCam()
-    elif 'thor' in camtype:
-        return ThorCam()
-    elif 'dummy' in camtype:
-        return DummyCam()
-    else:
-        raise ValueError(f"No valid camera found with name {camtype}")
+def connect_cam(camtype: str, serialNumber: str|None = None, **options) -> UniversalCam:
+    """
+    Connect to a camera of type camtype ('flir', 'thor', 'dummy', 'replay' or any other registered backend, see pyunicam.backends). If you have several cameras of the same type attached, pick one using its serialNumber, otherwise the first one found is used. Other options are passed on to the camera class, like demosaic for colour cameras (see UniversalCam).
+    """
+    return getBackend(camtype)(serialNumber = serialNumber, **options)
@@ -0,0 +1,237 @@
+"""
+Host-side conversion of raw Bayer frames to colour. Colour cameras can usually demosaic on the camera (like pixelFormat BGR8), but that sends three times as much data over the cable as the raw Bayer pattern (like BayerRG8), which caps the framerate. Converting on the computer instead keeps the framerate of the raw format.
+
+All conversions are vectorized with numpy, write into preallocated arrays, and can be split over row tiles on a thread pool (numpy releases the GIL while it works, so this scales with cores).
+"""
+import re
+import numpy as np
+
+BAYER_PATTERNS = {
+    # pattern : colours of the top-left 2x2 block, row by row
+    "RG" : ("RG", "GB"),
+    "GR" : ("GR", "BG"),
+    "GB" : ("GB", "RG"),
+    "BG" : ("BG", "GR"),
+}
+DEMOSAIC_METHODS = (
+    "bilinear", # full resolution, missing colours are averages of their neighbours
+    "nearest", # full resolution, every 2x2 block gets the colour of the block (fast, blocky)
+    "bin2x2", # half resolution, every 2x2 block becomes a single pixel (fastest)
+)
+COLOR_ORDERS = ("BGR", "RGB")
+
+def bayerPattern(pixelFormat : str) -> str|None:
+    """
+    Return the Bayer pattern (like "RG") of a pixel format name (like "BayerRG8"), or None if it is not a Bayer format.
+    """
+    match = re.match(r"bayer(RG|GR|GB|BG)", pixelFormat, re.IGNORECASE)
+    if match is None:
+        return None
+    return match.group(1).upper()
+
+def shiftPattern(pattern : str, x : int, y : int) -> str:
+    """
+    Bayer pattern of a crop of a frame with pattern, starting at pixel (x, y).
+    """
+    rows = BAYER_PATTERNS[pattern]
+    return rows[y % 2][x % 2] + rows[y % 2][(x + 1) % 2]
+
+def mosaic(image : np.ndarray, pattern : str = "RG", colorOrder : str = "BGR") -> np.ndarray:
+    """
+    Turn a colour image (H,W,3) into the raw Bayer frame (H,W) a camera with this pattern would produce. Mostly usefull for testing.
+    """
+    raw = np.empty(image.shape[:2], dtype=image.dtype)
+    for dy in (0, 1):
+        for dx in (0, 1):
+            channel = colorOrder.index(BAYER_PATTERNS[pattern][dy][dx])
+            raw[dy::2, dx::2] = image[dy::2, dx::2, channel]
+    return raw
+
+class Demosaicer(object):
+    def __init__(self, method : str = "bilinear", colorOrder : str = "BGR", threads : int = 1):
+        """
+        Converts raw Bayer frames to colour frames. Reuses its buffers between frames, so keep one around for a whole capture.
+
+        Parameters
+        ----------
+        method : str, optional
+            How to fill in the missing colours, see DEMOSAIC_METHODS, by default "bilinear".
+        colorOrder : str, optional
+            Order of the colour channels of the output, "BGR" (default, like the BGR8 pixel format) or "RGB".
+        threads : int, optional
+            Number of threads to split every frame over (in tiles of rows), by default 1 (no threads).
+
+        Example
+        ------
+        demosaicer = Demosaicer("bilinear", threads = 4)
+        colour = demosaicer(raw, "RG")
+        """
+        if method not in DEMOSAIC_METHODS:
+            raise ValueError(f"method should be one of {DEMOSAIC_METHODS}, not {method}")
+        if colorOrder not in COLOR_ORDERS:
+            raise ValueError(f"colorOrder should be one of {COLOR_ORDERS}, not {colorOrder}")
+        self.method = method
+        self.colorOrder = colorOrder
+        self.threads = threads
+        self._executor = None
+        self._padded = None
+        self._scratch = dict() # per tile accumulation buffers
+
+    def outputShape(self, rawShape : tuple) -> tuple:
+        """
+        Shape of the colour frame made from a raw frame of rawShape.
+        """
+        height, width = rawShape
+        if self.method == "bin2x2":
+            return (height // 2, width // 2, 3)
+        return (height, width, 3)
+
+    def __call__(self, raw : np.ndarray, pattern : str = "RG", out : np.ndarray|None = None) -> np.ndarray:
+        """
+        Convert raw (H,W), with the Bayer pattern pattern (see BAYER_PATTERNS), into out and return out. If out is None, a new array is made. Height and width must be even.
+        """
+        if raw.ndim != 2 or raw.shape[0] % 2 or raw.shape[1] % 2:
+            raise ValueError(f"raw Bayer frames should be 2D with an even height and width, not of shape {raw.shape}")
+        if pattern not in BAYER_PATTERNS:
+            raise ValueError(f"pattern should be one of {list(BAYER_PATTERNS)}, not {pattern}")
+        if out is None:
+            out = np.empty(self.outputShape(raw.shape), dtype=raw.dtype)
+        if self.method == "bilinear":
+            source = self._pad(raw)
+            convertRows = self._bilinearRows
+        else:
+            source = raw
+            convertRows = self._binnedRows
+        tiles = self._tiles(raw.shape[0] // 2)
+        if len(tiles) == 1:
+            convertRows(source, pattern, out, *tiles[0], 0)
+        else:
+            futures = [self._getExecutor().submit(convertRows, source, pattern, out, start, stop, i) for i, (start, stop) in enumerate(tiles)]
+            for future in futures:
+                future.result()
+        return out
+
+    def close(self):
+        """
+        Stop the thread pool, if any.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _tiles(self, blockRows : int) -> list:
+        """
+        Split the rows of 2x2 blocks over the threads, as (start, stop) pairs.
+        """
+        n = max(1, min(self.threads, blockRows))
+        edges = np.linspace(0, blockRows, n + 1).astype(int)
+        return list(zip(edges[:-1], edges[1:]))
+
+    def _getExecutor(self):
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="pyunicam-demosaic")
+        return self._executor
+
+    def _pad(self, raw : np.ndarray) -> np.ndarray:
+        """
+        Copy raw into a reused buffer with a border of one pixel, mirrored so the Bayer pattern continues over the edge.
+        """
+        shape = (raw.shape[0] + 2, raw.shape[1] + 2)
+        if self._padded is None or self._padded.shape != shape or self._padded.dtype != raw.dtype:
+            self._padded = np.empty(shape, dtype=raw.dtype)
+        padded = self._padded
+        padded[1:-1, 1:-1] = raw
+        padded[0, 1:-1] = raw[1]
+        padded[-1, 1:-1] = raw[-2]
+        padded[:, 0] = padded[:, 2]
+        padded[:, -1] = padded[:, -3]
+        return padded
+
+    def _getScratch(self, tile : int, shape : tuple, dtype) -> np.ndarray:
+        scratch = self._scratch.get(tile)
+        if scratch is None or scratch.shape != shape or scratch.dtype != dtype:
+            scratch = np.empty(shape, dtype=dtype)
+            self._scratch[tile] = scratch
+        return scratch
+
+    def _bilinearRows(self, padded : np.ndarray, pattern : str, out : np.ndarray, start : int, stop : int, tile : int):
+        """
+        Bilinear demosaicing of the block rows start to stop. Every pixel site (dy,dx) of the 2x2 block is handled as a quarter-resolution plane, its neighbours are shifted views of the padded frame.
+        """
+        colors = BAYER_PATTERNS[pattern]
+        width = out.shape[1] // 2
+        rows = stop - start
+        acc = self._getScratch(tile, (rows, width), _accumulatorType(padded.dtype))
+        def neighbour(dy, dx, oy, ox):
+            y0 = 1 + 2 * start + dy + oy
+            x0 = 1 + dx + ox
+            return padded[y0 : y0 + 2 * rows : 2, x0 : x0 + 2 * width : 2]
+        def average(target, dy, dx, offsets):
+            np.add(neighbour(dy, dx, *offsets[0]), neighbour(dy, dx, *offsets[1]), out=acc, dtype=acc.dtype)
+            for offset in offsets[2:]:
+                np.add(acc, neighbour(dy, dx, *offset), out=acc)
+            _divide(acc, len(offsets))
+            target[...] = acc
+        cross = ((-1, 0), (1, 0), (0, -1), (0, 1))
+        diagonal = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+        for dy in (0, 1):
+            for dx in (0, 1):
+                site = out[2 * start + dy : 2 * stop : 2, dx::2]
+                color = colors[dy][dx]
+                site[..., self.colorOrder.index(color)] = neighbour(dy, dx, 0, 0)
+                if color == "G":
+                    average(site[..., self.colorOrder.index(colors[dy][1 - dx])], dy, dx, ((0, -1), (0, 1)))
+                    average(site[..., self.colorOrder.index(colors[1 - dy][dx])], dy, dx, ((-1, 0), (1, 0)))
+                else:
+                    other = "B" if color == "R" else "R"
+                    average(site[..., self.colorOrder.index("G")], dy, dx, cross)
+                    average(site[..., self.colorOrder.index(other)], dy, dx, diagonal)
+
+    def _binnedRows(self, raw : np.ndarray, pattern : str, out : np.ndarray, start : int, stop : int, tile : int):
+        """
+        Nearest and 2x2 binning demosaicing of the block rows start to stop: every 2x2 block gives one colour, with the average of its two green pixels.
+        """
+        colors = BAYER_PATTERNS[pattern]
+        blocks = raw[2 * start : 2 * stop]
+        planes = {}
+        greens = []
+        for dy in (0, 1):
+            for dx in (0, 1):
+                if colors[dy][dx] == "G":
+                    greens.append(blocks[dy::2, dx::2])
+                else:
+                    planes[colors[dy][dx]] = blocks[dy::2, dx::2]
+        if self.method == "bin2x2":
+            target = out[start:stop]
+        else:
+            target = self._getScratch(tile, (stop - start, out.shape[1] // 2, 3), out.dtype)
+        acc = self._getScratch(-1 - tile, greens[0].shape, _accumulatorType(raw.dtype))
+        np.add(greens[0], greens[1], out=acc, dtype=acc.dtype)
+        _divide(acc, 2)
+        target[..., self.colorOrder.index("G")] = acc
+        target[..., self.colorOrder.index("R")] = planes["R"]
+        target[..., self.colorOrder.index("B")] = planes["B"]
+        if self.method == "nearest":
+            for dy in (0, 1):
+                for dx in (0, 1):
+                    out[2 * start + dy : 2 * stop : 2, dx::2] = target
+
+def _accumulatorType(dtype) -> np.dtype:
+    """
+    Integer type big enough to sum 4 pixels of dtype without overflowing.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind in "ui" and dtype.itemsize <= 2:
+        return np.dtype(np.uint32 if dtype.itemsize == 2 else np.uint16)
+    return dtype
+
+def _divide(acc : np.ndarray, n : int):
+    """
+    Divide a sum of n pixels by n in place, rounding to the nearest integer for integer types.
+    """
+    if acc.dtype.kind == "f":
+        acc /= n
+    else:
+        acc += n // 2
+        acc //= n
@@ -1,37 +1,176 @@
 from .universal import *
+from .scheduling import DeadlineScheduler
+from .demosaic import bayerPattern, mosaic
 
+DUMMY_PIXELFORMATS = {
+    # pixelFormat : (dtype, number of colour channels)
+    "Mono8" : (np.uint8, 1),
+    "Mono16" : (np.uint16, 1),
+    "BGR8" : (np.uint8, 3),
+    "RGB8" : (np.uint8, 3),
+    "BayerRG8" : (np.uint8, 3), # made as BGR8, then mosaiced
+    "BayerRG16" : (np.uint16, 3),
+}
 
 class DummyCam(UniversalCam):
-    def __init__(self):
-        super(DummyCam, self).__init__()
+    def __init__(self, bankSize : int = 8, seed : int|None = None, serialNumber : str|None = None, demosaic : str|None = None):
+        """
+        A camera that does not exist. Frames are drawn from a small bank of precomputed synthetic images, so the dummy can hand out frames at thousands of fps, which makes it usefull for testing whatever consumes the frames.
+        The bank follows the width, height, pixelFormat, exposureTime and gain properties, and captures are paced to acquisitionFramerate (or to the exposure time if acquisitionFramerateAuto is set) by a pyunicam.scheduling.DeadlineScheduler.
+
+        Parameters
+        ----------
+        bankSize : int, optional
+            Number of different noisy frames that are cycled through, by default 8.
+        seed : int | None, optional
+            Seed for the noise, by default None.
+        serialNumber : str | None, optional
+            Serial number reported in the metadata, usefull to tell several dummies apart, by default "0".
+        demosaic : str | None, optional
+            How to convert the raw Bayer pixel formats, see UniversalCam, by default None.
+        """
+        self.serialNumber = "0" if serialNumber is None else str(serialNumber)
+        self.dummyBankSize = bankSize
+        self.dummyRng = np.random.default_rng(seed)
+        super(DummyCam, self).__init__(demosaic)
         self.camType = "dummy"
 
-    def startCapture(self):
-        try:
-            if self.camRunningDummy:
-                raise ValueError("dummy camera was allready started")
-            else:
-                self.camRunningDummy = True
-        except NameError:
-            self.camRunningDummy = True
-
-    def stopCapture(self):
-        try:
-            if self.camRunningDummy:
-                self.camRunningDummy = False
-            else:
-                raise ValueError("dummy camera was not recording")
-        except NameError:
+    def _startCaptureDeep(self):
+        if self.camRunningDummy:
+            raise ValueError("dummy camera was allready started")
+        for exposureTime in self.dummyExposureSequence or [None]:
+            self._getFrameBank(exposureTime) # so making the banks does not delay the first frames
+        self.dummySequenceIndex = 0
+        self.camRunningDummy = True
+        self.dummyScheduler = DeadlineScheduler(self._framePeriod(), "skip", spinMargin=0)
+
+    def _stopCaptureDeep(self):
+        if not self.camRunningDummy:
             raise ValueError("dummy camera was not recording")
+        self.camRunningDummy = False
+
+    def close(self):
+        if self.camRunningDummy:
+            self.stopCapture()
 
     def connectCam(self):
-        self.propertyConvert = {i:"auto" for i in self.AVAILABLE_PROPERTIES}
+        self.propertyConvert = {
+            "exposureTime" : 10000,
+            "exposureTimeAuto" : False,
+            "acquisitionFramerate" : 100,
+            "acquisitionFramerateAuto" : True,
+            "gain" : 0,
+            "gainAuto" : False,
+            'pixelFormat' : 'BGR8',
+            'gammaEnable' : False,
+            'gamma' : 1,
+            "height" : 500,
+            "width" : 500,
+        }
         self.camConnection = True
+        self.camRunningDummy = False
+        self.dummyFrameBanks = dict() # exposure time (None for the exposureTime property) : bank of frames
+        self.dummyExposureSequence = None # see setExposureSequence
+        self.dummyFrameNumber = 0
 
     def getMetadata(self):
         cameraMetadata = {
                 "DeviceModelName" : "dummy",
                 "DeviceVendorName" : "dummy Inc.",
                 "DeviceVersion" : "0.0",
+                "DeviceSerialNumber" : self.serialNumber,
         }
-        return cameraMetadata
\ No newline at end of file
+        return cameraMetadata
+
+    def getImages(self, timeout : float|None = None) -> np.ndarray:
+        return self._getFrameInto(None, timeout)
+
+    def _getImageInto(self, out : np.ndarray|None, timeout : float|None = None, meta : np.ndarray|None = None) -> np.ndarray:
+        exposureTime = None
+        if self.dummyExposureSequence is not None and self.camRunningDummy:
+            # the dummy has a sequencer, like a FLIR camera
+            exposureTime = self.dummyExposureSequence[self.dummySequenceIndex % len(self.dummyExposureSequence)]
+            self.dummySequenceIndex += 1
+        bank = self._getFrameBank(exposureTime)
+        if out is None:
+            out = np.empty(bank.shape[1:], dtype=bank.dtype)
+        hardwareTimestamp, hardwareFrameNumber = -1, -1
+        if self.camRunningDummy:
+            delay = self.dummyScheduler.timeUntilNext()
+            if timeout is not None and delay > timeout:
+                time.sleep(timeout)
+                raise TimeoutError(f"next dummy frame is due in {delay} s, more than the timeout of {timeout} s")
+            trigger = self.dummyScheduler.wait()
+            self.instrumentation.record("triggerToFrame", time.perf_counter() - trigger)
+            # the schedule plays the role of the camera clock, so skipped deadlines show up as dropped frames
+            hardwareTimestamp, hardwareFrameNumber = int(trigger * 1e9), self.dummyScheduler.tick - 1
+        self._stampFrame(meta, hardwareTimestamp, hardwareFrameNumber, exposureTime)
+        start = self.instrumentation.start()
+        np.copyto(out, bank[self.dummyFrameNumber % len(bank)])
+        self.instrumentation.stop("copyTime", start)
+        self.dummyFrameNumber += 1
+        return out
+
+    def _statsDeep(self) -> dict:
+        try:
+            scheduler = self.dummyScheduler
+        except AttributeError:
+            return dict()
+        return {"missedDeadlines" : scheduler.missedDeadlines, "lateFrames" : scheduler.lateTriggers}
+
+    def _setPropertyDeep(self, prop : str, value : str|bool|numbers.Number):
+        if prop == "exposureTimeAuto":
+            raise NotImplementedError("the dummy camera has no auto exposure of its own") # so the software auto exposure is used, like on a Thor camera
+        if prop == 'pixelFormat' and value not in DUMMY_PIXELFORMATS:
+            raise ValueError(f"dummy camera does not support pixelFormat '{value}', choose from {list(DUMMY_PIXELFORMATS)}")
+        autoProp = prop + "Auto"
+        if value == -1 and autoProp in self.propertyConvert:
+            self.propertyConvert[autoProp] = True
+        else:
+            self.propertyConvert[prop] = value
+            if autoProp in self.propertyConvert:
+                self.propertyConvert[autoProp] = False
+        self.dummyFrameBanks.clear() # regenerate with the new settings when the next frame is requested
+        if self.camRunningDummy:
+            self.dummyScheduler.setPeriod(self._framePeriod())
+
+    def _framePeriod(self) -> float:
+        """
+        Time between frames (s) while capturing. If the framerate is on auto, the camera runs as fast as the exposure time allows.
+        """
+        if self.propertyConvert["acquisitionFramerateAuto"]:
+            return max(self.dummyExposureSequence or [self.propertyConvert["exposureTime"]]) * 1e-6
+        return 1 / self.propertyConvert["acquisitionFramerate"]
+
+    def _setExposureSequenceDeep(self, exposureTimes : list|None):
+        self.dummyExposureSequence = exposureTimes
+
+    def _getFrameBank(self, exposureTime : float|None = None) -> np.ndarray:
+        try:
+            return self.dummyFrameBanks[exposureTime]
+        except KeyError:
+            bank = self.dummyFrameBanks[exposureTime] = self._makeFrameBank(exposureTime)
+            return bank
+
+    def _makeFrameBank(self, exposureTime : float|None = None) -> np.ndarray:
+        """
+        Make dummyBankSize frames of a smooth scene with shot noise, exposed for exposureTime (µs, by default the exposureTime property). Brightness scales linearly with exposure time and with gain (in dB), saturating at the maximum pixel value, just like a real camera.
+        """
+        dtype, channels = DUMMY_PIXELFORMATS[self.propertyConvert['pixelFormat']]
+        height, width = int(self.propertyConvert["height"]), int(self.propertyConvert["width"])
+        maxValue = np.iinfo(dtype).max
+        y, x = np.ogrid[-1:1:height*1j, -1:1:width*1j]
+        scene = 0.25 + 0.5 * np.exp(-(x**2 + y**2) / 0.3) + 0.1 * x # a blob on a gradient, between 0 and 1
+        scene = np.clip(scene, 0, 1)[..., np.newaxis] * np.linspace(1, 0.8, channels) # slightly tinted for colour formats
+        if exposureTime is None:
+            exposureTime = self.propertyConvert["exposureTime"]
+        brightness = (exposureTime / 10000) * 10**(self.propertyConvert["gain"] / 20)
+        expected = (0.5 * maxValue * brightness) * scene
+        bank = expected + np.sqrt(expected + 1) * self.dummyRng.standard_normal((self.dummyBankSize,) + expected.shape, dtype=np.float32)
+        bank = np.clip(bank, 0, maxValue).astype(dtype)
+        if channels == 1:
+            bank = bank[..., 0]
+        pattern = bayerPattern(self.propertyConvert['pixelFormat'])
+        if pattern is not None:
+            bank = np.stack([mosaic(frame, pattern) for frame in bank])
+        return np.ascontiguousarray(bank)
@@ -4,12 +4,16 @@ from numpy import ndarray
 from .universal import *
 
 class FlirCam(UniversalCam):
-    def __init__(self):
+    def __init__(self, serialNumber : str|None = None, demosaic : str|None = None):
+        """
+        Connect to a FLIR camera. If serialNumber is None, the first camera found is used. By default, colour cameras are set to BGR8; pass demosaic (like "bilinear") to keep raw Bayer pixel formats and convert on the computer instead, see UniversalCam.
+        """
+        self.serialNumber = serialNumber
         import simple_pyspin
         import flir
         self.flirmodule = flir
         self.simple_pyspin = simple_pyspin
-        super(FlirCam, self).__init__()
+        super(FlirCam, self).__init__(demosaic)
         self.camType = "flir"
         
     def connectCam(self):
@@ -26,7 +30,7 @@ class FlirCam(UniversalCam):
             'gammaEnable' : 'GammaEnable',
             'gamma' : 'Gamma',
         }
-        self.camConnection = self.simple_pyspin.Camera()
+        self.camConnection = self.simple_pyspin.Camera(0 if self.serialNumber is None else str(self.serialNumber)) # simple_pyspin takes an index, or a serial number as string
         self.camConnection.init()
 
     def getMetadata(self) -> dict:
@@ -42,16 +46,112 @@ class FlirCam(UniversalCam):
             "DeviceModelName" : self.camConnection.DeviceModelName,
             "DeviceVendorName" : self.camConnection.DeviceVendorName,
             "DeviceVersion" : self.camConnection.DeviceVersion,
+            "DeviceSerialNumber" : self.camConnection.DeviceSerialNumber,
         }
         return cameraMetadata
 
-    def getImages(self) -> ndarray:
-        return self.camConnection.get_array()
+    def getImages(self, timeout : float|None = None) -> ndarray:
+        """
+        Return the next captured image. Spinnaker blocks by itself while waiting, so self.waitStrategy is not used. Raises a TimeoutError if no image arrived within timeout seconds (None waits as long as it takes).
+        """
+        return self._getFrameInto(None, timeout)
+
+    def _getImageInto(self, out : ndarray|None, timeout : float|None = None, meta : ndarray|None = None):
+        """
+        Copy the next image straight from the Spinnaker image buffer into out, skipping the intermediate array get_array makes. If out is None, a new array is made. If meta is given, the metadata of the image is written into it, including exposure time and gain from the chunk data if chunk mode is enabled on the camera.
+        """
+        PySpin = self.simple_pyspin.PySpin
+        try:
+            image = self.camConnection.cam.GetNextImage(PySpin.EVENT_TIMEOUT_INFINITE if timeout is None else int(timeout * 1000))
+        except PySpin.SpinnakerException as e:
+            if timeout is None or e.errorcode != PySpin.SPINNAKER_ERR_TIMEOUT:
+                raise e # a stopped or lost camera is not a timeout, the acquisition thread would wait for it forever
+            raise TimeoutError(f"no image arrived within {timeout} s") from e
+        try:
+            if meta is None:
+                self._stampFrame(None, hardwareFrameNumber = image.GetFrameID())
+            else:
+                self._stampFrame(meta, image.GetTimeStamp(), image.GetFrameID(), *self._getChunkSettings(image))
+            start = self.instrumentation.start()
+            if out is None:
+                out = np.array(image.GetNDArray())
+            else:
+                np.copyto(out, image.GetNDArray())
+            self.instrumentation.stop("copyTime", start)
+        finally:
+            image.Release()
+        return out
+
+    def _getChunkSettings(self, image) -> tuple[float|None, float|None]:
+        """
+        Return the exposure time and gain stored in the chunk data of an image, or Nones if chunk data is not enabled.
+        """
+        try:
+            chunk = image.GetChunkData()
+            return chunk.GetExposureTime(), chunk.GetGain()
+        except self.simple_pyspin.PySpin.SpinnakerException:
+            return None, None
+
+    def _setROIDeep(self, roi : tuple|None):
+        """
+        Set the region of interest with the OffsetX/OffsetY/Width/Height nodes. Spinnaker counts these in binned pixels (if the camera bins), sizes have to be a multiple of the increment of the camera.
+        """
+        c = self.camConnection
+        try:
+            c.OffsetX = 0 # so any width fits
+            c.OffsetY = 0
+            if roi is None:
+                c.Width = c.WidthMax
+                c.Height = c.HeightMax
+            else:
+                scale = self.binning if self.binningInHardware else 1
+                x, y, width, height = (v // scale for v in roi)
+                c.Width = width
+                c.Height = height
+                c.OffsetX = x
+                c.OffsetY = y
+        except AttributeError as e:
+            raise NotImplementedError(f"this FLIR camera has no region of interest: {e}")
+
+    def _setBinningDeep(self, factor : int):
+        try:
+            self.camConnection.BinningHorizontal = factor
+            self.camConnection.BinningVertical = factor
+        except AttributeError as e:
+            raise NotImplementedError(f"this FLIR camera cannot bin: {e}")
+
+    def _setExposureSequenceDeep(self, exposureTimes : list|None):
+        """
+        Program the sequencer of the camera: one sequencer set per exposure time, each moving on to the next at every frame, so the camera switches exposure times without any help from the computer.
+        """
+        c = self.camConnection
+        try:
+            c.SequencerMode = "Off"
+            if exposureTimes is None:
+                return
+            self._setPropertyFLIRDeep("exposureTimeAuto", False)
+            c.SequencerConfigurationMode = "On"
+            for i, exposureTime in enumerate(exposureTimes):
+                c.SequencerSetSelector = i
+                c.ExposureTime = exposureTime
+                c.SequencerPathSelector = 0
+                c.SequencerTriggerSource = "FrameStart"
+                c.SequencerSetNext = (i + 1) % len(exposureTimes)
+                c.SequencerSetSave()
+            c.SequencerSetStart = 0
+            c.SequencerConfigurationMode = "Off"
+            c.SequencerMode = "On"
+        except (AttributeError, self.simple_pyspin.PySpin.SpinnakerException) as e:
+            try:
+                c.SequencerConfigurationMode = "Off"
+            except (AttributeError, self.simple_pyspin.PySpin.SpinnakerException):
+                pass
+            raise NotImplementedError(f"cannot use the sequencer of this FLIR camera: {e}")
 
     def _setPropertyDeep(self, prop : str, value : str|bool|numbers.Number):
         '''Set FLIR camera properties. If property is set to -1, set it to auto. If set to anything else as -1, set the property to manual mode (so AUTO=False!), if it is available.'''
         if 'Auto' in prop:
-            return self._setPropertyFLIRDeep(property,value)
+            return self._setPropertyFLIRDeep(prop,value)
         autoProp = prop + "Auto"
         if value == -1:
             # do not set value at all, but enable automation
@@ -72,13 +172,12 @@ class FlirCam(UniversalCam):
         if not property in irregularSetting:
             try:
                 self.camConnection.camera_attributes[self.propertyConvert[property]].SetValue(value)
-                return self._getPropertyFLIR(property)
+                return self._getPropertyDeep(property)
             except self.simple_pyspin.PySpin.SpinnakerException as e: # no connection, wait a bit and try again, do n times. Sometimes this seems to happen?
                 if recursedepth >= maxrecursedepth:
                     raise e
                 time.sleep(0.01)
-                dummy = self._getPropertyFLIR(property)
-                self._setPropertyFLIRDeep(property, value, recursedepth=recursedepth+1,maxrecursedepth=5)
+                return self._setPropertyFLIRDeep(property, value, recursedepth=recursedepth+1,maxrecursedepth=maxrecursedepth)
         else:
             if property == "exposureTimeAuto":
                 self.flirmodule.exposureAutoSetter(self.camConnection,value)
@@ -94,7 +193,9 @@ class FlirCam(UniversalCam):
     def _getPropertyDeep(self,prop : str) -> str|bool|numbers.Number:
         result = self.camConnection.get_info(self.propertyConvert[prop])["value"]
         if result in ('off', 'Off', 'false', 'False'):
-            return False
+            result = False
         elif result in ('on','On','continuous','once','Continuous','Once'):
-            return True
+            result = True
+        if prop == 'acquisitionFramerateAuto':
+            return not result # AcquisitionFrameRateEnable means the framerate is set by hand, see _setPropertyFLIRDeep
         return result
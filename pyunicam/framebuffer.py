@@ -0,0 +1,208 @@
+"""
+Fixed-capacity ring buffer for camera frames. All memory is allocated once when the buffer is made, and frames are copied into preallocated slots, so memory use stays flat no matter how long you capture.
+"""
+import threading
+import numpy as np
+
+OVERFLOW_POLICIES = (
+    "block", # producer waits until the consumer made room
+    "dropOldest", # overwrite the oldest frame that was not collected yet
+    "dropNewest", # throw away the incoming frame
+)
+
+class FrameRingBuffer(object):
+    def __init__(self, capacity : int, shape : tuple, dtype = np.uint8, overflowPolicy : str = "dropOldest", metaDtype = None):
+        """
+        Make a ring buffer holding at most `capacity` frames of the given shape and dtype.
+
+        Parameters
+        ----------
+        capacity : int
+            Maximum number of frames kept in the buffer.
+        shape : tuple
+            Shape of a single frame, like (height, width) or (height, width, 3).
+        dtype : numpy dtype, optional
+            Datatype of the frames, by default np.uint8
+        overflowPolicy : str, optional
+            What to do when a frame comes in while the buffer is full, one of OVERFLOW_POLICIES. By default "dropOldest".
+        metaDtype : numpy dtype, optional
+            If given, every slot also holds a metadata record of this (structured) dtype, which travels along with its frame. See put and getWithMetadata.
+        """
+        if overflowPolicy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflowPolicy must be one of {OVERFLOW_POLICIES}, not '{overflowPolicy}'")
+        if capacity < 1:
+            raise ValueError("capacity of a frame buffer must be at least 1")
+        self.capacity = int(capacity)
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.overflowPolicy = overflowPolicy
+        self.slots = np.empty((self.capacity,) + self.shape, dtype=self.dtype)
+        self.metadata = None if metaDtype is None else np.zeros(self.capacity, dtype=metaDtype)
+        self.droppedFrames = 0
+        self._head = 0 # slot of the oldest frame
+        self._count = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._notEmpty = threading.Condition(self._lock)
+        self._notFull = threading.Condition(self._lock)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def put(self, frame : np.ndarray, timeout : float|None = None, meta = None) -> bool:
+        """
+        Copy a frame into the next free slot. The frame can be any array-like with the right number of pixels, like the buffer of an SDK frame object.
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            Frame to store.
+        timeout : float | None, optional
+            Only used for the "block" policy: maximum time (s) to wait for room. None waits forever.
+        meta : optional
+            Metadata record stored next to the frame, only if the buffer was made with a metaDtype.
+
+        Returns
+        -------
+        bool
+            True if the frame was stored, False if it was dropped (or the buffer was closed).
+        """
+        with self._lock:
+            if self._closed:
+                return False
+            if self._count == self.capacity:
+                if self.overflowPolicy == "dropNewest":
+                    self.droppedFrames += 1
+                    return False
+                elif self.overflowPolicy == "dropOldest":
+                    self._head = (self._head + 1) % self.capacity
+                    self._count -= 1
+                    self.droppedFrames += 1
+                else:
+                    self._notFull.wait_for(lambda: self._count < self.capacity or self._closed, timeout)
+                    if self._closed or self._count == self.capacity:
+                        self.droppedFrames += 1
+                        return False
+            slot = (self._head + self._count) % self.capacity
+            np.copyto(self.slots[slot], np.reshape(frame, self.shape), casting='unsafe')
+            if meta is not None:
+                self.metadata[slot] = meta
+            self._count += 1
+            self._notEmpty.notify()
+            return True
+
+    def get(self, timeout : float|None = None, out : np.ndarray|None = None) -> np.ndarray:
+        """
+        Take the oldest frame out of the buffer. The frame is copied out of its slot, so the slot can be reused straight away.
+
+        Parameters
+        ----------
+        timeout : float | None, optional
+            Maximum time (s) to wait for a frame to arrive. None waits forever.
+        out : np.ndarray | None, optional
+            Array to copy the frame into. If None, a new array is made.
+
+        Returns
+        -------
+        np.ndarray
+            The oldest frame in the buffer.
+
+        Raises
+        ------
+        TimeoutError
+            If no frame arrived within timeout, or the buffer is closed and empty.
+        """
+        return self._take(timeout, out)[0]
+
+    def getWithMetadata(self, timeout : float|None = None, out : np.ndarray|None = None) -> tuple[np.ndarray, np.void]:
+        """
+        Same as get, but also return (a copy of) the metadata record that was stored with the frame.
+        """
+        return self._take(timeout, out)
+
+    def peekMetadata(self, timeout : float|None = None) -> np.void:
+        """
+        Return (a copy of) the metadata record of the oldest frame, without taking the frame out of the buffer. Raises a TimeoutError like get.
+        """
+        with self._lock:
+            if not self._notEmpty.wait_for(lambda: self._count > 0 or self._closed, timeout) or self._count == 0:
+                raise TimeoutError("no frame arrived in the frame buffer in time")
+            return self.metadata[self._head].copy()
+
+    def peek(self, timeout : float|None = None) -> tuple[np.ndarray, np.void|None]:
+        """
+        Return the oldest frame as a view of its slot (no copy), with (a copy of) its metadata record, without taking it out of the buffer. Call skip once done with it, to free the slot. Only use this with the "block" or "dropNewest" policy, otherwise put may overwrite the slot while you read it. Raises a TimeoutError like get.
+        """
+        with self._lock:
+            if not self._notEmpty.wait_for(lambda: self._count > 0 or self._closed, timeout) or self._count == 0:
+                raise TimeoutError("no frame arrived in the frame buffer in time")
+            meta = None if self.metadata is None else self.metadata[self._head].copy()
+            return self.slots[self._head], meta
+
+    def skip(self):
+        """
+        Throw away the oldest frame (or free its slot after peek), if any. This does not count as a dropped frame.
+        """
+        with self._lock:
+            if self._count > 0:
+                self._freeHead()
+
+    def getIfHead(self, meta : np.void, out : np.ndarray|None = None) -> np.ndarray|None:
+        """
+        Take the oldest frame out of the buffer like get, but only if it is still the frame peekMetadata returned meta for. With the "dropOldest" policy, put may have thrown that frame away in the meantime, in which case nothing is taken and None is returned. Never waits. Frames are told apart by the raw bytes of their metadata records, so those should identify a frame (like the frame number and timestamps of pyunicam.metadata.FRAME_METADATA_DTYPE).
+        """
+        with self._lock:
+            if not self._isHead(meta):
+                return None
+            return self._copyHead(out)[0]
+
+    def skipIfHead(self, meta : np.void) -> bool:
+        """
+        Same as skip, but only if the oldest frame is still the frame peekMetadata returned meta for, see getIfHead. Returns whether a frame was thrown away.
+        """
+        with self._lock:
+            if not self._isHead(meta):
+                return False
+            self._freeHead()
+            return True
+
+    def _isHead(self, meta : np.void) -> bool:
+        return self._count > 0 and self.metadata[self._head].tobytes() == meta.tobytes()
+
+    def _take(self, timeout : float|None, out : np.ndarray|None) -> tuple[np.ndarray, np.void|None]:
+        with self._lock:
+            if not self._notEmpty.wait_for(lambda: self._count > 0 or self._closed, timeout) or self._count == 0:
+                raise TimeoutError("no frame arrived in the frame buffer in time")
+            return self._copyHead(out)
+
+    def _copyHead(self, out : np.ndarray|None) -> tuple[np.ndarray, np.void|None]:
+        # callers hold the lock and made sure there is a frame
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        np.copyto(out, self.slots[self._head])
+        meta = None if self.metadata is None else self.metadata[self._head].copy()
+        self._freeHead()
+        return out, meta
+
+    def _freeHead(self):
+        self._head = (self._head + 1) % self.capacity
+        self._count -= 1
+        self._notFull.notify()
+
+    def clear(self):
+        """
+        Throw away all frames currently in the buffer. These do not count as dropped frames.
+        """
+        with self._lock:
+            self._head = 0
+            self._count = 0
+            self._notFull.notify_all()
+
+    def close(self):
+        """
+        Stop accepting new frames and wake up anyone waiting on the buffer. Frames still in the buffer can be collected with get.
+        """
+        with self._lock:
+            self._closed = True
+            self._notEmpty.notify_all()
+            self._notFull.notify_all()
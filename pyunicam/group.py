@@ -0,0 +1,223 @@
+"""
+Capture with several cameras at once. A CameraGroup runs every camera on its own acquisition thread (see pyunicam.stages), so a slow camera does not hold up the others, and hands out sets of frames (one per camera) that were taken at the same time.
+"""
+import threading
+import time
+import numpy as np
+from .stages import CaptureStage
+from .framebuffer import FrameRingBuffer
+from .metadata import FRAME_METADATA_DTYPE
+from .connect import connect_cam
+
+class CameraGroup(object):
+    def __init__(self, specs : list, maxQueuedFrames : int = 32, tolerance : float|None = None):
+        """
+        Connect to several cameras.
+
+        Parameters
+        ----------
+        specs : list
+            One entry per camera: a camtype like "thor", a (camtype, serialNumber) tuple, or a dict of connect_cam arguments like {"camtype" : "thor", "serialNumber" : "12345"}.
+        maxQueuedFrames : int, optional
+            Number of frames per camera that can wait to be matched, by default 32. If getFrameSet is not called fast enough, the oldest frames are dropped.
+        tolerance : float | None, optional
+            Maximum difference in arrival time (s) of frames in one set. If None (default), half the frame interval of the slowest camera, so getFrameSet first waits until every camera delivered two frames.
+
+        Example
+        ------
+        with CameraGroup([("thor", "12345"), ("thor", "67890")]) as group:
+            group.setProperty("exposureTime", 10000)
+            group.startCapture()
+            for _ in range(100):
+                frames, meta = group.getFrameSet()
+            group.stopCapture()
+        """
+        self.cams = list()
+        try:
+            for spec in specs:
+                self.cams.append(_connectSpec(spec))
+        except Exception:
+            for cam in self.cams:
+                cam.close()
+            raise
+        self.members = [_GroupMember(maxQueuedFrames) for _ in self.cams]
+        self.tolerance = tolerance
+        self.unmatchedFrames = 0 # frames thrown away because no other camera took a frame at the same time
+        self.capturing = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.cams)
+
+    def __getitem__(self, index : int):
+        return self.cams[index]
+
+    def close(self):
+        """
+        Stop capturing and close all cameras.
+        """
+        if self.capturing:
+            self.stopCapture()
+        _inParallel(lambda cam: cam.close(), self.cams)
+
+    def startCapture(self):
+        """
+        Start capturing on all cameras at the same time. Collect the frames using getFrameSet.
+        """
+        for cam, member in zip(self.cams, self.members):
+            cam.addStage(member)
+        try:
+            _inParallel(lambda cam: cam.startCapture(), self.cams)
+        except Exception:
+            for cam, member in zip(self.cams, self.members):
+                cam.removeStage(member)
+            raise
+        self.capturing = True
+
+    def stopCapture(self):
+        """
+        Stop capturing on all cameras.
+        """
+        try:
+            _inParallel(lambda cam: cam.stopCapture(), self.cams)
+        finally:
+            for cam, member in zip(self.cams, self.members):
+                cam.removeStage(member)
+            self.capturing = False
+
+    def setProperty(self, prop : str, value) -> list:
+        """
+        Set a property on all cameras (in parallel), see UniversalCam.setProperty. Returns the values per camera.
+        """
+        return _inParallel(lambda cam: cam.setProperty(prop, value), self.cams)
+
+    def setProperties(self, properties : dict) -> list:
+        """
+        Set several properties on all cameras (in parallel), see UniversalCam.setProperties. Returns the values per camera.
+        """
+        return _inParallel(lambda cam: cam.setProperties(properties), self.cams)
+
+    def getProperty(self, prop : str) -> list:
+        """
+        Get a property of every camera.
+        """
+        return [cam.getProperty(prop) for cam in self.cams]
+
+    def getFrameSet(self, timeout : float|None = None) -> tuple[list, np.ndarray]:
+        """
+        Return the oldest set of frames, one per camera, that arrived within the tolerance of each other. Frames of one camera without a partner in the other cameras are skipped (and counted in self.unmatchedFrames). Arrival times are on the host clock, since the clocks of different cameras cannot be compared.
+
+        Parameters
+        ----------
+        timeout : float | None, optional
+            Maximum time (s) to wait for a complete set, raises a TimeoutError after that. None waits as long as it takes.
+
+        Returns
+        -------
+        frames : list
+            One frame per camera, in the order of the cameras.
+        metadata : np.ndarray
+            Structured array with the metadata of each frame, see pyunicam.metadata.FRAME_METADATA_DTYPE.
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        remaining = lambda: None if deadline is None else max(deadline - time.perf_counter(), 0)
+        buffers = [member.waitForBuffer(remaining()) for member in self.members]
+        if self.tolerance is None:
+            for member in self.members:
+                member.waitForInterval(remaining()) # matching without knowing the intervals would throw the first frames away
+        while True:
+            heads = [buffer.peekMetadata(remaining()) for buffer in buffers]
+            times = np.array([head["hostTimestamp"] for head in heads])
+            stale = np.flatnonzero(times.max() - times > self._tolerance())
+            for i in stale:
+                if buffers[i].skipIfHead(heads[i]): # otherwise it was dropped already
+                    self.unmatchedFrames += 1
+            if len(stale) > 0:
+                continue
+            # a full buffer drops its oldest frame on a put, so only take frames that are still the ones matched
+            frames = [buffer.getIfHead(head) for buffer, head in zip(buffers, heads)]
+            if all(frame is not None for frame in frames):
+                return frames, np.array(heads, dtype=FRAME_METADATA_DTYPE)
+            self.unmatchedFrames += sum(frame is not None for frame in frames) # lost their partner, start over
+
+    def getDroppedFrames(self) -> list:
+        """
+        Return per camera the number of frames dropped because getFrameSet was not called fast enough.
+        """
+        return [0 if member.buffer is None else member.buffer.droppedFrames for member in self.members]
+
+    def _tolerance(self) -> float:
+        if self.tolerance is not None:
+            return self.tolerance
+        return 0.5 * max(member.interval for member in self.members) # known, see getFrameSet
+
+class _GroupMember(CaptureStage):
+    """
+    Collects the frames of one camera of a CameraGroup, from the acquisition thread of that camera.
+    """
+    def __init__(self, maxQueuedFrames : int):
+        self.maxQueuedFrames = maxQueuedFrames
+        self.buffer = None
+        self.ready = threading.Event()
+        self.intervalKnown = threading.Event()
+
+    def start(self, cam):
+        self.buffer = None
+        self.ready.clear()
+        self.intervalKnown.clear()
+        self.lastTimestamp = None
+        self.interval = None # time between the last two frames (s), None until two frames arrived
+
+    def process(self, frame, meta):
+        if self.buffer is None:
+            self.buffer = FrameRingBuffer(self.maxQueuedFrames, frame.shape, frame.dtype, "dropOldest", metaDtype = FRAME_METADATA_DTYPE)
+            self.ready.set()
+        timestamp = float(meta["hostTimestamp"])
+        if self.lastTimestamp is not None:
+            self.interval = timestamp - self.lastTimestamp
+            self.intervalKnown.set()
+        self.lastTimestamp = timestamp
+        self.buffer.put(frame, meta = meta)
+
+    def waitForBuffer(self, timeout : float|None) -> FrameRingBuffer:
+        if not self.ready.wait(timeout):
+            raise TimeoutError("camera did not deliver a frame in time")
+        return self.buffer
+
+    def waitForInterval(self, timeout : float|None):
+        if not self.intervalKnown.wait(timeout):
+            raise TimeoutError("camera did not deliver a second frame in time")
+
+def _connectSpec(spec):
+    if isinstance(spec, str):
+        return connect_cam(spec)
+    elif isinstance(spec, dict):
+        return connect_cam(**spec)
+    else:
+        return connect_cam(*spec)
+
+def _inParallel(function, cams : list) -> list:
+    """
+    Call function(cam) for all cams, each on its own thread, and return the results in order. If any of the calls fails, the first exception is raised once all calls are done.
+    """
+    results = [None] * len(cams)
+    errors = [None] * len(cams)
+    def run(i, cam):
+        try:
+            results[i] = function(cam)
+        except Exception as e:
+            errors[i] = e
+    threads = [threading.Thread(target=run, args=(i, cam)) for i, cam in enumerate(cams)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for error in errors:
+        if error is not None:
+            raise error
+    return results
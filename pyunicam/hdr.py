@@ -0,0 +1,150 @@
+"""
+High dynamic range imaging: merge frames taken with different exposure times (see UniversalCam.setExposureSequence) into one frame of radiance, in counts per µs of exposure. Every pixel is a weighted average of its value divided by the exposure time, over the frames of a set. The weights follow a hat function of the pixel value, so well exposed pixels count most, and saturated or black pixels not at all.
+
+Merging is streaming: frames are added one by one into preallocated float32 sums, so a set costs a few vectorized passes per frame and no allocations.
+"""
+import numpy as np
+from .stages import CaptureStage
+from .framebuffer import FrameRingBuffer
+from .metadata import FRAME_METADATA_DTYPE
+
+class HDRMerger(CaptureStage):
+    def __init__(self, exposures : int|None = None, maxValue : float|None = None, maxQueuedFrames : int = 8):
+        """
+        Merge every set of frames with different exposure times into a high dynamic range frame. Attach to a camera with cam.addStage, after setting an exposure sequence, and collect the merged frames with getFrame. Frames can also be added by hand, see add.
+
+        Parameters
+        ----------
+        exposures : int | None, optional
+            Number of frames in a set, by default the length of the exposure sequence of the camera (see UniversalCam.setExposureSequence).
+        maxValue : float | None, optional
+            Pixel value at which pixels saturate, by default what the camera reports, or else the maximum of the pixel type.
+        maxQueuedFrames : int, optional
+            Number of merged frames kept for getFrame, by default 8. If they are not collected in time, the oldest are dropped.
+
+        Example
+        ------
+        cam.setExposureSequence([100, 1000, 10000])
+        hdr = HDRMerger()
+        cam.addStage(hdr)
+        cam.startCapture()
+        radiance, meta = hdr.getFrame()
+        cam.stopCapture()
+        """
+        self.exposures = exposures
+        self.maxValue = maxValue
+        self.maxQueuedFrames = maxQueuedFrames
+        self.merged = None # FrameRingBuffer of merged frames, made at the first frame
+        self.setsMerged = 0
+        self._frames = exposures # frames per set, see start
+        self._cameraMaxValue = None
+        self._sums = None
+
+    def start(self, cam):
+        if cam.exposureSequence is None and self.exposures is None:
+            raise ValueError("the camera has no exposure sequence, see setExposureSequence")
+        self._frames = self.exposures or len(cam.exposureSequence)
+        self._cameraMaxValue = cam._maxPixelValue()
+        self.reset()
+
+    def process(self, frame : np.ndarray, meta : np.ndarray):
+        if self.add(frame, float(meta["exposureTime"])):
+            if self.merged is None:
+                self.merged = FrameRingBuffer(self.maxQueuedFrames, frame.shape, dtype=np.float32, overflowPolicy="dropOldest", metaDtype=FRAME_METADATA_DTYPE)
+            self.merged.put(self.result(self._result), meta=meta) # with the metadata of the last frame of the set
+
+    def stop(self):
+        if self.merged is not None:
+            self.merged.close()
+
+    def getFrame(self, timeout : float|None = None, out : np.ndarray|None = None) -> tuple[np.ndarray, np.void]:
+        """
+        Return the oldest merged frame that was not collected yet (float32, in counts per µs), with the metadata of the last frame of its set. Raises a TimeoutError if none arrived within timeout (s).
+        """
+        if self.merged is None:
+            raise TimeoutError("no set of frames was merged yet")
+        return self.merged.getWithMetadata(timeout, out)
+
+    def reset(self):
+        """
+        Forget the frames of the set that is being merged.
+        """
+        self._count = 0
+        self._shortest = np.inf
+
+    def add(self, frame : np.ndarray, exposureTime : float) -> bool:
+        """
+        Add a frame exposed for exposureTime (µs) to the set that is being merged. Returns True if the set is complete, then get the merged frame with result; the next frame starts a new set.
+        """
+        if not exposureTime > 0:
+            raise ValueError(f"cannot merge a frame without a (positive) exposure time, got {exposureTime}")
+        if self._sums is None or self._sums[0].shape != frame.shape:
+            self._allocate(frame.shape)
+        radiance, weights, weight, scaled = self._sums
+        if self._count == 0:
+            radiance.fill(0)
+            weights.fill(0)
+        maxValue = self._maxValue(frame.dtype)
+        # hat weight 1 - |2 v / maxValue - 1|: 1 halfway, 0 when black or saturated
+        np.multiply(frame, 2 / maxValue, out=weight, dtype=np.float32)
+        weight -= 1
+        np.abs(weight, out=weight)
+        np.subtract(1, weight, out=weight)
+        np.maximum(weight, 0, out=weight) # values above maxValue count as saturated
+        np.multiply(frame, 1 / exposureTime, out=scaled, dtype=np.float32)
+        if exposureTime < self._shortest:
+            # for pixels that are saturated (or black) in all frames, the shortest exposure is the best guess
+            self._shortest = exposureTime
+            np.copyto(self._result, scaled)
+        scaled *= weight
+        radiance += scaled
+        weights += weight
+        self._count += 1
+        if self._count < self._frames:
+            return False
+        self._count = 0
+        self._shortest = np.inf
+        self.setsMerged += 1
+        return True
+
+    def result(self, out : np.ndarray|None = None) -> np.ndarray:
+        """
+        Merged frame of the last complete set (float32, in counts per µs). Written into out, or a new array if out is None.
+        """
+        radiance, weights, _, _ = self._sums
+        if out is None:
+            out = np.empty(radiance.shape, dtype=np.float32)
+        # where no frame was well exposed, out keeps the shortest exposure (stored there by add)
+        if out is not self._result:
+            np.copyto(out, self._result)
+        np.divide(radiance, weights, out=out, where=weights > 0)
+        return out
+
+    def _allocate(self, shape : tuple):
+        self._sums = tuple(np.zeros(shape, dtype=np.float32) for _ in range(4)) # radiance, weights, weight of the frame, frame scaled to counts per µs
+        self._result = np.zeros(shape, dtype=np.float32)
+        self._count = 0
+        self._shortest = np.inf
+
+    def _maxValue(self, dtype) -> float:
+        if self.maxValue is not None:
+            return self.maxValue
+        if self._cameraMaxValue is not None:
+            return self._cameraMaxValue
+        return np.iinfo(dtype).max if np.dtype(dtype).kind in "ui" else 1.0
+
+def mergeExposures(frames, exposureTimes : list, maxValue : float|None = None, out : np.ndarray|None = None) -> np.ndarray:
+    """
+    Merge a set of frames (a stack, or list of frames) with the given exposure times (µs) into one high dynamic range frame, see HDRMerger.
+
+    Returns
+    -------
+    np.ndarray
+        Radiance in counts per µs (float32), of the shape of a single frame.
+    """
+    if len(frames) != len(exposureTimes):
+        raise ValueError(f"got {len(frames)} frames, but {len(exposureTimes)} exposure times")
+    merger = HDRMerger(len(frames), maxValue)
+    for frame, exposureTime in zip(frames, exposureTimes):
+        merger.add(np.asarray(frame), exposureTime)
+    return merger.result(out)
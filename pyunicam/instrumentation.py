@@ -0,0 +1,165 @@
+"""
+Lightweight counters and histograms for the capture hot paths, to find out why capturing falls behind. Every camera has one Instrumentation (cam.instrumentation), which is off by default and then costs no more than checking a bool. Switch it on and read it out with:
+
+    cam.instrumentation.enabled = True
+    ...
+    print(cam.stats())
+
+What is measured (times in s):
+
+- "sdk.getProperty", "sdk.setProperty": latency of the calls to the camera SDK for properties
+- "triggerToFrame": from a (software) trigger to the frame arriving
+- "pollIterations": number of polls before a frame was there, for cameras that are polled (see pyunicam.waiting)
+- "queueDepth": frames waiting in the frame buffer of the camera when one is taken out
+- "copyTime": copying a frame out of the SDK buffer
+- "convertTime": converting a frame on the computer (region of interest, demosaicing, binning)
+- "stage.<name>": time a capture stage takes per frame (see pyunicam.stages)
+- "droppedFrames": frames missing from the frame counter of the camera, "lateFrames": triggers that were more than a frame period late
+"""
+import math
+import threading
+import time
+import numpy as np
+
+HISTOGRAM_BINS_PER_DECADE = 10
+HISTOGRAM_RANGE = (1e-7, 1e3) # values outside are counted in the first or last bin
+
+class Histogram(object):
+    """
+    Histogram with logarithmic bins, so recording a value is a single log and an increment. Keeps count, sum, min and max exactly; percentiles are accurate to within a bin (about 25%).
+    """
+    def __init__(self):
+        self.low = math.log10(HISTOGRAM_RANGE[0])
+        decades = math.log10(HISTOGRAM_RANGE[1]) - self.low
+        self.bins = [0] * (int(decades * HISTOGRAM_BINS_PER_DECADE) + 2) # plus bins for zero and below range, and above range
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value : float):
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value <= 0:
+            index = 0
+        else:
+            index = min(max(int((math.log10(value) - self.low) * HISTOGRAM_BINS_PER_DECADE) + 1, 0), len(self.bins) - 1)
+        self.bins[index] += 1
+
+    def percentile(self, p : float) -> float:
+        """
+        Approximate p-th percentile: the upper edge of the bin it falls in (clipped to min and max).
+        """
+        if self.count == 0:
+            return math.nan
+        target = self.count * p / 100
+        cumulative = np.cumsum(self.bins)
+        index = int(np.searchsorted(cumulative, target))
+        edge = 10 ** (self.low + index / HISTOGRAM_BINS_PER_DECADE)
+        return min(max(edge, self.min), self.max)
+
+    def summary(self) -> dict:
+        return {
+            "count" : self.count,
+            "mean" : self.total / self.count if self.count else math.nan,
+            "min" : self.min if self.count else math.nan,
+            "p50" : self.percentile(50),
+            "p90" : self.percentile(90),
+            "p99" : self.percentile(99),
+            "max" : self.max if self.count else math.nan,
+        }
+
+class Instrumentation(object):
+    def __init__(self):
+        """
+        Counters ("how many"), gauges ("how much right now") and histograms ("how long") of one camera. All recording methods do nothing while enabled is False.
+        """
+        self.enabled = False
+        self.exporters = list() # (callback, interval, source) tuples, see addExporter
+        self._exportThread = None
+        self._lock = threading.Lock() # only for resetting and reading out, recording is done without it
+        self.reset()
+
+    def reset(self):
+        """
+        Forget everything recorded so far.
+        """
+        with self._lock:
+            self.counters = dict()
+            self.gauges = dict() # name : [last, max]
+            self.histograms = dict()
+
+    def count(self, name : str, n : int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name : str, value : float):
+        if self.enabled:
+            gauge = self.gauges.get(name)
+            if gauge is None:
+                self.gauges[name] = [value, value]
+            else:
+                gauge[0] = value
+                if value > gauge[1]:
+                    gauge[1] = value
+
+    def record(self, name : str, value : float):
+        if self.enabled:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(value)
+
+    def start(self) -> float:
+        """
+        Start timing something, returns the start time to pass to stop (or 0 if disabled).
+        """
+        return time.perf_counter() if self.enabled else 0.0
+
+    def stop(self, name : str, start : float):
+        """
+        Record the time since start (from self.start) in the histogram name.
+        """
+        if self.enabled and start:
+            self.record(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        """
+        Everything recorded so far, as a (json serializable) dict.
+        """
+        with self._lock:
+            return {
+                "enabled" : self.enabled,
+                "counters" : dict(self.counters),
+                "gauges" : {name : {"last" : last, "max" : peak} for name, (last, peak) in list(self.gauges.items())},
+                "histograms" : {name : histogram.summary() for name, histogram in list(self.histograms.items())},
+            }
+
+    def addExporter(self, callback, interval : float = 1.0, source = None):
+        """
+        Call callback(stats) every interval seconds from a background thread, like to push the numbers to a dashboard or a log. stats is source() (like cam.stats) or else self.snapshot().
+        """
+        self.exporters.append((callback, interval, source or self.snapshot))
+        if self._exportThread is None or not self._exportThread.is_alive():
+            self._exportThread = threading.Thread(target=self._export, daemon=True)
+            self._exportThread.start()
+
+    def removeExporter(self, callback):
+        self.exporters = [exporter for exporter in self.exporters if exporter[0] is not callback]
+
+    def _export(self):
+        lastCalls = dict()
+        while self.exporters:
+            now = time.monotonic()
+            for callback, interval, source in list(self.exporters):
+                if now - lastCalls.get(callback, -math.inf) >= interval:
+                    lastCalls[callback] = now
+                    try:
+                        callback(source())
+                    except Exception as e:
+                        print(f"Warning, stats exporter {callback} failed: {e!r}")
+            time.sleep(min((interval for _, interval, _ in self.exporters), default=0) / 10)
@@ -0,0 +1,35 @@
+"""
+Per-frame metadata. Every frame can come with a record of the structured FRAME_METADATA_DTYPE, filled in by the camera class the moment the frame arrives, so the timing does not include whatever happens after (unlike calling time.time() after getImages returns). Records of a stack of frames are kept in a single numpy array, see grabFrames.
+"""
+import numpy as np
+
+FRAME_METADATA_DTYPE = np.dtype([
+    ("frameNumber", "<i8"), # counted by pyunicam since startCapture
+    ("hostTimestamp", "<f8"), # time.perf_counter() when the frame arrived at the computer (s)
+    ("hardwareTimestamp", "<i8"), # timestamp the camera or SDK gave the frame (ns, origin depends on the camera), -1 if not available
+    ("hardwareFrameNumber", "<i8"), # frame counter of the camera or SDK, -1 if not available
+    ("exposureTime", "<f8"), # µs, NaN if not known
+    ("gain", "<f8"), # dB, NaN if not known
+])
+
+def emptyMetadata(n : int|None = None) -> np.ndarray:
+    """
+    Make a metadata array for n frames (or a single 0-dimensional record if n is None), with everything set to 'not available'.
+    """
+    meta = np.zeros(() if n is None else n, dtype=FRAME_METADATA_DTYPE)
+    meta["hardwareTimestamp"] = -1
+    meta["hardwareFrameNumber"] = -1
+    meta["exposureTime"] = np.nan
+    meta["gain"] = np.nan
+    return meta
+
+def countDroppedFrames(metadata : np.ndarray) -> int:
+    """
+    Count frames that went missing in a stack of frames, from gaps in the camera's frame counter. Falls back to the frame numbers of pyunicam if the camera has no frame counter, which only catches frames dropped by pyunicam itself.
+    """
+    if len(metadata) < 2:
+        return 0
+    numbers = metadata["hardwareFrameNumber"]
+    if np.any(numbers < 0):
+        numbers = metadata["frameNumber"]
+    return int(np.sum(np.diff(numbers) - 1))
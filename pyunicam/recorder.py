@@ -0,0 +1,148 @@
+"""
+Stream frames to disk while capturing. A Recorder is a capture stage (see pyunicam.stages) that copies frames into a small preallocated buffer, from which a writer thread appends them to a .npy file straight from their slots, so every frame is copied once before it reaches the disk. Only a bounded number of frames is ever kept in memory, so recordings can last for hours.
+
+The recording is a regular .npy file (of shape (N,H,W) or (N,H,W,C)), next to an index file with the metadata (see pyunicam.metadata) and byte offset of every frame. Open both lazily with openRecording.
+"""
+import os
+import struct
+import threading
+import numpy as np
+from .stages import CaptureStage
+from .framebuffer import FrameRingBuffer
+from .metadata import FRAME_METADATA_DTYPE
+
+HEADER_SIZE = 256 # bytes reserved for the .npy header, so it can be rewritten in place once the final number of frames is known
+INDEX_DTYPE = np.dtype(FRAME_METADATA_DTYPE.descr + [
+    ("offset", "<i8"), # byte offset of the frame in the recording
+])
+
+class Recorder(CaptureStage):
+    def __init__(self, path : str, maxFramesInMemory : int = 64):
+        """
+        Record every captured frame to path (a .npy file) and an index next to it (see indexPath). Attach to a camera using cam.addStage. Existing files are overwritten at the first frame of every capture.
+
+        Parameters
+        ----------
+        path : str
+            File to write the frames to.
+        maxFramesInMemory : int, optional
+            Number of frames that can wait in memory for the writer thread. If the disk cannot keep up, the acquisition thread waits for room, by default 64.
+
+        Example
+        ------
+        with connect_cam("thor") as cam:
+            cam.addStage(Recorder("movie.npy"))
+            cam.startCapture()
+            time.sleep(3600)
+            cam.stopCapture()
+        frames, index = openRecording("movie.npy")
+        """
+        self.path = path
+        self.indexPath = indexPath(path)
+        self.maxFramesInMemory = maxFramesInMemory
+        self.framesWritten = 0
+        self._buffer = None
+
+    def start(self, cam):
+        self._buffer = None
+        self.framesWritten = 0
+        self.writerError = None
+
+    def process(self, frame : np.ndarray, meta : np.ndarray):
+        if self._buffer is None:
+            self._open(frame)
+        if not self._buffer.put(frame, meta=meta):
+            raise IOError(f"writing to {self.path} failed") from self.writerError
+
+    def stop(self):
+        if self._buffer is None:
+            return # no frames came in at all
+        self._buffer.close()
+        self._writerThread.join()
+        # now the number of frames is known, so fix the headers
+        for f, dtype, shape in (
+            (self._dataFile, self._buffer.dtype, (self.framesWritten,) + self._buffer.shape),
+            (self._indexFile, INDEX_DTYPE, (self.framesWritten,)),
+        ):
+            f.seek(0)
+            f.write(_npyHeader(dtype, shape))
+            f.close()
+        self._buffer = None
+        if self.writerError is not None:
+            raise IOError(f"writing to {self.path} failed") from self.writerError
+
+    def _open(self, frame : np.ndarray):
+        self._buffer = FrameRingBuffer(
+            self.maxFramesInMemory,
+            frame.shape,
+            dtype = frame.dtype,
+            overflowPolicy = "block",
+            metaDtype = FRAME_METADATA_DTYPE,
+        )
+        self._dataFile = open(self.path, "wb")
+        self._dataFile.write(_npyHeader(frame.dtype, (0,) + frame.shape))
+        self._indexFile = open(self.indexPath, "wb")
+        self._indexFile.write(_npyHeader(INDEX_DTYPE, (0,)))
+        self._writerThread = threading.Thread(target=self._writeLoop, daemon=True)
+        self._writerThread.start()
+
+    def _writeLoop(self):
+        record = np.zeros(1, dtype=INDEX_DTYPE)
+        try:
+            while True:
+                try:
+                    frame, meta = self._buffer.peek() # written straight from its slot, which is only freed afterwards
+                except TimeoutError:
+                    return # buffer is closed and empty, so we are done
+                for name in FRAME_METADATA_DTYPE.names:
+                    record[name] = meta[name]
+                record["offset"] = HEADER_SIZE + self.framesWritten * frame.nbytes
+                self._dataFile.write(frame.data)
+                self._indexFile.write(record.data)
+                self._buffer.skip()
+                self.framesWritten += 1
+        except Exception as e:
+            self.writerError = e
+            self._buffer.close() # so the acquisition thread does not wait for room forever
+
+def indexPath(path : str) -> str:
+    """
+    Return the path of the index file that belongs to the recording at path.
+    """
+    return os.path.splitext(path)[0] + ".index.npy"
+
+def openRecording(path : str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Open a recording made with a Recorder without loading it into memory. Also works for recordings that were not closed properly (the header is then ignored, and the number of frames follows from the file size).
+
+    Returns
+    -------
+    frames : np.ndarray
+        Memory-mapped (read-only) stack of frames, of shape (N,H,W) or (N,H,W,C).
+    index : np.ndarray
+        Memory-mapped structured array with the metadata and byte offset of every frame (see INDEX_DTYPE).
+    """
+    frames = _openAppended(path)
+    index = _openAppended(indexPath(path))
+    n = min(len(frames), len(index))
+    return frames[:n], index[:n]
+
+def _openAppended(path : str) -> np.ndarray:
+    with open(path, "rb") as f:
+        np.lib.format.read_magic(f)
+        shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+        offset = f.tell()
+    itemShape = tuple(shape[1:])
+    itemSize = dtype.itemsize * int(np.prod(itemShape))
+    n = (os.path.getsize(path) - offset) // itemSize
+    if n == 0:
+        return np.empty((0,) + itemShape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(n,) + itemShape)
+
+def _npyHeader(dtype, shape : tuple) -> bytes:
+    """
+    Make a version 1.0 .npy header of exactly HEADER_SIZE bytes.
+    """
+    header = repr({"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False, "shape": tuple(shape)})
+    header = header.ljust(HEADER_SIZE - 11) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
@@ -0,0 +1,340 @@
+"""
+Replay recorded frames through the regular camera interface, to develop and benchmark analysis pipelines without hardware. A ReplayCam reads from a recording made with a Recorder, any .npy stack of frames, or a directory of .npy files, and hands the frames out like a capturing camera would: at the recorded timestamps, at a fixed framerate, or as fast as the disk allows.
+
+Frames are read lazily (stacks are memory-mapped), by a background thread that reads ahead into a FrameRingBuffer while capturing, so reading from disk does not show up in the time between frames.
+"""
+import os
+from .universal import *
+from .framebuffer import FrameRingBuffer
+from .scheduling import DeadlineScheduler
+from .recorder import openRecording, indexPath, _openAppended
+from .demosaic import bayerPattern
+
+REPLAY_RATES = ("recorded", "max") # or a framerate, in fps
+REPLAY_PIXELFORMATS = {
+    # (dtype, number of colour channels) : pixelFormat reported for frames without a stored pixelFormat
+    (np.dtype(np.uint8), 1) : "Mono8",
+    (np.dtype(np.uint16), 1) : "Mono16",
+    (np.dtype(np.uint8), 3) : "BGR8",
+}
+
+class ReplayCam(UniversalCam):
+    def __init__(self, path : str, rate : str|float = "recorded", loop : bool = False, prefetch : int = 16, pixelFormat : str|None = None, serialNumber : str|None = None, demosaic : str|None = None):
+        """
+        A camera that replays recorded frames. Use it through connect_cam("replay", path="movie.npy").
+        Properties are read from the recording: width, height and pixelFormat from the frames, and exposureTime and gain from the stored metadata (of the frame handed out last). The metadata of replayed frames carries the recorded hardware timestamp, frame counter, exposure time and gain, the hostTimestamp is the moment of replay.
+
+        Parameters
+        ----------
+        path : str
+            A recording made with a Recorder (the index next to it provides the metadata), any .npy file holding a stack of frames, or a directory of .npy files (sorted by name, each holding a single frame or a Recorder recording).
+        rate : str | float, optional
+            "recorded" (default) replays at the recorded timestamps, "max" as fast as the frames can be read, and a number at that many frames per second. Recordings without timestamps are replayed at "max". Can be changed later through the acquisitionFramerate property (-1 switches back to "recorded").
+        loop : bool, optional
+            Start over at the end of the recording, by default False. Otherwise getImages raises an EOFError (or a TimeoutError, if a timeout was given) once all frames are replayed.
+        prefetch : int, optional
+            Number of frames read ahead while capturing, by default 16.
+        pixelFormat : str | None, optional
+            Pixel format of the recorded frames, like "BayerRG8" for raw Bayer frames. By default guessed from their shape and type.
+        serialNumber : str | None, optional
+            Serial number reported in the metadata, by default the name of the recording.
+        demosaic : str | None, optional
+            How to convert raw Bayer recordings, see UniversalCam, by default None (which means "bilinear" here, since a recording cannot be switched to BGR8).
+        """
+        if not (rate in REPLAY_RATES or isinstance(rate, numbers.Number)):
+            raise ValueError(f"rate must be one of {REPLAY_RATES} or a framerate, not '{rate}'")
+        self.replayPath = path
+        self.replayRate = rate
+        self.replayLoop = loop
+        self.replayPrefetch = prefetch
+        self.replayPixelFormat = pixelFormat
+        self.serialNumber = os.path.basename(os.path.normpath(path)) if serialNumber is None else str(serialNumber)
+        super(ReplayCam, self).__init__(demosaic)
+        self.camType = "replay"
+
+    def connectCam(self):
+        self.camConnection = _ReplaySource(self.replayPath)
+        metadata = self.camConnection.metadata
+        if len(self.camConnection) == 0:
+            raise ValueError(f"there are no frames in {self.replayPath}")
+        shape, dtype = self.camConnection.frameShape, self.camConnection.dtype
+        channels = shape[2] if len(shape) == 3 else 1
+        pixelFormat = self.replayPixelFormat or REPLAY_PIXELFORMATS.get((dtype, channels))
+        if pixelFormat is None:
+            raise ValueError(f"cannot tell the pixelFormat of frames of shape {shape} and type {dtype}, pass it as pixelFormat")
+        intervals = np.diff(metadata["hostTimestamp"])
+        self.replayTimed = bool(len(intervals)) and bool(np.all(intervals >= 0)) and bool(np.any(intervals > 0))
+        self.recordedPeriod = float(np.median(intervals)) if self.replayTimed else np.nan
+        if self.replayRate == "recorded" and not self.replayTimed:
+            self.replayRate = "max"
+        self.propertyConvert = {
+            "exposureTimeAuto" : _varies(metadata["exposureTime"]), # then the recorded value changes from frame to frame, so it should not be cached
+            "acquisitionFramerateAuto" : False,
+            "gainAuto" : _varies(metadata["gain"]),
+            'pixelFormat' : pixelFormat,
+            'gammaEnable' : False,
+            "height" : shape[0],
+            "width" : shape[1],
+        }
+        self.replayPosition = 0 # index of the next frame to hand out
+        self.replayRecord = metadata[0] # metadata of the frame handed out last, for the properties
+        self.replayBuffer = None # filled by the prefetch thread while capturing
+        if bayerPattern(pixelFormat) is not None and self.demosaicer is None:
+            self.demosaicer = Demosaicer("bilinear") # a recording cannot be switched to BGR8
+
+    def close(self):
+        if self.replayBuffer is not None:
+            self.stopCapture()
+        self.camConnection.close()
+
+    def getMetadata(self) -> dict:
+        cameraMetadata = {
+                "DeviceModelName" : "replay",
+                "DeviceVendorName" : "pyunicam",
+                "DeviceVersion" : "0.0",
+                "DeviceSerialNumber" : self.serialNumber,
+                "ReplayPath" : os.path.abspath(self.replayPath),
+                "ReplayFrames" : len(self.camConnection),
+        }
+        return cameraMetadata
+
+    def seek(self, position : int):
+        """
+        Continue the replay at frame number position of the recording (counted from 0). Negative positions count from the end.
+        """
+        if self.replayBuffer is not None:
+            raise ValueError("cannot seek while capturing, call stopCapture first")
+        n = len(self.camConnection)
+        if not -n <= position < n:
+            raise IndexError(f"frame {position} is not in the recording of {n} frames")
+        self.replayPosition = position % n
+
+    def framesLeft(self) -> int|float:
+        """
+        Number of recorded frames that have not been handed out yet (infinite when looping).
+        """
+        if self.replayLoop:
+            return np.inf
+        return len(self.camConnection) - self.replayPosition
+
+    def getImages(self, timeout : float|None = None) -> np.ndarray:
+        return self._getFrameInto(None, timeout)
+
+    def _startCaptureDeep(self):
+        if self.replayBuffer is not None:
+            raise ValueError("replay camera was allready started")
+        self.replayBuffer = FrameRingBuffer(
+            self.replayPrefetch,
+            self.camConnection.frameShape,
+            dtype = self.camConnection.dtype,
+            overflowPolicy = "block",
+            metaDtype = FRAME_METADATA_DTYPE,
+        )
+        self.killPrefetchThread = threading.Event()
+        self.prefetchDone = threading.Event()
+        self.prefetchError = None
+        self.prefetchThread = threading.Thread(target=self._prefetchLoop, args=(self.replayPosition, self.replayBuffer), daemon=True)
+        self.prefetchThread.start()
+        self.replayStart = None # set when the first frame is handed out, so the time it takes to read it does not delay the rest
+        self.replayScheduler = None # paces fixed framerates, made at the first frame for the same reason
+
+    def _stopCaptureDeep(self):
+        if self.replayBuffer is None:
+            raise ValueError("replay camera was not recording")
+        self.killPrefetchThread.set()
+        self.replayBuffer.close() # wakes up the prefetch thread if it waits for room
+        self.prefetchThread.join()
+        self.replayBuffer = None
+        if self.prefetchError is not None:
+            raise IOError(f"reading {self.replayPath} failed") from self.prefetchError
+
+    def _prefetchLoop(self, position : int, buffer : FrameRingBuffer):
+        """
+        Read frames from position on into buffer until the recording ends or stopCapture is called. The hostTimestamp in the buffer is the time (s) at which the frame is due, relative to the first frame.
+        """
+        source = self.camConnection
+        meta = emptyMetadata()
+        due = 0.0
+        try:
+            while not self.killPrefetchThread.is_set():
+                frame = source.frame(position)
+                meta[()] = source.metadata[position]
+                meta["frameNumber"] = position
+                meta["hostTimestamp"] = due
+                if not buffer.put(frame, meta=meta):
+                    return # closed by stopCapture
+                following = position + 1
+                if following == len(source):
+                    if not self.replayLoop:
+                        break
+                    following = 0
+                    due += self.recordedPeriod if self.replayTimed else 0.0
+                else:
+                    due += source.metadata["hostTimestamp"][following] - source.metadata["hostTimestamp"][position]
+                position = following
+        except Exception as e:
+            # surfaces in stopCapture
+            self.prefetchError = e
+        self.prefetchDone.set() # so getImages knows no more frames are coming
+        buffer.close()
+
+    def _getImageInto(self, out : np.ndarray|None, timeout : float|None = None, meta : np.ndarray|None = None) -> np.ndarray:
+        if self.replayBuffer is None:
+            # not capturing: just read the next frame
+            if self.framesLeft() <= 0:
+                raise EOFError(f"all {len(self.camConnection)} frames of {self.replayPath} were replayed, use seek to start over")
+            position = self.replayPosition
+            record = self.camConnection.metadata[position]
+            if out is None:
+                out = np.empty(self.camConnection.frameShape, dtype=self.camConnection.dtype)
+            np.copyto(out, self.camConnection.frame(position))
+        else:
+            record = self._waitForFrame(timeout)
+            position = int(record["frameNumber"])
+            start = self.instrumentation.start()
+            out, _ = self.replayBuffer.getWithMetadata(0, out)
+            self.instrumentation.stop("copyTime", start)
+        self.replayPosition = (position + 1) % len(self.camConnection) if self.replayLoop else position + 1
+        self.replayRecord = record
+        self._stampFrame(meta, int(record["hardwareTimestamp"]), int(record["hardwareFrameNumber"]), *self._recordedSettings(record))
+        return out
+
+    def _waitForFrame(self, timeout : float|None) -> np.void:
+        """
+        Wait until the next prefetched frame is due, and return its record from the prefetch buffer.
+        """
+        start = time.perf_counter()
+        try:
+            self.instrumentation.gauge("queueDepth", len(self.replayBuffer))
+            record = self.replayBuffer.peekMetadata(timeout)
+        except TimeoutError:
+            if self.prefetchDone.is_set():
+                if self.prefetchError is not None:
+                    raise IOError(f"reading {self.replayPath} failed") from self.prefetchError
+                if timeout is None:
+                    raise EOFError(f"all {len(self.camConnection)} frames of {self.replayPath} were replayed, use seek to start over")
+                time.sleep(max(timeout - (time.perf_counter() - start), 0)) # like a camera that stopped sending frames
+            raise
+        now = time.perf_counter()
+        if self.replayRate == "max":
+            return record
+        if self.replayRate == "recorded":
+            if self.replayStart is None:
+                self.replayStart = now - float(record["hostTimestamp"])
+            delay = self.replayStart + float(record["hostTimestamp"]) - now
+        else:
+            if self.replayScheduler is None:
+                self.replayScheduler = DeadlineScheduler(1 / self.replayRate, "catchUp")
+            delay = self.replayScheduler.timeUntilNext()
+        if timeout is not None and delay > timeout - (now - start):
+            time.sleep(max(timeout - (now - start), 0))
+            raise TimeoutError(f"next replayed frame is due in {delay} s, more than the timeout of {timeout} s")
+        if self.replayScheduler is not None and self.replayRate != "recorded":
+            trigger = self.replayScheduler.wait()
+            self.instrumentation.record("triggerToFrame", time.perf_counter() - trigger)
+        elif delay > 0:
+            time.sleep(delay)
+        return record
+
+    def _recordedSettings(self, record : np.void) -> tuple:
+        exposureTime, gain = float(record["exposureTime"]), float(record["gain"])
+        return (None if np.isnan(exposureTime) else exposureTime), (None if np.isnan(gain) else gain)
+
+    def _getPropertyDeep(self, prop : str) -> str|bool|numbers.Number:
+        if prop in ("exposureTime", "gain"):
+            value = float(self.replayRecord[prop])
+            if np.isnan(value):
+                raise NotImplementedError(f"the recording has no {prop}")
+            return value
+        if prop == "acquisitionFramerate":
+            if isinstance(self.replayRate, numbers.Number):
+                return self.replayRate
+            return 1 / self.recordedPeriod if self.replayTimed else np.nan
+        if prop == "gamma":
+            raise NotImplementedError("the recording has no gamma")
+        return super(ReplayCam, self)._getPropertyDeep(prop)
+
+    def _setPropertyDeep(self, prop : str, value : str|bool|numbers.Number):
+        if prop == "acquisitionFramerate":
+            if value == -1:
+                self.replayRate = "recorded" if self.replayTimed else "max"
+            else:
+                self.replayRate = float(value)
+            # continue from the next frame on the new schedule
+            self.replayStart = None
+            self.replayScheduler = None
+            return
+        if prop == 'gammaEnable' and not value:
+            return
+        if prop == "exposureTimeAuto":
+            raise ValueError("the exposure time of a recording cannot be changed") # not a NotImplementedError, which would switch on the software auto exposure
+        raise NotImplementedError(f"'{prop}' is fixed in a recording, only acquisitionFramerate can be changed")
+
+class _ReplaySource(object):
+    def __init__(self, path : str):
+        """
+        The frames and metadata of a recording, see ReplayCam. Frames are only read when asked for, metadata (a FRAME_METADATA_DTYPE array) is small enough to keep in memory.
+        """
+        directory = os.path.isdir(path)
+        if directory:
+            files = sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.endswith(".npy") and not name.endswith(".index.npy")
+            )
+        else:
+            files = [path]
+        self.segments = list() # (path, number of frames, True if a stack), in order
+        metadata = list()
+        for file in files:
+            shape, dtype = _readHeader(file)
+            stack = not directory or os.path.exists(indexPath(file)) # in a directory, only recordings hold more than one frame
+            frameShape = shape[1:] if stack else shape
+            if not self.segments:
+                self.frameShape, self.dtype = tuple(frameShape), dtype
+            elif tuple(frameShape) != self.frameShape or dtype != self.dtype:
+                raise ValueError(f"frames in {file} are {frameShape} {dtype}, unlike the {self.frameShape} {self.dtype} frames before")
+            if stack and os.path.exists(indexPath(file)):
+                frames, index = openRecording(file)
+                segmentMeta = emptyMetadata(len(frames))
+                for name in FRAME_METADATA_DTYPE.names:
+                    segmentMeta[name] = index[name]
+            elif stack:
+                frames = _openAppended(file)
+                segmentMeta = emptyMetadata(len(frames))
+            else:
+                frames = None
+                segmentMeta = emptyMetadata(1)
+            self.segments.append((file, 1 if frames is None else len(frames), stack))
+            metadata.append(segmentMeta)
+        self.metadata = np.concatenate(metadata) if metadata else emptyMetadata(0)
+        self.starts = np.cumsum([0] + [n for _, n, _ in self.segments])
+        self._openSegment = (None, None) # (index, memory-mapped stack) of the segment read last
+
+    def __len__(self) -> int:
+        return int(self.starts[-1])
+
+    def frame(self, position : int) -> np.ndarray:
+        """
+        Frame number position of the recording, as a memory-mapped view or freshly read array.
+        """
+        segment = int(np.searchsorted(self.starts, position, side="right")) - 1
+        path, _, stack = self.segments[segment]
+        if not stack:
+            return np.load(path)
+        if self._openSegment[0] != segment:
+            self._openSegment = (segment, _openAppended(path)) # one open stack at a time, so long directories do not run out of file handles
+        return self._openSegment[1][position - self.starts[segment]]
+
+    def close(self):
+        self._openSegment = (None, None)
+
+def _readHeader(path : str) -> tuple:
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        readHeader = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, _, dtype = readHeader(f)
+    return shape, dtype
+
+def _varies(values : np.ndarray) -> bool:
+    values = values[~np.isnan(values)]
+    return bool(len(values)) and bool(np.any(values != values[0]))
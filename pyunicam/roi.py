@@ -0,0 +1,61 @@
+"""
+Software regions of interest and binning, for cameras that cannot do them in hardware (see UniversalCam.setROI and UniversalCam.setBinning). Cropping is a view of the frame, so it costs nothing; binning is a vectorized sum over blocks of pixels, written into preallocated arrays.
+"""
+import numpy as np
+
+def cropFrame(frame : np.ndarray, roi : tuple) -> np.ndarray:
+    """
+    Return the (x, y, width, height) region of interest of frame, as a view (no copy).
+    """
+    x, y, width, height = roi
+    if x < 0 or y < 0 or x + width > frame.shape[1] or y + height > frame.shape[0]:
+        raise ValueError(f"region of interest {roi} does not fit in a frame of {frame.shape[1]}x{frame.shape[0]} px")
+    return frame[y : y + height, x : x + width]
+
+class Binner(object):
+    def __init__(self, factor : int):
+        """
+        Bins frames by averaging blocks of factor x factor pixels (per colour channel). Averaging keeps the pixel type and range of the frame. Reuses its buffers between frames.
+        """
+        if factor < 1:
+            raise ValueError(f"binning factor should be at least 1, not {factor}")
+        self.factor = factor
+        self._sum = None
+
+    def outputShape(self, shape : tuple) -> tuple:
+        """
+        Shape of a binned frame of shape. Rows and columns that do not fill a whole block are dropped.
+        """
+        return (shape[0] // self.factor, shape[1] // self.factor) + tuple(shape[2:])
+
+    def __call__(self, frame : np.ndarray, out : np.ndarray|None = None) -> np.ndarray:
+        """
+        Bin frame into out and return out. If out is None, a new array is made.
+        """
+        n = self.factor
+        shape = self.outputShape(frame.shape)
+        if out is None:
+            out = np.empty(shape, dtype=frame.dtype)
+        # splitting the axes of a (cropped) view makes no copy
+        blocks = frame[: shape[0] * n, : shape[1] * n].reshape((shape[0], n, shape[1], n) + shape[2:])
+        dtype = _sumType(frame.dtype)
+        if self._sum is None or self._sum.shape != shape or self._sum.dtype != dtype:
+            self._sum = np.empty(shape, dtype=dtype)
+        np.add.reduce(blocks, axis=(1, 3), dtype=dtype, out=self._sum)
+        if dtype.kind == "f":
+            np.divide(self._sum, n * n, out=out, casting="unsafe")
+        else:
+            self._sum += n * n // 2 # round to nearest
+            np.floor_divide(self._sum, n * n, out=out, casting="unsafe")
+        return out
+
+def _sumType(dtype) -> np.dtype:
+    """
+    Type to sum blocks of pixels of dtype in without overflowing.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == "f":
+        return np.dtype(np.float64)
+    if dtype.kind in "ui" and dtype.itemsize <= 2:
+        return np.dtype(np.uint32 if dtype.kind == "u" else np.int32)
+    return np.dtype(np.int64)
@@ -0,0 +1,131 @@
+"""
+Drift-free pacing of software-triggered frames. Instead of sleeping "period minus however long the last loop took" (which adds up errors, so the framerate drifts), the DeadlineScheduler computes every trigger time from the start of the capture, on the monotonic time.perf_counter clock. It also keeps statistics on how well the deadlines were met.
+"""
+import threading
+import time
+import numpy as np
+
+SCHEDULER_POLICIES = (
+    "skip", # after falling behind by more than a period, skip the missed triggers and continue on the original time grid
+    "catchUp", # after falling behind, trigger as fast as possible until back on schedule
+)
+SPIN_MARGIN = 0.5e-3 # s before a deadline at which sleeping stops and spinning starts, since sleep is not very precise
+
+class DeadlineScheduler(object):
+    def __init__(self, period : float, policy : str = "skip", historySize : int = 10000, spinMargin : float = SPIN_MARGIN):
+        """
+        Pace triggers to one every period seconds.
+
+        Parameters
+        ----------
+        period : float
+            Time between triggers (s).
+        policy : str, optional
+            What to do after missing a deadline, one of SCHEDULER_POLICIES, by default "skip".
+        historySize : int, optional
+            Number of most recent trigger times that are kept (see triggerTimes), by default 10000. Statistics are always over all triggers.
+        spinMargin : float, optional
+            Time (s) before a deadline at which to stop sleeping and start spinning, by default SPIN_MARGIN. Set to 0 to never spin, at the cost of precision.
+        """
+        if policy not in SCHEDULER_POLICIES:
+            raise ValueError(f"policy must be one of {SCHEDULER_POLICIES}, not '{policy}'")
+        self.period = period
+        self.policy = policy
+        self.spinMargin = spinMargin
+        self.history = np.zeros(historySize, dtype=np.float64)
+        self.start()
+
+    def start(self):
+        """
+        (Re)start the schedule: the first trigger is due now.
+        """
+        self.t0 = time.perf_counter()
+        self.tick = 0 # number of the next deadline, counted from t0
+        self.triggers = 0
+        self.missedDeadlines = 0 # skipped triggers, only for the "skip" policy
+        self.lateTriggers = 0 # triggers that came more than a period after their deadline
+        self._latenessSum = 0.0
+        self._latenessSumSq = 0.0
+        self.maxLateness = 0.0
+
+    def setPeriod(self, period : float):
+        """
+        Change the period, keeping the next deadline where it is.
+        """
+        self.t0 = self.nextDeadline()
+        self.tick = 0
+        self.period = period
+
+    def nextDeadline(self) -> float:
+        return self.t0 + self.tick * self.period
+
+    def timeUntilNext(self) -> float:
+        return self.nextDeadline() - time.perf_counter()
+
+    def wait(self, stopEvent : threading.Event|None = None) -> float|None:
+        """
+        Wait until the next deadline, and register that a trigger happens now.
+
+        Parameters
+        ----------
+        stopEvent : threading.Event | None, optional
+            If this event gets set while waiting, stop waiting immediately.
+
+        Returns
+        -------
+        float | None
+            The time (time.perf_counter) of the trigger, or None if stopEvent was set.
+        """
+        behind = int((time.perf_counter() - self.nextDeadline()) // self.period)
+        if self.policy == "skip" and behind > 0:
+            # we are more than a full period late, so drop the deadlines that passed, except the last one
+            self.missedDeadlines += behind
+            self.tick += behind
+        deadline = self.nextDeadline()
+        delay = deadline - time.perf_counter() - self.spinMargin
+        if delay > 0:
+            if stopEvent is None:
+                time.sleep(delay)
+            elif stopEvent.wait(delay):
+                return None
+        while time.perf_counter() < deadline:
+            pass
+        now = time.perf_counter()
+        self._register(now, now - deadline)
+        self.tick += 1
+        return now
+
+    def _register(self, now : float, lateness : float):
+        self.history[self.triggers % len(self.history)] = now
+        self.triggers += 1
+        self._latenessSum += lateness
+        self._latenessSumSq += lateness**2
+        self.maxLateness = max(self.maxLateness, lateness)
+        if lateness > self.period:
+            self.lateTriggers += 1
+
+    @property
+    def triggerTimes(self) -> np.ndarray:
+        """
+        The most recent trigger times (time.perf_counter), oldest first.
+        """
+        n = min(self.triggers, len(self.history))
+        return self.history[np.arange(self.triggers - n, self.triggers) % len(self.history)]
+
+    def stats(self) -> dict:
+        """
+        Return statistics of the schedule so far. Lateness is how long after its deadline a trigger happened, jitter is the standard deviation of that. Times in s.
+        """
+        n = max(self.triggers, 1)
+        mean = self._latenessSum / n
+        intervals = np.diff(self.triggerTimes)
+        return {
+            "triggers" : self.triggers,
+            "period" : self.period,
+            "meanInterval" : float(intervals.mean()) if len(intervals) else float("nan"),
+            "meanLateness" : mean,
+            "maxLateness" : self.maxLateness,
+            "jitter" : float(np.sqrt(max(self._latenessSumSq / n - mean**2, 0))),
+            "missedDeadlines" : self.missedDeadlines,
+            "lateTriggers" : self.lateTriggers,
+        }
@@ -0,0 +1,112 @@
+"""
+Process-wide pool of open SDK sessions and device handles. Opening a vendor SDK or a camera can take seconds, so when a camera is closed its handles are parked here for a while instead of being disposed; connecting to the same camera again (like the next `with connect_cam(...)` block of an experiment) picks them up again right away.
+
+Parked handles are disposed once they have been idle for sessionPool.idleTimeout seconds, when sessionPool.clear() is called, or when Python exits. Set sessionPool.idleTimeout to 0 to dispose handles as soon as they are released.
+"""
+import atexit
+import threading
+import time
+
+class SessionPool(object):
+    def __init__(self, idleTimeout : float = 60):
+        """
+        Pool of reference-counted handles (like an SDK instance or an open camera), keyed by anything hashable.
+
+        Parameters
+        ----------
+        idleTimeout : float, optional
+            Time (s) a handle nobody uses is kept open, by default 60.
+        """
+        self.idleTimeout = idleTimeout
+        self._lock = threading.RLock()
+        self._sessions = dict() # key : _Session, in the order they were opened
+
+    def acquire(self, key, opener, disposer, shared : bool = False):
+        """
+        Return the handle for key, opening it with opener() if it is not in the pool. Pair every acquire with a release.
+
+        Parameters
+        ----------
+        key : hashable
+            What the handle is, like ("thor", "12345").
+        opener : callable
+            Opens the handle, called without arguments.
+        disposer : callable
+            Closes the handle for real, called with the handle.
+        shared : bool, optional
+            Whether several users can have the handle at the same time (like an SDK), by default False (like a camera). Acquiring an exclusive handle that is in use raises a ConnectionError.
+        """
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                if session.users > 0 and not session.shared:
+                    raise ConnectionError(f"{key} is already in use")
+                session.users += 1
+                session.idleSince = None
+                return session.handle
+            handle = opener()
+            self._sessions[key] = _Session(handle, disposer, shared)
+            return handle
+
+    def release(self, key, dispose : bool = False):
+        """
+        Stop using the handle for key. It is parked for reuse (or disposed if dispose is True or the idle timeout is 0) once nobody uses it anymore.
+        """
+        with self._lock:
+            session = self._sessions[key]
+            session.users -= 1
+            if session.users > 0:
+                return
+            if dispose or self.idleTimeout <= 0:
+                self._dispose(key)
+                return
+            session.idleSince = time.monotonic()
+            timer = threading.Timer(self.idleTimeout, self._expire, (key, session.idleSince))
+            timer.daemon = True
+            timer.start()
+
+    def isOpen(self, key) -> bool:
+        """
+        Check if there is a handle for key in the pool (in use or parked).
+        """
+        with self._lock:
+            return key in self._sessions
+
+    def parked(self, prefix : tuple = ()) -> list:
+        """
+        Return the keys of all handles nobody uses at the moment, optionally only tuple keys that start with prefix.
+        """
+        with self._lock:
+            return [key for key, session in self._sessions.items() if session.users == 0 and tuple(key[:len(prefix)]) == prefix]
+
+    def clear(self):
+        """
+        Dispose all handles nobody uses at the moment, newest first (so cameras go before the SDK they were opened with).
+        """
+        with self._lock:
+            while True:
+                keys = self.parked()
+                if not keys:
+                    return
+                self._dispose(keys[-1]) # may release other handles, so look again
+
+    def _expire(self, key, idleSince : float):
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None and session.users == 0 and session.idleSince == idleSince: # not reused in the mean time
+                self._dispose(key)
+
+    def _dispose(self, key):
+        session = self._sessions.pop(key)
+        session.disposer(session.handle)
+
+class _Session(object):
+    def __init__(self, handle, disposer, shared : bool):
+        self.handle = handle
+        self.disposer = disposer
+        self.shared = shared
+        self.users = 1
+        self.idleSince = None
+
+sessionPool = SessionPool()
+atexit.register(sessionPool.clear)
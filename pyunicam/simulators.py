@@ -0,0 +1,758 @@
+"""
+Simulated vendor SDKs, so the Thor and FLIR backends can run without a camera, or even without the SDKs installed. A Simulation puts in-process stand-ins for thorlabs_tsi_sdk and simple_pyspin (plus PySpin, and the flir helper module FlirCam uses) into sys.modules. ThorCam and FlirCam then import those instead of the real ones, and run their actual code paths against them, which makes it possible to load test and profile them (on a CI box, say):
+
+    with pyunicam.Simulation(width=720, height=540, frameLatency=0.002, failureRate=0.01) as simulation:
+        cam = pyunicam.connect_cam("thor")
+        ...
+        cam.close()
+        print(simulation.calls, simulation.failures) # per SDK call
+
+The simulated cameras keep time like real ones: the first frame after a trigger (or start) is ready after the latency, exposure time and readout time, the ones after it every max(exposure time, readout time). Frames that do not fit in the buffer of the camera are lost, and show up as gaps in the frame numbers. Settings real cameras refuse while armed or streaming (like the region of interest) are refused as well. Only the attributes and methods of the SDKs that pyunicam uses are there.
+"""
+import collections
+import enum
+import sys
+import threading
+import time
+import types
+import numpy as np
+
+SIMULATED_SDKS = ("thor", "flir")
+SIMULATED_BANK_SIZE = 4 # different noisy frames per setting, cycled through
+TRANSIENT_FAILING_CALLS = ("get_pending_frame_or_null", "issue_software_trigger", "exposure_time_us", "GetNextImage", "SetValue", "GetValue", "get_info") # SDK calls that fail now and then on real hardware
+
+class Simulation(object):
+    def __init__(self, cameras : int = 1, width : int = 1440, height : int = 1080, bitDepth : int = 12, colour : bool = False, frameLatency : float = 0.001, latencyJitter : float = 0.0, readoutTime : float = 0.005, failureRate : float = 0.0, failingCalls : tuple = TRANSIENT_FAILING_CALLS, sdks : tuple = SIMULATED_SDKS, seed : int|None = None):
+        """
+        Simulated SDKs and the cameras connected to them. Call install (or use it as a context manager) to make ThorCam and FlirCam use them.
+
+        Parameters
+        ----------
+        cameras : int, optional
+            Number of cameras connected to each SDK, by default 1.
+        width, height : int, optional
+            Size of the sensor (pixels), by default 1440x1080.
+        bitDepth : int, optional
+            Bit depth of the Thor sensors, by default 12 (frames are 16 bit, like the real ones). FLIR frames follow their pixelFormat.
+        colour : bool, optional
+            Whether the cameras have a Bayer sensor, by default False.
+        frameLatency : float, optional
+            Time (s) between a trigger (or the start of streaming) and the start of the exposure, by default 1 ms.
+        latencyJitter : float, optional
+            Random extra latency (s) per trigger, uniformly between 0 and this, by default 0.
+        readoutTime : float, optional
+            Time (s) to read out a frame, by default 5 ms. Sets the highest framerate, together with the exposure time.
+        failureRate : float, optional
+            Probability that an SDK call fails with a transient TLCameraError or SpinnakerException, by default 0.
+        failingCalls : tuple, optional
+            Names of the SDK calls that can fail (see self.calls for all of them), by default TRANSIENT_FAILING_CALLS, the polling, trigger and property calls.
+        sdks : tuple, optional
+            SDKs to simulate, some of SIMULATED_SDKS, by default both.
+        seed : int | None, optional
+            Seed for the noise, latencies and failures, by default None.
+        """
+        unknown = set(sdks) - set(SIMULATED_SDKS)
+        if unknown:
+            raise ValueError(f"cannot simulate {unknown}, only {SIMULATED_SDKS}")
+        self.cameras = cameras
+        self.width = width
+        self.height = height
+        self.bitDepth = bitDepth
+        self.colour = colour
+        self.frameLatency = frameLatency
+        self.latencyJitter = latencyJitter
+        self.readoutTime = readoutTime
+        self.failureRate = failureRate
+        self.failingCalls = failingCalls
+        self.sdks = tuple(sdks)
+        self.calls = collections.Counter() # SDK call : number of calls
+        self.failures = collections.Counter() # SDK call : number of simulated failures
+        self.modules = dict() # module name : simulated module, while installed
+        self._replaced = dict() # module name : module it replaced (None if there was none)
+        self._lock = threading.Lock() # guards the counters and the random generator, SDKs are called from capture threads
+        self._rng = np.random.default_rng(seed)
+        self._banks = dict()
+        self._thorSDKOpen = False
+        self._openCameras = set()
+
+    def serialNumbers(self, sdk : str) -> list:
+        """
+        Serial numbers of the simulated cameras of sdk ("thor" or "flir").
+        """
+        base = 10000 if sdk == "thor" else 20000000
+        return [str(base + i) for i in range(self.cameras)]
+
+    def install(self) -> "Simulation":
+        """
+        Put the simulated SDKs in sys.modules, in place of the real ones (if any). Returns self.
+        """
+        if self.modules:
+            raise ValueError("this simulation is already installed")
+        for sdk in self.sdks:
+            self.modules.update(_thorModules(self) if sdk == "thor" else _flirModules(self))
+        for name, module in self.modules.items():
+            self._replaced[name] = sys.modules.get(name)
+            sys.modules[name] = module
+        return self
+
+    def uninstall(self):
+        """
+        Put the real SDKs back. Camera handles parked in pyunicam.sessions.sessionPool are disposed first, so the simulated ones are not picked up by the next camera. Close all simulated cameras before this.
+        """
+        from .sessions import sessionPool
+        sessionPool.clear()
+        for name, module in self._replaced.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        self._replaced.clear()
+        self.modules.clear()
+
+    def __enter__(self) -> "Simulation":
+        return self.install()
+
+    def __exit__(self, type, value, traceback):
+        self.uninstall()
+
+    def _call(self, name : str, error : type):
+        """
+        Count a call to the SDK, and fail it with error now and then (see failureRate).
+        """
+        with self._lock:
+            self.calls[name] += 1
+            if self.failureRate > 0 and name in self.failingCalls and self._rng.random() < self.failureRate:
+                self.failures[name] += 1
+                raise error(f"simulated transient failure in {name}")
+
+    def _latency(self) -> float:
+        if self.latencyJitter <= 0:
+            return self.frameLatency
+        with self._lock:
+            return self.frameLatency + self._rng.uniform(0, self.latencyJitter)
+
+    def _frame(self, shape : tuple, dtype, maxValue : int, exposureTime : float, gain : float, frameNumber : int) -> np.ndarray:
+        """
+        A new synthetic frame: a gradient that gets brighter with exposure time (µs) and gain (dB), with noise, clipped at maxValue.
+        """
+        key = (shape, np.dtype(dtype), maxValue, round(exposureTime), round(gain, 1))
+        bank = self._banks.get(key)
+        if bank is None:
+            if len(self._banks) > 64:
+                self._banks.clear() # an auto exposure tries many exposure times
+            level = maxValue * min(exposureTime / 20000 * 10**(gain / 20), 4)
+            gradient = np.linspace(0.1, 1, shape[1], dtype=np.float32)[None, :] * np.linspace(0.5, 1, shape[0], dtype=np.float32)[:, None]
+            if len(shape) == 3:
+                gradient = gradient[:, :, None] * np.array([0.6, 0.8, 1], dtype=np.float32)[:shape[2]]
+            with self._lock:
+                noise = self._rng.normal(0, 0.02 * maxValue, (SIMULATED_BANK_SIZE,) + shape).astype(np.float32)
+            bank = self._banks[key] = np.clip(level * gradient + noise, 0, maxValue).astype(dtype)
+        return bank[frameNumber % len(bank)].copy() # SDKs hand out a new array for every frame
+
+class _FrameClock(object):
+    def __init__(self, simulation : Simulation, bufferSize : int, exposureTime, period):
+        """
+        When the frames of a simulated camera are ready. Frames are not made ahead of time; every poll works out which ones should be there by now.
+
+        Parameters
+        ----------
+        bufferSize : int
+            Frames the camera keeps until they are collected, later ones are lost.
+        exposureTime : callable
+            Returns the exposure time (µs) of the next frame, called once per frame (in order).
+        period : callable
+            Returns the time (s) between frames, given the exposure time (µs).
+        """
+        self.simulation = simulation
+        self.bufferSize = bufferSize
+        self.exposureTime = exposureTime
+        self.period = period
+        self.frameCount = 0 # frames read out, including the lost ones
+        self.lostFrames = 0
+        self.queue = collections.deque() # (frame count, ready time, exposure time) of frames that can be collected
+        self.nextReady = None # time the next frame is ready, None if the camera is not exposing
+        self.nextExposureTime = None
+        self.remaining = None # frames left for the current trigger, None for unlimited
+
+    def trigger(self, frames : int|None = None):
+        """
+        Start exposing frames (None for an unlimited number).
+        """
+        if self.nextReady is not None:
+            return # already exposing, like real cameras ignore triggers while busy
+        self.nextExposureTime = self.exposureTime()
+        self.nextReady = time.perf_counter() + self.simulation._latency() + self.nextExposureTime * 1e-6 + self.simulation.readoutTime
+        self.remaining = frames
+
+    def stop(self):
+        self.nextReady = None
+        self.queue.clear()
+
+    def pop(self) -> tuple|None:
+        """
+        Return the oldest ready frame (frame count, ready time, exposure time), or None.
+        """
+        self._advance(time.perf_counter())
+        return self.queue.popleft() if self.queue else None
+
+    def timeUntilNext(self) -> float|None:
+        """
+        Time (s) until a frame can be collected, None if none is coming.
+        """
+        self._advance(time.perf_counter())
+        if self.queue:
+            return 0
+        return None if self.nextReady is None else self.nextReady - time.perf_counter()
+
+    def _advance(self, now : float):
+        while self.nextReady is not None and self.nextReady <= now:
+            self.frameCount += 1
+            if len(self.queue) < self.bufferSize:
+                self.queue.append((self.frameCount, self.nextReady, self.nextExposureTime))
+            else:
+                self.lostFrames += 1
+            if self.remaining is not None:
+                self.remaining -= 1
+                if self.remaining <= 0:
+                    self.nextReady = None
+                    return
+            self.nextExposureTime = self.exposureTime()
+            self.nextReady += self.period(self.nextExposureTime)
+
+# Thorlabs TSI SDK
+
+class _TLCameraError(Exception):
+    pass
+
+class _SENSOR_TYPE(enum.IntEnum):
+    MONOCHROME = 0
+    BAYER = 1
+    MONOCHROME_POLARIZED = 2
+
+_ROI = collections.namedtuple("ROI", ("upper_left_x_pixels", "upper_left_y_pixels", "lower_right_x_pixels", "lower_right_y_pixels"))
+_Range = collections.namedtuple("Range", ("min", "max"))
+
+class _ThorFrame(object):
+    __slots__ = ("image_buffer", "frame_count", "time_stamp_relative_ns_or_null")
+
+    def __init__(self, image_buffer : np.ndarray, frame_count : int, time_stamp_relative_ns_or_null : int):
+        self.image_buffer = image_buffer
+        self.frame_count = frame_count
+        self.time_stamp_relative_ns_or_null = time_stamp_relative_ns_or_null
+
+class _ThorSDK(object):
+    simulation = None # set per simulation, see _thorModules
+
+    def __init__(self):
+        self.simulation._call("TLCameraSDK", _TLCameraError)
+        if self.simulation._thorSDKOpen:
+            raise _TLCameraError("the SDK is already open, it can only be opened once per process")
+        self.simulation._thorSDKOpen = True
+        self.disposed = False
+
+    def discover_available_cameras(self) -> list:
+        self.simulation._call("discover_available_cameras", _TLCameraError)
+        time.sleep(0.05) # discovery is slow on real hardware too
+        return self.simulation.serialNumbers("thor")
+
+    def open_camera(self, camera_serial_number : str) -> "_ThorCamera":
+        self.simulation._call("open_camera", _TLCameraError)
+        if camera_serial_number not in self.simulation.serialNumbers("thor"):
+            raise _TLCameraError(f"no camera with serial number {camera_serial_number}")
+        if ("thor", camera_serial_number) in self.simulation._openCameras:
+            raise _TLCameraError(f"camera {camera_serial_number} is already open")
+        self.simulation._openCameras.add(("thor", camera_serial_number))
+        return _ThorCamera(self.simulation, camera_serial_number)
+
+    def dispose(self):
+        if self.disposed:
+            raise _TLCameraError("the SDK was already disposed")
+        self.disposed = True
+        self.simulation._thorSDKOpen = False
+
+class _ThorCamera(object):
+    def __init__(self, simulation : Simulation, serialNumber : str):
+        self.simulation = simulation
+        self.serial_number = serialNumber
+        self.model = "CS165CU" if simulation.colour else "CS165MU"
+        self.name = f"{self.model}-{serialNumber}"
+        self.camera_sensor_type = _SENSOR_TYPE.BAYER if simulation.colour else _SENSOR_TYPE.MONOCHROME
+        self.sensor_width_pixels = simulation.width
+        self.sensor_height_pixels = simulation.height
+        self.bit_depth = simulation.bitDepth
+        self.exposure_time_range_us = _Range(40, 26843000)
+        self.gain_range = _Range(0, 480) # in 0.1 dB
+        self.bin_x_range = self.bin_y_range = _Range(1, 16)
+        self.frames_per_trigger_zero_for_unlimited = 1
+        self.image_poll_timeout_ms = 0
+        self.is_armed = False
+        self._exposureTime = 10000
+        self._gain = 0
+        self._roi = _ROI(0, 0, simulation.width - 1, simulation.height - 1)
+        self._bin = [1, 1]
+        self._clock = None
+        self._disposed = False
+        self._openedAt = time.perf_counter()
+
+    def _check(self, name : str, whileArmed : bool = True):
+        self.simulation._call(name, _TLCameraError)
+        if self._disposed:
+            raise _TLCameraError("the camera was disposed")
+        if not whileArmed and self.is_armed:
+            raise _TLCameraError(f"{name} cannot be set while the camera is armed")
+
+    @property
+    def exposure_time_us(self) -> int:
+        self._check("exposure_time_us")
+        return self._exposureTime
+
+    @exposure_time_us.setter
+    def exposure_time_us(self, value : int):
+        self._check("exposure_time_us") # takes effect at the next frame, also while armed
+        self._exposureTime = self._integerInRange("exposure_time_us", value, self.exposure_time_range_us)
+
+    @property
+    def gain(self) -> int:
+        self._check("gain")
+        return self._gain
+
+    @gain.setter
+    def gain(self, value : int):
+        self._check("gain")
+        self._gain = self._integerInRange("gain", value, self.gain_range)
+
+    @staticmethod
+    def _integerInRange(name : str, value, valueRange : _Range) -> int:
+        """
+        Check a value for an integer setting like the SDK does: it passes them on as C long longs, so anything but an int is refused, and so is anything outside of the range of the camera.
+        """
+        if isinstance(value, bool) or not isinstance(value, (int, np.integer)):
+            raise _TLCameraError(f"{name} should be an int, not {type(value).__name__} {value!r}")
+        if not valueRange.min <= value <= valueRange.max:
+            raise _TLCameraError(f"{name} {value} is outside of {valueRange}")
+        return int(value)
+
+    @property
+    def frame_time_us(self) -> float:
+        self._check("frame_time_us")
+        return self._period(self._exposureTime) * 1e6
+
+    @property
+    def roi(self) -> _ROI:
+        self._check("roi")
+        return self._roi
+
+    @roi.setter
+    def roi(self, value : tuple):
+        self._check("roi", whileArmed=False)
+        x0, y0, x1, y1 = (int(v) for v in value)
+        if not (0 <= x0 < x1 < self.sensor_width_pixels and 0 <= y0 < y1 < self.sensor_height_pixels):
+            raise _TLCameraError(f"region of interest {value} does not fit on the sensor")
+        self._roi = _ROI(x0, y0, x1, y1)
+
+    @property
+    def binx(self) -> int:
+        self._check("binx")
+        return self._bin[0]
+
+    @binx.setter
+    def binx(self, value : int):
+        self._setBin(0, value)
+
+    @property
+    def biny(self) -> int:
+        self._check("biny")
+        return self._bin[1]
+
+    @biny.setter
+    def biny(self, value : int):
+        self._setBin(1, value)
+
+    def _setBin(self, axis : int, value : int):
+        self._check("biny" if axis else "binx", whileArmed=False)
+        if not self.bin_x_range.min <= value <= self.bin_x_range.max:
+            raise _TLCameraError(f"cannot bin by {value}, the range is {self.bin_x_range}")
+        self._bin[axis] = int(value)
+
+    @property
+    def image_width_pixels(self) -> int:
+        self._check("image_width_pixels")
+        return (self._roi.lower_right_x_pixels - self._roi.upper_left_x_pixels + 1) // self._bin[0]
+
+    @property
+    def image_height_pixels(self) -> int:
+        self._check("image_height_pixels")
+        return (self._roi.lower_right_y_pixels - self._roi.upper_left_y_pixels + 1) // self._bin[1]
+
+    def arm(self, frames_to_buffer : int):
+        self._check("arm")
+        if self.is_armed:
+            raise _TLCameraError("the camera is already armed")
+        self.is_armed = True
+        self._clock = _FrameClock(self.simulation, frames_to_buffer, lambda: self._exposureTime, self._period)
+
+    def disarm(self):
+        self._check("disarm")
+        self.is_armed = False
+        self._clock = None
+
+    def issue_software_trigger(self):
+        self._check("issue_software_trigger")
+        if not self.is_armed:
+            raise _TLCameraError("arm the camera before triggering it")
+        self._clock.trigger(self.frames_per_trigger_zero_for_unlimited or None)
+
+    def get_pending_frame_or_null(self) -> _ThorFrame|None:
+        self._check("get_pending_frame_or_null")
+        if not self.is_armed:
+            return None
+        if self.image_poll_timeout_ms > 0:
+            wait = self._clock.timeUntilNext()
+            if wait is not None and wait > 0:
+                time.sleep(min(wait, self.image_poll_timeout_ms / 1000))
+        ready = self._clock.pop()
+        if ready is None:
+            return None
+        frameCount, readyTime, exposureTime = ready
+        shape = (self.image_height_pixels, self.image_width_pixels)
+        image = self.simulation._frame(shape, np.uint16, 2**self.bit_depth - 1, exposureTime * self._bin[0] * self._bin[1], self._gain / 10, frameCount)
+        return _ThorFrame(image, frameCount, int((readyTime - self._openedAt) * 1e9))
+
+    def dispose(self):
+        self._check("dispose")
+        self._disposed = True
+        self.simulation._openCameras.discard(("thor", self.serial_number))
+
+    def _period(self, exposureTime : float) -> float:
+        return max(exposureTime * 1e-6, self.simulation.readoutTime)
+
+def _thorModules(simulation : Simulation) -> dict:
+    package = types.ModuleType("thorlabs_tsi_sdk", "Simulated Thorlabs TSI SDK, see pyunicam.simulators.")
+    package.__path__ = [] # a package, so its submodules can be imported
+    enums = types.ModuleType("thorlabs_tsi_sdk.tl_camera_enums")
+    enums.SENSOR_TYPE = _SENSOR_TYPE
+    camera = types.ModuleType("thorlabs_tsi_sdk.tl_camera")
+    camera.TLCameraSDK = type("TLCameraSDK", (_ThorSDK,), {"simulation" : simulation})
+    camera.TLCamera = _ThorCamera
+    camera.TLCameraError = _TLCameraError
+    camera.Frame = _ThorFrame
+    camera.ROI = _ROI
+    camera.Range = _Range
+    setup = types.ModuleType("thorlabs_tsi_sdk.windows_setup")
+    setup.configure_path = lambda: None # there are no dlls to find
+    package.tl_camera, package.tl_camera_enums, package.windows_setup = camera, enums, setup
+    return {module.__name__ : module for module in (package, camera, enums, setup)}
+
+# Spinnaker, through simple_pyspin
+
+_SPINNAKER_ERR_ERROR = -1001
+_SPINNAKER_ERR_TIMEOUT = -1011
+
+class _SpinnakerException(Exception):
+    def __init__(self, message : str, errorcode : int = _SPINNAKER_ERR_ERROR):
+        """
+        Carries the Spinnaker error code in errorcode, like PySpin does.
+        """
+        super(_SpinnakerException, self).__init__(message)
+        self.errorcode = errorcode
+
+class _FlirNode(object):
+    def __init__(self, camera : "_FlirCamera", name : str, value, writable : bool = True, options : tuple|None = None, limits : tuple|None = None, whileStreaming : bool = True):
+        """
+        A GenICam node of a simulated FLIR camera. options are the entries of an enumeration node, limits the (min, max) of a number, or a callable returning them.
+        """
+        self.camera = camera
+        self.name = name
+        self.value = value
+        self.writable = writable
+        self.options = options
+        self.limits = limits
+        self.whileStreaming = whileStreaming
+
+    def GetValue(self):
+        self.camera.simulation._call("GetValue", _SpinnakerException)
+        return self.value
+
+    def SetValue(self, value):
+        self.camera.simulation._call("SetValue", _SpinnakerException)
+        if not self.writable or (self.camera.streaming and not self.whileStreaming) or self.camera._locked(self.name):
+            raise _SpinnakerException(f"Spinnaker: node {self.name} is not writable")
+        if self.options is not None and value not in self.options:
+            raise _SpinnakerException(f"Spinnaker: {value} is not an entry of {self.name}, those are {self.options}")
+        limits = self.limits() if callable(self.limits) else self.limits
+        if limits is not None and not limits[0] <= value <= limits[1]:
+            raise _SpinnakerException(f"Spinnaker: {self.name} {value} is outside of {limits}")
+        self.value = value
+        self.camera._changed(self.name)
+
+class _FlirChunkData(object):
+    def __init__(self, exposureTime : float, gain : float):
+        self.exposureTime = exposureTime
+        self.gain = gain
+
+    def GetExposureTime(self) -> float:
+        return self.exposureTime
+
+    def GetGain(self) -> float:
+        return self.gain
+
+class _FlirImage(object):
+    def __init__(self, simulation : Simulation, array : np.ndarray, frameID : int, timeStamp : int, chunk : _FlirChunkData|None):
+        self.simulation = simulation
+        self.array = array
+        self.frameID = frameID
+        self.timeStamp = timeStamp
+        self.chunk = chunk
+        self.released = False
+
+    def GetNDArray(self) -> np.ndarray:
+        if self.released:
+            raise _SpinnakerException("Spinnaker: the image was released")
+        return self.array
+
+    def GetFrameID(self) -> int:
+        return self.frameID
+
+    def GetTimeStamp(self) -> int:
+        return self.timeStamp
+
+    def GetChunkData(self) -> _FlirChunkData:
+        if self.chunk is None:
+            raise _SpinnakerException("Spinnaker: chunk mode is not active")
+        return self.chunk
+
+    def Release(self):
+        self.simulation._call("Release", _SpinnakerException)
+        self.released = True
+
+class _FlirSpinnakerCamera(object):
+    def __init__(self, camera : "_FlirCamera"):
+        """
+        The PySpin camera inside a simple_pyspin Camera (camera.cam), for GetNextImage.
+        """
+        self.camera = camera
+
+    def GetNextImage(self, grabTimeout : int = 0xFFFFFFFFFFFFFFFF) -> _FlirImage:
+        camera = self.camera
+        camera.simulation._call("GetNextImage", _SpinnakerException)
+        if not camera.streaming:
+            raise _SpinnakerException("Spinnaker: the camera is not streaming")
+        wait = camera._clock.timeUntilNext()
+        timeout = None if grabTimeout == _EVENT_TIMEOUT_INFINITE else grabTimeout / 1000
+        if wait is not None and wait > 0:
+            if timeout is not None and wait > timeout:
+                time.sleep(timeout)
+                raise _SpinnakerException(f"Spinnaker: no image arrived within {grabTimeout} ms", _SPINNAKER_ERR_TIMEOUT)
+            time.sleep(wait)
+        ready = camera._clock.pop()
+        if ready is None:
+            raise _SpinnakerException("Spinnaker: no image is coming, the camera stopped")
+        frameCount, readyTime, exposureTime = ready
+        gain = camera._nodes["Gain"].value
+        array = camera._image(exposureTime, gain, frameCount)
+        chunk = _FlirChunkData(exposureTime, gain) if camera._nodes["ChunkModeActive"].value else None
+        return _FlirImage(camera.simulation, array, frameCount - 1, int((readyTime - camera._openedAt) * 1e9), chunk)
+
+_EVENT_TIMEOUT_INFINITE = 0xFFFFFFFFFFFFFFFF
+_FLIR_PIXELFORMATS = {
+    # pixelFormat : (dtype, number of colour channels, mosaiced)
+    "Mono8" : (np.uint8, 1, False),
+    "Mono16" : (np.uint16, 1, False),
+    "BayerRG8" : (np.uint8, 1, True),
+    "BayerRG16" : (np.uint16, 1, True),
+    "BGR8" : (np.uint8, 3, False),
+    "RGB8Packed" : (np.uint8, 3, False),
+}
+_FLIR_SEQUENCER_SETS = 8
+
+class _FlirCamera(object):
+    simulation = None # set per simulation, see _flirModules
+
+    def __init__(self, index : int|str = 0):
+        """
+        Stand-in for simple_pyspin.Camera: index is the number of the camera, or its serial number (as string).
+        """
+        serialNumbers = self.simulation.serialNumbers("flir")
+        if isinstance(index, str):
+            if index not in serialNumbers:
+                raise ValueError(f"no camera with serial number {index}")
+            serialNumber = index
+        elif index < len(serialNumbers):
+            serialNumber = serialNumbers[index]
+        else:
+            raise ValueError(f"no camera with index {index}, there are {len(serialNumbers)}")
+        object.__setattr__(self, "serialNumber", serialNumber)
+        object.__setattr__(self, "camera_attributes", dict())
+        object.__setattr__(self, "initialized", False)
+        object.__setattr__(self, "streaming", False)
+
+    def init(self):
+        self.simulation._call("init", _SpinnakerException)
+        if ("flir", self.serialNumber) in self.simulation._openCameras:
+            raise _SpinnakerException(f"Spinnaker: camera {self.serialNumber} is in use")
+        self.simulation._openCameras.add(("flir", self.serialNumber))
+        simulation = self.simulation
+        colour = simulation.colour
+        node = lambda name, value, **kwargs: _FlirNode(self, name, value, **kwargs)
+        nodes = [
+            node("DeviceModelName", "Blackfly S BFS-U3-16S2C" if colour else "Blackfly S BFS-U3-16S2M", writable=False),
+            node("DeviceVendorName", "FLIR", writable=False),
+            node("DeviceVersion", "simulated", writable=False),
+            node("DeviceSerialNumber", self.serialNumber, writable=False),
+            node("SensorWidth", simulation.width, writable=False),
+            node("SensorHeight", simulation.height, writable=False),
+            node("WidthMax", simulation.width, writable=False),
+            node("HeightMax", simulation.height, writable=False),
+            node("Width", simulation.width, limits=lambda: (8, self._nodes["WidthMax"].value - self._nodes["OffsetX"].value), whileStreaming=False),
+            node("Height", simulation.height, limits=lambda: (8, self._nodes["HeightMax"].value - self._nodes["OffsetY"].value), whileStreaming=False),
+            node("OffsetX", 0, limits=lambda: (0, self._nodes["WidthMax"].value - self._nodes["Width"].value), whileStreaming=False),
+            node("OffsetY", 0, limits=lambda: (0, self._nodes["HeightMax"].value - self._nodes["Height"].value), whileStreaming=False),
+            node("BinningHorizontal", 1, limits=(1, 4), whileStreaming=False),
+            node("BinningVertical", 1, limits=(1, 4), whileStreaming=False),
+            node("PixelFormat", "BayerRG8" if colour else "Mono8", options=tuple(f for f in _FLIR_PIXELFORMATS if colour or f.startswith("Mono")), whileStreaming=False),
+            node("ExposureTime", 10000.0, limits=(6.0, 30e6)),
+            node("ExposureAuto", "Off", options=("Off", "Once", "Continuous")),
+            node("Gain", 0.0, limits=(0.0, 47.99)),
+            node("GainAuto", "Off", options=("Off", "Once", "Continuous")),
+            node("AcquisitionFrameRate", 30.0, limits=(1.0, 1 / simulation.readoutTime if simulation.readoutTime > 0 else 1e4)),
+            node("AcquisitionFrameRateEnable", False, options=(True, False)),
+            node("GammaEnable", False, options=(True, False)),
+            node("Gamma", 0.8, limits=(0.25, 4.0)),
+            node("ChunkModeActive", False, options=(True, False), whileStreaming=False),
+            node("SequencerMode", "Off", options=("Off", "On")),
+            node("SequencerConfigurationMode", "Off", options=("Off", "On")),
+            node("SequencerSetSelector", 0, limits=(0, _FLIR_SEQUENCER_SETS - 1)),
+            node("SequencerPathSelector", 0, limits=(0, 1)),
+            node("SequencerTriggerSource", "FrameStart", options=("Off", "FrameStart")),
+            node("SequencerSetNext", 0, limits=(0, _FLIR_SEQUENCER_SETS - 1)),
+            node("SequencerSetStart", 0, limits=(0, _FLIR_SEQUENCER_SETS - 1)),
+        ]
+        self.camera_attributes.update((n.name, n) for n in nodes)
+        self._changed("ExposureTime")
+        object.__setattr__(self, "cam", _FlirSpinnakerCamera(self))
+        object.__setattr__(self, "_sequencerSets", dict()) # set : (exposure time, next set), see SequencerSetSave
+        object.__setattr__(self, "_sequencerSet", 0)
+        object.__setattr__(self, "_clock", None)
+        object.__setattr__(self, "_openedAt", time.perf_counter())
+        object.__setattr__(self, "initialized", True)
+
+    @property
+    def _nodes(self) -> dict:
+        return self.camera_attributes
+
+    def start(self):
+        self.simulation._call("start", _SpinnakerException)
+        if self.streaming:
+            return
+        sequencer = self._nodes["SequencerMode"].value == "On"
+        object.__setattr__(self, "_sequencerSet", self._nodes["SequencerSetStart"].value)
+        exposureTime = self._nextSequencerExposureTime if sequencer else lambda: self._nodes["ExposureTime"].value
+        object.__setattr__(self, "_clock", _FrameClock(self.simulation, 10, exposureTime, self._period)) # 10 buffers, the Spinnaker default
+        object.__setattr__(self, "streaming", True)
+        self._clock.trigger()
+
+    def stop(self):
+        self.simulation._call("stop", _SpinnakerException)
+        if self._clock is not None:
+            self._clock.stop()
+        object.__setattr__(self, "streaming", False)
+
+    def close(self):
+        self.simulation._call("close", _SpinnakerException)
+        if self.streaming:
+            self.stop()
+        self.simulation._openCameras.discard(("flir", self.serialNumber))
+        object.__setattr__(self, "initialized", False)
+
+    def get_info(self, name : str) -> dict:
+        self.simulation._call("get_info", _SpinnakerException)
+        node = self.camera_attributes[name]
+        info = {"name" : name, "access" : "RW" if node.writable else "RO", "value" : node.value}
+        if node.options is not None:
+            info["entries"] = list(node.options)
+        if node.limits is not None:
+            info["min"], info["max"] = node.limits() if callable(node.limits) else node.limits
+        return info
+
+    def SequencerSetSave(self):
+        """
+        Store the exposure time and next set in the sequencer set that is selected (a command node).
+        """
+        self.simulation._call("SequencerSetSave", _SpinnakerException)
+        if self._nodes["SequencerConfigurationMode"].value != "On":
+            raise _SpinnakerException("Spinnaker: switch SequencerConfigurationMode on first")
+        self._sequencerSets[self._nodes["SequencerSetSelector"].value] = (self._nodes["ExposureTime"].value, self._nodes["SequencerSetNext"].value)
+
+    def __getattr__(self, name : str):
+        # only called for names that are not normal attributes, like simple_pyspin does for nodes
+        attributes = self.__dict__.get("camera_attributes", {})
+        if name in attributes:
+            return attributes[name].GetValue()
+        raise AttributeError(f"this camera has no node {name}")
+
+    def __setattr__(self, name : str, value):
+        if name in self.camera_attributes:
+            self.camera_attributes[name].SetValue(value)
+        else:
+            raise AttributeError(f"this camera has no node {name}")
+
+    def _locked(self, name : str) -> bool:
+        """
+        Whether a node is locked by another setting, like the exposure time while the camera exposes automatically.
+        """
+        nodes = self._nodes
+        if name == "ExposureTime":
+            return nodes["ExposureAuto"].value != "Off"
+        if name == "Gain":
+            return nodes["GainAuto"].value != "Off"
+        if name == "AcquisitionFrameRate":
+            return not nodes["AcquisitionFrameRateEnable"].value
+        if name.startswith("Sequencer") and name not in ("SequencerMode", "SequencerConfigurationMode"):
+            return nodes["SequencerConfigurationMode"].value != "On"
+        if name == "SequencerConfigurationMode":
+            return nodes["SequencerMode"].value == "On"
+        return False
+
+    def _changed(self, name : str):
+        nodes = self._nodes
+        if name in ("ExposureTime", "AcquisitionFrameRateEnable") and not nodes["AcquisitionFrameRateEnable"].value:
+            # without a fixed framerate the camera runs as fast as the exposure time allows, and reports that framerate
+            nodes["AcquisitionFrameRate"].value = 1 / self._period(nodes["ExposureTime"].value)
+        if name in ("BinningHorizontal", "BinningVertical"):
+            # sizes are counted in binned pixels
+            nodes["WidthMax"].value = self.simulation.width // nodes["BinningHorizontal"].value
+            nodes["HeightMax"].value = self.simulation.height // nodes["BinningVertical"].value
+            nodes["OffsetX"].value = nodes["OffsetY"].value = 0
+            nodes["Width"].value = nodes["WidthMax"].value
+            nodes["Height"].value = nodes["HeightMax"].value
+
+    def _nextSequencerExposureTime(self) -> float:
+        exposureTime, nextSet = self._sequencerSets.get(self._sequencerSet, (self._nodes["ExposureTime"].value, self._sequencerSet))
+        object.__setattr__(self, "_sequencerSet", nextSet)
+        return exposureTime
+
+    def _period(self, exposureTime : float) -> float:
+        period = max(exposureTime * 1e-6, self.simulation.readoutTime)
+        if self._nodes["AcquisitionFrameRateEnable"].value:
+            period = max(period, 1 / self._nodes["AcquisitionFrameRate"].value)
+        return period
+
+    def _image(self, exposureTime : float, gain : float, frameCount : int) -> np.ndarray:
+        nodes = self._nodes
+        dtype, channels, _ = _FLIR_PIXELFORMATS[nodes["PixelFormat"].value]
+        shape = (nodes["Height"].value, nodes["Width"].value) + ((channels,) if channels > 1 else ())
+        binning = nodes["BinningHorizontal"].value * nodes["BinningVertical"].value
+        return self.simulation._frame(shape, dtype, np.iinfo(dtype).max, exposureTime * binning, gain, frameCount)
+
+def _flirModules(simulation : Simulation) -> dict:
+    PySpin = types.ModuleType("PySpin", "Simulated PySpin, see pyunicam.simulators.")
+    PySpin.SpinnakerException = _SpinnakerException
+    PySpin.EVENT_TIMEOUT_INFINITE = _EVENT_TIMEOUT_INFINITE
+    PySpin.SPINNAKER_ERR_TIMEOUT = _SPINNAKER_ERR_TIMEOUT
+    simple_pyspin = types.ModuleType("simple_pyspin", "Simulated simple_pyspin, see pyunicam.simulators.")
+    simple_pyspin.PySpin = PySpin
+    simple_pyspin.Camera = type("Camera", (_FlirCamera,), {"simulation" : simulation})
+    flir = types.ModuleType("flir", "Simulated helpers to switch automatic settings of FLIR cameras, see pyunicam.simulators.")
+    flir.exposureAutoSetter = lambda cam, value: setattr(cam, "ExposureAuto", "Continuous" if value else "Off")
+    flir.gainAutoSetter = lambda cam, value: setattr(cam, "GainAuto", "Continuous" if value else "Off")
+    return {module.__name__ : module for module in (PySpin, simple_pyspin, flir)}
@@ -0,0 +1,31 @@
+"""
+Capture stages: things that want to see every frame a camera captures, like recorders. Attach them to a camera with cam.addStage; while a stage is attached, startCapture starts a background acquisition thread that pulls frames from the camera and hands them to every stage in turn.
+"""
+
+class CaptureStage(object):
+    """
+    Base class for capture stages. Children override whatever they need, all methods do nothing by default.
+    """
+    def start(self, cam):
+        """
+        Called by cam.startCapture, before the first frame arrives.
+        """
+        pass
+
+    def process(self, frame, meta):
+        """
+        Called from the acquisition thread for every captured frame, together with its metadata record (see pyunicam.metadata.FRAME_METADATA_DTYPE). The frame buffer and record are reused for the next frame, so copy them if you want to keep them. Keep this fast: a slow stage delays every stage after it.
+        """
+        pass
+
+    def interrupt(self):
+        """
+        Called by cam.stopCapture as soon as capturing should stop, from another thread than process and before waiting for the acquisition thread. If process can wait (like for room in a queue), wake it up here and make it return right away, otherwise stopCapture waits forever. process may still be called for a frame that was underway.
+        """
+        pass
+
+    def stop(self):
+        """
+        Called by cam.stopCapture, after the last frame was processed.
+        """
+        pass
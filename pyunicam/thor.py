@@ -1,11 +1,20 @@
 from numbers import Number
 import time
 from .universal import *
+from .framebuffer import FrameRingBuffer
+from .scheduling import DeadlineScheduler
+from .sessions import sessionPool
 import threading
 import warnings
 
+THOR_SDK_KEY = ("thorSDK",) # the Thorlabs SDK can only be opened once per process, so all ThorCams share it through the session pool
+
 class ThorCam(UniversalCam):
-    def __init__(self):
+    def __init__(self, serialNumber : str|None = None):
+        """
+        Connect to a Thorlabs camera. If serialNumber is None, the first camera found is used.
+        """
+        self.serialNumber = serialNumber
         import thorlabs_tsi_sdk
         import thorlabs_tsi_sdk.tl_camera
         import thorlabs_tsi_sdk.windows_setup
@@ -18,10 +27,20 @@ class ThorCam(UniversalCam):
     def connectCam(self):
         self.thorlabs_tsi_sdk.windows_setup.configure_path()
         self.thorFramerate = -1 # so it is not possible to set the framerate natively in the thorcam, but I can of course manually force it. If framerate is -1, leave it to the camera, otherwise attempt to interfere using _thor_framerate_setter
-        self.thorConnectSDK = self.thorlabs_tsi_sdk.tl_camera.TLCameraSDK()
-        allCams = self.thorConnectSDK.discover_available_cameras()
-        self.camConnection = self.thorConnectSDK.open_camera(allCams[0]) # I simply assume there is only 1 camera attached. Fuck me if that is not the case.
-        self.test_connection()
+        self.thorCaptureBufferSize = 100 # max number of frames kept in memory when enforcing a framerate. Memory for these is allocated once in startCapture.
+        self.thorCaptureOverflowPolicy = "dropOldest" # what to do when getImages does not keep up, see pyunicam.framebuffer.OVERFLOW_POLICIES
+        self.thorFrameratePolicy = "skip" # what to do when a frame takes longer than the enforced framerate allows, see pyunicam.scheduling.SCHEDULER_POLICIES
+        self.thorExposureSequence = None # exposure times set between the software triggers of the enforced framerate, see setExposureSequence
+        self.thorPollTimeout = None # image_poll_timeout_ms the camera is set to, see _pollThorFrame
+        self.thorConnectSDK = self._acquireThorSDK()
+        try:
+            self.thorSessionKey = ("thor", self._findSerialNumber())
+            self.camConnection = sessionPool.acquire(self.thorSessionKey, self._openThorCam, self._disposeThorCam)
+        finally:
+            sessionPool.release(THOR_SDK_KEY) # the camera holds on to the SDK itself, see _openThorCam
+        self.lastConnectionCheck = None
+        self._checkConnection()
+        self._resetThorCam()
         self.propertyConvert = {
             "exposureTime" : 'exposure_time_us',
             "exposureTimeAuto" : "Not implemented",
@@ -29,8 +48,8 @@ class ThorCam(UniversalCam):
             "acquisitionFramerateAuto" : True,
             "gain" : "gain",
             "gainAuto": "Not implemented",
-            "height" : 'sensor_height_pixels',
-            "width" : 'sensor_width_pixels',
+            "height" : 'image_height_pixels', # follows the region of interest and binning, see setROI
+            "width" : 'image_width_pixels',
             'pixelFormat' : 'grayscale',
             'gammaEnable' : "Not implemented",
             'gamma' : 'Not implemented',
@@ -47,35 +66,83 @@ class ThorCam(UniversalCam):
             raise ConnectionError("Thorcam is not connected")
 
     def close(self):
+        """
+        Stop capturing and give the camera back to the session pool (pyunicam.sessions.sessionPool), which keeps it open for a while so connecting to it again is fast.
+        """
         self.stopCapture()
-        self.camConnection.dispose()
-        time.sleep(0.1) # give it some time to *actually* break the connection.
-        self.thorConnectSDK.dispose()
+        sessionPool.release(self.thorSessionKey)
+
+    def _findSerialNumber(self) -> str:
+        """
+        Serial number of the camera to open. A camera parked in the session pool is used without asking the SDK (which is slow).
+        """
+        if self.serialNumber is not None and sessionPool.parked(("thor", str(self.serialNumber))):
+            return str(self.serialNumber)
+        if self.serialNumber is None and sessionPool.parked(("thor",)):
+            return sessionPool.parked(("thor",))[0][1]
+        allCams = self.thorConnectSDK.discover_available_cameras()
+        if not allCams:
+            raise ConnectionError("No Thor cameras found")
+        if self.serialNumber is None:
+            return allCams[0]
+        if str(self.serialNumber) in allCams:
+            return str(self.serialNumber)
+        raise ConnectionError(f"No Thor camera with serial number {self.serialNumber} found, available are: {allCams}")
+
+    def _acquireThorSDK(self):
+        return sessionPool.acquire(THOR_SDK_KEY, self.thorlabs_tsi_sdk.tl_camera.TLCameraSDK, lambda sdk: sdk.dispose(), shared=True)
+
+    def _openThorCam(self):
+        camera = self.thorConnectSDK.open_camera(self.thorSessionKey[1])
+        self._acquireThorSDK() # an open camera needs the SDK, released again in _disposeThorCam
+        return camera
 
-    def startCapture(self):
+    def _resetThorCam(self):
         """
-        Start capturing images with camera. This function is non-blocking. Images that are captured need to be collected using self.getImages function. Stop collection with self.stopCapture.
+        Read out the full sensor without binning, which is what a new ThorCam assumes (roi None, binning 1). A camera from the session pool still has the settings of whoever used it last.
         """
+        camera = self.camConnection
+        try:
+            camera.binx = 1
+            camera.biny = 1
+        except self.thorlabs_tsi_sdk.tl_camera.TLCameraError:
+            pass # cameras that cannot bin
+        camera.roi = (0, 0, camera.sensor_width_pixels - 1, camera.sensor_height_pixels - 1)
+
+    @staticmethod
+    def _disposeThorCam(camera):
+        camera.dispose()
+        time.sleep(0.1) # give it some time to *actually* break the connection.
+        sessionPool.release(THOR_SDK_KEY)
+
+    def _startCaptureDeep(self):
         if self.propertyConvert["acquisitionFramerateAuto"]:
+            if self.thorExposureSequence is not None:
+                raise ValueError("the exposure sequence was set up for a fixed framerate, set the exposure sequence again after changing acquisitionFramerate")
             self.camConnection.frames_per_trigger_zero_for_unlimited = 0
             self.camConnection.arm(frames_to_buffer = 100)
             self.camConnection.issue_software_trigger()
         else:
             self.killThorCaptureThread = threading.Event()
-            self.thorCaptureImageCacheLock = threading.Lock()
-            self.thorCaptureImageCache = list()
+            self.thorCaptureImageCache = FrameRingBuffer(
+                self.thorCaptureBufferSize,
+                (self.getProperty('height'), self.getProperty('width')),
+                dtype = np.uint16, # Thor cameras always hand out 16 bit buffers, whatever the bit depth of the sensor.
+                overflowPolicy = self.thorCaptureOverflowPolicy,
+                metaDtype = FRAME_METADATA_DTYPE,
+            )
+            self.thorFramerateScheduler = DeadlineScheduler(1 / self.propertyConvert["acquisitionFramerate"], self.thorFrameratePolicy)
+            self.thorCaptureError = None
             self.thorCaptureThread = threading.Thread(target=self._thor_capture_with_framerate)
             self.thorCaptureThread.start()
 
-    def stopCapture(self):
-        """
-        Stop capturing images with camera (when started with self.startCapture). Images that are captured need to be collected using the self.getImages function.
-        """
+    def _stopCaptureDeep(self):
         if self.propertyConvert["acquisitionFramerateAuto"]:
             self.camConnection.disarm()
         else:
             try:
                 self.killThorCaptureThread.set()
+                self.thorCaptureImageCache.close() # wakes up the capture thread if it is waiting for room in the buffer
                 self.thorCaptureThread.join()
             except AttributeError:
                 self.killThorCaptureThread = threading.Event()
@@ -84,10 +151,13 @@ class ThorCam(UniversalCam):
                 self.camConnection.disarm()
             except self.thorlabs_tsi_sdk.tl_camera.TLCameraError:
                 pass
+            if getattr(self, "thorCaptureError", None) is not None:
+                error, self.thorCaptureError = self.thorCaptureError, None
+                raise error
 
-    def getImages(self) -> np.ndarray:
+    def getImages(self, timeout : float|None = None) -> np.ndarray:
         """
-        Return images captured by a capturing camera (see self.startCapture). Data is always returned as a numpy array. Every time you call this function, you receive one (1) image. This function blocks execution until an image appears in the camera buffer.
+        Return images captured by a capturing camera (see self.startCapture). Data is always returned as a numpy array. Every time you call this function, you receive one (1) image. This function blocks execution until an image appears in the camera buffer, or until timeout seconds have passed (then a TimeoutError is raised). How the camera is polled while waiting is set by self.waitStrategy, see pyunicam.waiting.
 
         Returns
         -------
@@ -103,43 +173,102 @@ class ThorCam(UniversalCam):
         imgs = [ (c.getImages(),time.time()) for frame in range(20)]
         c.stopCapture()
         """
+        return self._getFrameInto(None, timeout)
+
+    def _getImageInto(self, out : np.ndarray|None, timeout : float|None = None, meta : np.ndarray|None = None) -> np.ndarray:
+        """
+        Write the next image straight from the camera (or the framerate buffer) into out. If out is None, a new array is made. If meta is given, the metadata of the frame is written into it.
+        """
         if self.propertyConvert["acquisitionFramerateAuto"]:
-            while True:
-                try:
-                    return np.copy(self.camConnection.get_pending_frame_or_null().image_buffer)
-                except AttributeError:
-                    pass # poll again
+            frame = self._waitForThorFrame(timeout)
+            self._stampThorFrame(frame, meta)
+            start = self.instrumentation.start()
+            if out is None:
+                out = np.copy(frame.image_buffer)
+            else:
+                np.copyto(out, np.reshape(frame.image_buffer, out.shape))
+            self.instrumentation.stop("copyTime", start)
+            return out
         else: 
-            # this looks funky but makes sense: go over list, if it is empty, you expect more. If it takes too long, throw an error.
-            totalTime = 0
-            while True:
+            # wait for the capture thread to fill the buffer. If it takes too long, throw an error.
+            # metadata was recorded by the capture thread when the frame arrived, and travels along in the buffer
+            self.instrumentation.gauge("queueDepth", len(self.thorCaptureImageCache))
+            if timeout is not None:
+                out, frameMeta = self.thorCaptureImageCache.getWithMetadata(timeout = timeout, out = out)
+            else:
                 try:
-                    with self.thorCaptureImageCacheLock:
-                        return self.thorCaptureImageCache.pop(0)
-                except IndexError:
-                    if totalTime > ((1/self.propertyConvert["acquisitionFramerate"]) * 3):
-                        # If this error occurs, something very serious went wrong
-                        raise ValueError("No images are being generated. Probably you ran out of memory or the camera disconnected or crashed.")
-                    else:
-                        totalTime += 0.01
-                        time.sleep(0.01)
+                    out, frameMeta = self.thorCaptureImageCache.getWithMetadata(timeout = (1/self.propertyConvert["acquisitionFramerate"]) * 3, out = out)
+                except TimeoutError:
+                    # If this error occurs, something very serious went wrong
+                    raise ValueError("No images are being generated. Probably the camera disconnected or crashed.")
+            if meta is not None:
+                meta[...] = frameMeta
+            return out
+
+    def _waitForThorFrame(self, timeout : float|None):
+        """
+        Wait for the next frame from the camera, according to self.waitStrategy. The "blocking" strategy lets the SDK wait (see _pollThorFrame), the others poll.
+        """
+        return waitFor(self._pollThorFrame, timeout, self.waitStrategy, self.instrumentation, self._pollThorFrame)
+
+    def _pollThorFrame(self, wait : float = 0):
+        """
+        Return the next frame, or None if none arrived within wait (s). The SDK waits by itself (image_poll_timeout_ms), so the thread sleeps instead of polling.
+        """
+        timeout = int(wait * 1000)
+        if timeout != self.thorPollTimeout:
+            self.camConnection.image_poll_timeout_ms = timeout
+            self.thorPollTimeout = timeout
+        return self.camConnection.get_pending_frame_or_null()
+
+    def _stampThorFrame(self, frame, meta : np.ndarray|None, exposureTime : float|None = None):
+        """
+        Fill in the metadata of a Thor frame object, including its frame count and (on SDK versions that have it) the relative hardware timestamp.
+        """
+        self._stampFrame(meta, getattr(frame, "time_stamp_relative_ns_or_null", None), getattr(frame, "frame_count", None), exposureTime)
+
+    def getDroppedFrames(self) -> int:
+        """
+        Return the number of frames that were thrown away because the frame buffer was full during the last capture with an enforced framerate (see self.thorCaptureBufferSize and self.thorCaptureOverflowPolicy).
+        """
+        try:
+            return self.thorCaptureImageCache.droppedFrames
+        except AttributeError:
+            return 0
+
+    def _statsDeep(self) -> dict:
+        stats = {"droppedFrames" : self.getDroppedFrames()} # thrown away because the buffer of the enforced framerate was full
+        schedule = self.getFramerateStats()
+        if schedule:
+            stats["missedDeadlines"] = schedule.get("missedDeadlines")
+            stats["lateFrames"] = schedule.get("lateTriggers")
+        return stats
+
+    def getFramerateStats(self) -> dict:
+        """
+        Return how well the enforced framerate was kept during the last (or current) capture: actual trigger intervals, lateness and jitter (s), and the number of missed deadlines. See pyunicam.scheduling.DeadlineScheduler.stats. The trigger times themselves are in self.thorFramerateScheduler.triggerTimes.
+        """
+        try:
+            return self.thorFramerateScheduler.stats()
+        except AttributeError:
+            return dict()
 
-    def takeOneImage(self) -> np.ndarray:
+    def takeOneImage(self, timeout : float|None = None) -> np.ndarray:
         """
-        Take a single image using the camera. This is mostly just a convenience function.
+        Take a single image using the camera. This is mostly just a convenience function. Raises a TimeoutError if no image arrived within timeout seconds (None waits as long as it takes).
         """
-        self.test_connection()
+        self._checkConnection()
         self.camConnection.frames_per_trigger_zero_for_unlimited = 0 # Without this, it will not work...
         self.camConnection.arm(frames_to_buffer = 2)
-        self.camConnection.issue_software_trigger()
-        # this won't work without a tiny pause, depends on how long camera has been on etc.
-        while True:
-            try:
-                d = np.copy(self.camConnection.get_pending_frame_or_null().image_buffer)
-                break
-            except AttributeError:
-                pass # poll again
-        self.camConnection.disarm()
+        try:
+            self.camConnection.issue_software_trigger()
+            trigger = time.perf_counter()
+            # this won't work without a tiny pause, depends on how long camera has been on etc.
+            frame = self._waitForThorFrame(timeout)
+            self.instrumentation.record("triggerToFrame", time.perf_counter() - trigger)
+            d = self._convertFrame(frame.image_buffer) # copies the frame
+        finally:
+            self.camConnection.disarm()
         return d
 
     def getMetadata(self) -> dict:
@@ -152,11 +281,43 @@ class ThorCam(UniversalCam):
         }
         return cameraMetadata
 
+    def _setROIDeep(self, roi : tuple|None):
+        """
+        Set the region of interest of the sensor. The TSI SDK counts it in sensor pixels, with the bottom-right corner included.
+        """
+        self._checkConnection()
+        if roi is None:
+            roi = (0, 0, self.camConnection.sensor_width_pixels, self.camConnection.sensor_height_pixels)
+        x, y, width, height = roi
+        self.camConnection.roi = (x, y, x + width - 1, y + height - 1)
+
+    def _setBinningDeep(self, factor : int):
+        self._checkConnection()
+        try:
+            self.camConnection.binx = factor
+            self.camConnection.biny = factor
+        except self.thorlabs_tsi_sdk.tl_camera.TLCameraError as e:
+            raise NotImplementedError(f"this Thor camera cannot bin by {factor}: {e}")
+
+    def _setExposureSequenceDeep(self, exposureTimes : list|None):
+        """
+        Thor cameras have no sequencer, but with a fixed framerate every frame is triggered separately, so the exposure time can be changed in between (see _thor_capture_with_framerate). With the framerate on auto, frames are exposed back to back, and setExposureSequence falls back to changing the exposure time after every frame.
+        """
+        if exposureTimes is not None and self.propertyConvert["acquisitionFramerateAuto"]:
+            raise NotImplementedError("exposure sequences need a fixed acquisitionFramerate on Thor cameras")
+        self.thorExposureSequence = exposureTimes
+
+    def _maxPixelValue(self) -> int|None:
+        try:
+            return 2**self.camConnection.bit_depth - 1 # frames are always 16 bit, whatever the sensor
+        except (AttributeError, self.thorlabs_tsi_sdk.tl_camera.TLCameraError):
+            return None
+
     def _setPropertyDeep(self, prop : str, value : str|bool|Number):
         '''
-        Set Thor camera properties. Note that only very few properties can actually be set.
+        Set Thor camera properties. Note that only very few properties can actually be set. The exposure time can be changed while capturing; auto exposure is then done in software (see pyunicam.autoexposure).
         '''
-        self.test_connection()
+        self._checkConnection()
         if 'Auto' in prop:
             raise NotImplementedError("Automated setting of properties is not implented in the thorcam")
         if prop == "acquisitionFramerate":
@@ -166,11 +327,20 @@ class ThorCam(UniversalCam):
             if value == -1:
                 # Just set a random value, since we need to do something to prevent a crash
                 self.camConnection.__setattr__(thorname_of_property,1000)
+            elif prop == "exposureTime":
+                self.camConnection.exposure_time_us = self._thorExposureTime(value)
             else:
                 self.camConnection.__setattr__(thorname_of_property,value)
 
+    @staticmethod
+    def _thorExposureTime(exposureTime : float) -> int:
+        """
+        The SDK only takes whole µs (as a C long long), and rejects floats, like the ones the software auto exposure comes up with.
+        """
+        return int(round(exposureTime))
+
     def _getPropertyDeep(self, prop: str) -> str | bool | Number:
-        self.test_connection()
+        self._checkConnection()
         thor_prop_name = self._get_real_property_name(prop)
         # if thor_prop_name in ('special', True, False) or prop in ('acquisitionFramerate'):
         #     return thor_prop_name
@@ -209,26 +379,40 @@ class ThorCam(UniversalCam):
                 warnings.warn("Since framerate setting is not really supported by the Thorcam, I need to use a custom hack. It does not work for high framerates. I detect you are probably using a potentially too high framerate, but i will continue anyway.")
 
     def _thor_capture_with_framerate(self):
-        """Capture a video with a set framerate, by sleeping between taking images manually. Gathered images are written to the self.thorCaptureImageCache, and can be accessed using the self.getImages function"""
-        time_per_loop = 1 / self.propertyConvert["acquisitionFramerate"]
-        self.camConnection.frames_per_trigger_zero_for_unlimited = 0
-        self.camConnection.arm(frames_to_buffer = 100)
-        while not self.killThorCaptureThread.is_set():
-            looptimes = time.time()
-            # take pic, add to cache
-            self.camConnection.issue_software_trigger()
-            # need to pause, how long is unknown a priori.
-            while True:
-                try:
-                    d = np.copy(self.camConnection.get_pending_frame_or_null().image_buffer)
-                    with self.thorCaptureImageCacheLock:
-                        self.thorCaptureImageCache.append( d )
+        """Capture a video with a set framerate, by triggering images manually on a fixed time grid (see self.thorFramerateScheduler). Gathered images are copied into the preallocated self.thorCaptureImageCache ring buffer, and can be accessed using the self.getImages function"""
+        sequence = self.thorExposureSequence
+        frame_timeout = max(sequence or [self.getProperty('exposureTime')]) * 1e-6 + 1 # s, so we notice being stopped even if a frame never arrives
+        meta = emptyMetadata()
+        exposureTime = None # only known per frame if cycling through an exposure sequence
+        triggered = 0
+        try:
+            # one frame per trigger, so the camera exposes on the schedule (not free running into its buffer), and a changed exposure time applies to exactly the next frame
+            self.camConnection.frames_per_trigger_zero_for_unlimited = 1
+            self.camConnection.arm(frames_to_buffer = 100)
+            self.thorFramerateScheduler.start()
+            while not self.killThorCaptureThread.is_set():
+                # wait for the next deadline. A frame that took too long does not shift the ones after it, see self.thorFrameratePolicy
+                if self.thorFramerateScheduler.wait(self.killThorCaptureThread) is None:
                     break
-                except AttributeError:
-                    pass # poll again
-            # sleep until next pic
-            looptime = time.time() - looptimes
-            try:
-                time.sleep(time_per_loop - looptime)
-            except ValueError:
-                raise ValueError(f"framerate is set too fast, data collection cannot keep up! Time of one loop is: {looptime} s, while desired looptime is {time_per_loop} s.")
+                if sequence is not None:
+                    exposureTime = sequence[triggered % len(sequence)]
+                    self.camConnection.exposure_time_us = self._thorExposureTime(exposureTime)
+                    triggered += 1
+                trigger = time.perf_counter()
+                # take pic, add to cache
+                self.camConnection.issue_software_trigger()
+                # need to pause, how long is unknown a priori.
+                try:
+                    frame = self._waitForThorFrame(frame_timeout)
+                except TimeoutError:
+                    frame_timeout = max(sequence or [self.getProperty('exposureTime')]) * 1e-6 + 1 # the (auto) exposure time may have changed
+                    continue # trigger again, unless we are stopped
+                self.instrumentation.record("triggerToFrame", time.perf_counter() - trigger)
+                self._stampThorFrame(frame, meta, exposureTime)
+                start = self.instrumentation.start()
+                self.thorCaptureImageCache.put(frame.image_buffer, meta = meta)
+                self.instrumentation.stop("copyTime", start)
+        except Exception as e:
+            # an exception in a thread is never seen, so store it to raise in stopCapture
+            self.thorCaptureError = e
+            self.thorCaptureImageCache.close()
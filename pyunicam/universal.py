@@ -3,10 +3,24 @@ Universal class for controlling cameras. All camera classes inherit from this ov
 """
 import numpy as np
 import numbers
+import functools
+import threading
 import time
+from .waiting import waitFor, WAIT_STRATEGIES
+from .metadata import FRAME_METADATA_DTYPE, emptyMetadata
+from .demosaic import Demosaicer, bayerPattern, shiftPattern
+from .roi import Binner, cropFrame
+from .instrumentation import Instrumentation
+from .autoexposure import AutoExposure
 
 class UniversalCam(object):
-    def __init__(self):
+    def __init__(self, demosaic : str|Demosaicer|None = None):
+        """
+        Parameters
+        ----------
+        demosaic : str | Demosaicer | None, optional
+            How to handle raw Bayer pixel formats (like "BayerRG8"). If None (default), the camera is switched to BGR8, so it converts the frames itself. Otherwise the camera keeps sending raw frames (three times less data, so a higher framerate), which are converted on the computer using this method (see pyunicam.demosaic.DEMOSAIC_METHODS) or Demosaicer.
+        """
         self.camType = "universal"
         # settings all devices should //always// have. You can always add more.
         self.AVAILABLE_PROPERTIES = [
@@ -19,18 +33,49 @@ class UniversalCam(object):
             'pixelFormat', # str, depends on camera, typically like "BayerRG8" or something
             'gammaEnable', # bool
             'gamma', # Not sure about the unit actually, some factor
-            "height", # pair of px (0,1200) for instance
-            "width", # pair of px (0,1200) for instance
+            "height", # px, of the frames the camera sends (so after a hardware region of interest or binning, see setROI)
+            "width", # px, idem
         ] # BY DEFINITION: an automated variable setting MUST be regular name + auto and a bool setting. I don't care about funky alternative methods (yet)
+        self.DEPENDENT_PROPERTIES = {
+            "exposureTime" : ("acquisitionFramerate",), # the framerate the camera reaches depends on the exposure time
+        } # properties the camera may change by itself when the key changes, see invalidatePropertyCache
+        self.captureStages = list() # see addStage
+        self.propertyCache = dict() # write-through cache of property values, see getProperty and invalidatePropertyCache
+        self.connectionCheckInterval = 10 # s between connection checks when getting/setting properties, None checks once per session. See _checkConnection
+        self.lastConnectionCheck = None
+        self.waitStrategy = "backoff" # how to wait for frames on cameras that need polling, see pyunicam.waiting
+        self.frameCounter = 0 # frames handed out since startCapture, see _stampFrame
+        self.frameSettings = None # (exposureTime, gain) recorded in frame metadata, see _stampFrame
+        self.asyncCapture = None # active pyunicam.aio.AsyncCapture, see capture
+        self.asyncExecutor = None # worker thread for the awaitable methods, see _runAsync
+        self.demosaicer = Demosaicer(demosaic) if isinstance(demosaic, str) else demosaic # converts raw Bayer frames, see _getFrameInto
+        self.rawFrame = None # reused buffer for frames that are converted on the computer, see _getFrameInto
+        self.colourFrame = None # reused buffer for demosaiced frames that are binned on the computer
+        self.roi = None # (x, y, width, height) in sensor px, see setROI
+        self.roiInHardware = False
+        self.binning = 1 # see setBinning
+        self.binningInHardware = False
+        self.binner = None # pyunicam.roi.Binner if binning is done on the computer
+        self.instrumentation = Instrumentation() # hot path counters and timings, off by default, see stats
+        self.lastHardwareFrameNumber = -1 # to spot dropped frames, see _stampFrame
+        self.softwareAutoExposure = AutoExposure() # settings of the auto exposure for cameras that cannot do it themselves, see pyunicam.autoexposure
+        self.autoExposureInSoftware = False
+        self.exposureSequence = None # exposure times (µs) to cycle through frame by frame, see setExposureSequence
+        self.exposureSequenceInHardware = False
+        self.exposureSequenceIndex = 0 # position in the sequence of the next frame
+        self.calibration = None # pyunicam.calibration.Calibration that corrects every frame, see setCalibration
+        self.uncalibratedFrame = None # reused buffer for frames that are converted before they are calibrated
+        self.calibrationMeta = emptyMetadata() # metadata of frames handed out without, see _getFrameInto
         self.connectCam()
         ### Universal settings
-        if 'ayer' in self.getProperty('pixelFormat'): 
+        if 'ayer' in self.getProperty('pixelFormat') and self.demosaicer is None:
             # This means raw Bayer pattern, which we basically NEVER want. So set to regular RGB output. bayer and Bayer will both work this way.
             # To see available pixelformats, check self.camConnection.get_info('PixelFormat')
             try:
                 self.setProperty('pixelFormat','BGR8')
             except:
-                print(f"Warning, pixelformat is Bayer patterned ('{self.getProperty('pixelFormat')}')!")
+                print(f"Warning, pixelformat is Bayer patterned ('{self.getProperty('pixelFormat')}') and cannot be changed, converting frames to colour on the computer instead")
+                self.demosaicer = Demosaicer("bilinear")
         # We are doing science, not making pretty pictures, so diable Gamma by default
         try:
             if self.getProperty('gammaEnable'):
@@ -63,18 +108,49 @@ class UniversalCam(object):
     def startCapture(self):
         """
         Start capturing images with camera. This function is non-blocking. Images that are captured need to be collected using getImages function. Stop collection with stopCapture.
+        If any capture stages are attached (see addStage), a background thread collects the images instead and hands them to the stages, so do not call getImages yourself in that case.
         """
-        self.camConnection.start()
+        self.frameCounter = 0
+        self.lastHardwareFrameNumber = -1
+        self.instrumentation.count("captures")
+        self.exposureSequenceIndex = 0
+        if self.exposureSequence is not None and not self.exposureSequenceInHardware:
+            self._setPropertyDeep("exposureTime", self.exposureSequence[0]) # start the cycle at the beginning
+            self.propertyCache.pop("exposureTime", None)
+            self._forgetDependentProperties("exposureTime")
+        self._startCaptureDeep()
+        if self.captureStages:
+            self._startAcquisitionThread()
         
     def stopCapture(self):
         """
         Stop capturing images with camera (when started with startCapture). Images that are captured need to be collected using getImages function.
         """
-        self.camConnection.stop()
+        error = self._stopAcquisitionThread()
+        self._stopCaptureDeep()
+        if error is not None:
+            raise error
+
+    def addStage(self, stage):
+        """
+        Attach a capture stage (see pyunicam.stages.CaptureStage), like a Recorder. From the next startCapture on, every captured frame is handed to the stage from a background acquisition thread.
+        """
+        self.captureStages.append(stage)
+
+    def removeStage(self, stage):
+        """
+        Detach a capture stage that was attached with addStage.
+        """
+        self.captureStages.remove(stage)
 
-    def getImages(self) -> np.ndarray:
+    def getImages(self, timeout : float|None = None) -> np.ndarray:
         """
         Return images captured by a capturing camera (see startCapture). Data is always returned as a numpy array. Every time you call this function, you receive one (1) image. You continue until no images are left to collect.
+
+        Parameters
+        ----------
+        timeout : float | None, optional
+            Maximum time (s) to wait for an image, raises a TimeoutError after that. None (default) waits as long as it takes.
         
         Returns
         -------
@@ -92,33 +168,332 @@ class UniversalCam(object):
         """
         return np.random.randint(low=0,high=255,size=[500,500,3],dtype=np.uint8) # dummy data that looks like an image.
 
+    def capture(self, maxQueuedFrames : int = 32, overflowPolicy : str = "dropOldest"):
+        """
+        Capture for use with asyncio: returns an async context manager that starts and stops capturing, and can be iterated over for frames. See pyunicam.aio.AsyncCapture for the parameters.
+
+        Example
+        ------
+        async with cam.capture():
+            async for frame in cam.frames():
+                ...
+        """
+        from .aio import AsyncCapture
+        return AsyncCapture(self, maxQueuedFrames, overflowPolicy)
+
+    def frames(self, withMetadata : bool = False):
+        """
+        Async iterator over the frames of the running asyncio capture (see capture). Yields (frame, metadata record) tuples if withMetadata.
+        """
+        if self.asyncCapture is None:
+            raise RuntimeError("frames() only works inside 'async with cam.capture():'")
+        return self.asyncCapture.frames(withMetadata)
+
+    async def setPropertyAsync(self, prop : str, value : str|bool|numbers.Number):
+        """
+        Awaitable version of setProperty.
+        """
+        return await self._runAsync(self.setProperty, prop, value)
+
+    async def setPropertiesAsync(self, properties : dict) -> dict:
+        """
+        Awaitable version of setProperties.
+        """
+        return await self._runAsync(self.setProperties, properties)
+
+    async def getPropertyAsync(self, prop : str):
+        """
+        Awaitable version of getProperty.
+        """
+        return await self._runAsync(self.getProperty, prop)
+
+    async def takeOneImageAsync(self, timeout : float|None = None) -> np.ndarray:
+        """
+        Awaitable version of takeOneImage.
+        """
+        return await self._runAsync(self.takeOneImage, timeout)
+
+    def setROI(self, x : int, y : int, width : int, height : int) -> tuple:
+        """
+        Only read out a region of interest of the sensor, starting at pixel (x, y) (the top-left corner is (0, 0)), in sensor pixels (so before binning). A smaller region usually means a higher framerate. If the camera supports it, the region is set on the camera, otherwise frames are cropped on the computer. Change this while not capturing.
+        With a raw Bayer pixel format, width and height have to be even. Regions at an odd offset are cropped on the computer, since on the camera they would change the Bayer pattern.
+
+        Returns
+        -------
+        tuple
+            The region of interest, as (x, y, width, height).
+        """
+        roi = tuple(int(v) for v in (x, y, width, height))
+        if roi[2] <= 0 or roi[3] <= 0 or roi[0] < 0 or roi[1] < 0:
+            raise ValueError(f"invalid region of interest {roi}, should be (x, y, width, height)")
+        pattern = bayerPattern(self.getProperty('pixelFormat'))
+        if pattern is not None and (roi[2] % 2 or roi[3] % 2):
+            raise ValueError(f"the region of interest of raw Bayer frames should have an even width and height, not {roi[2]}x{roi[3]}")
+        try:
+            if pattern is not None and (roi[0] % 2 or roi[1] % 2):
+                raise NotImplementedError("an odd offset would change the Bayer pattern of the camera") # cropping on the computer shifts the pattern, see _convertPixels
+            self._setROIDeep(roi)
+            self.roiInHardware = True
+        except NotImplementedError:
+            if self.roiInHardware:
+                self._setROIDeep(None)
+            self.roiInHardware = False
+        self.roi = roi
+        self.invalidatePropertyCache()
+        return roi
+
+    def resetROI(self):
+        """
+        Read out the full sensor again, see setROI.
+        """
+        if self.roiInHardware:
+            self._setROIDeep(None)
+        self.roi = None
+        self.roiInHardware = False
+        self.invalidatePropertyCache()
+
+    def getROI(self) -> tuple|None:
+        """
+        Return the region of interest as (x, y, width, height) in sensor pixels, or None if the full sensor is read out.
+        """
+        return self.roi
+
+    def setBinning(self, factor : int) -> int:
+        """
+        Combine blocks of factor x factor pixels into one, which makes frames factor**2 times smaller (and often allows a higher framerate). Uses the binning of the camera if it has it, otherwise frames are binned on the computer (averaging the pixels). Set factor to 1 to stop binning. Change this while not capturing.
+        Raw Bayer frames are never binned on the camera, which would mix the colours: they are binned on the computer after demosaicing (see self.demosaicer).
+        """
+        factor = int(factor)
+        if factor < 1:
+            raise ValueError(f"binning factor should be at least 1, not {factor}")
+        pattern = bayerPattern(self.getProperty('pixelFormat'))
+        if pattern is not None and factor > 1 and self.demosaicer is None:
+            raise ValueError("binning raw Bayer frames would mix the colours, pass demosaic to the camera to convert them first")
+        try:
+            if pattern is not None and factor > 1:
+                raise NotImplementedError("binning raw Bayer frames on the camera would mix the colours") # bin after demosaicing instead
+            self._setBinningDeep(factor)
+            self.binningInHardware = True
+            self.binner = None
+        except NotImplementedError:
+            if self.binningInHardware:
+                self._setBinningDeep(1)
+            self.binningInHardware = False
+            self.binner = Binner(factor) if factor > 1 else None
+        self.binning = factor
+        if self.roiInHardware:
+            self._setROIDeep(self.roi) # some cameras count the region of interest in binned pixels
+        self.invalidatePropertyCache()
+        return factor
+
+    def getBinning(self) -> int:
+        """
+        Return the binning factor, see setBinning.
+        """
+        return self.binning
+
+    def setExposureSequence(self, exposureTimes : list|None) -> list|None:
+        """
+        Cycle through a list of exposure times (µs) while capturing: the first frame gets the first exposure time, the next frame the second, and so on, starting over at the end of the list. Use it for high dynamic range imaging (see pyunicam.hdr.HDRMerger). The exposure time of every frame is in its metadata.
+        Uses the sequencer of the camera where there is one (FLIR), or changes the exposure time between software triggers (Thorlabs, with a fixed acquisitionFramerate). Otherwise the exposure time is changed on the computer after every frame, which is only exact if the camera does not start exposing the next frame before the previous one is collected. Pass None to stop. Setting the exposure time by hand, or switching on exposureTimeAuto, stops the sequence as well. Change this while not capturing.
+
+        Returns
+        -------
+        list | None
+            The exposure times in the sequence.
+        """
+        if exposureTimes is not None:
+            exposureTimes = [float(t) for t in exposureTimes]
+            if not exposureTimes or min(exposureTimes) <= 0:
+                raise ValueError(f"exposure times should be a list of positive numbers, not {exposureTimes}")
+        try:
+            self._setExposureSequenceDeep(exposureTimes)
+            self.exposureSequenceInHardware = exposureTimes is not None
+        except NotImplementedError:
+            if self.exposureSequenceInHardware:
+                self._setExposureSequenceDeep(None)
+            self.exposureSequenceInHardware = False
+            if exposureTimes is not None:
+                self._setPropertyDeep("exposureTime", exposureTimes[0]) # also checks the camera can change it at all
+        if exposureTimes is not None:
+            self.autoExposureInSoftware = False
+        self.exposureSequence = exposureTimes
+        self.exposureSequenceIndex = 0
+        self.invalidatePropertyCache("exposureTime")
+        return exposureTimes
+
+    def setCalibration(self, calibration = True):
+        """
+        Dark and flat correct every frame the camera hands out, with the masters of a pyunicam.calibration.Calibration (True for the one of this camera, None to stop). Frames are then float32. Take the masters first, like cam.setCalibration(); cam.calibration.acquireDark(cam).
+
+        Returns
+        -------
+        pyunicam.calibration.Calibration | None
+            The calibration in use.
+        """
+        from .calibration import calibrationFor, cameraIdentity
+        if calibration is True:
+            calibration = calibrationFor(self)
+        elif calibration is not None and calibration.identity != cameraIdentity(self):
+            raise ValueError(f"calibration of camera {calibration.identity} does not belong to this camera ({cameraIdentity(self)})")
+        self.calibration = calibration
+        self.invalidatePropertyCache()
+        return calibration
+
+    def getExposureSequence(self) -> list|None:
+        """
+        Return the exposure times (µs) that are cycled through, see setExposureSequence, or None.
+        """
+        return self.exposureSequence
+
+    def getImagesWithMetadata(self, timeout : float|None = None) -> tuple[np.ndarray, np.void]:
+        """
+        Same as getImages, but also return the metadata of the image (frame number, arrival time, hardware timestamp, exposure time and gain), recorded when the image arrived. See pyunicam.metadata.FRAME_METADATA_DTYPE.
+        """
+        meta = emptyMetadata()
+        frame = self._getFrameInto(None, timeout, meta)
+        return frame, meta[()]
+
+    def grabFrames(self, n : int, out : np.ndarray|None = None, timeout : float|None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Collect n images from a capturing camera (see startCapture) into a single contiguous stack. Each frame is written straight into the stack, so a movie of thousands of frames costs one allocation and no extra copies.
+
+        Parameters
+        ----------
+        n : int
+            Number of frames to collect.
+        out : np.ndarray | None, optional
+            Array of shape (N,H,W) or (N,H,W,C), with N >= n, to write the frames into. If None (default), a stack is allocated based on the first frame.
+        timeout : float | None, optional
+            Maximum time (s) to wait for each frame, see getImages.
+
+        Returns
+        -------
+        frames : np.ndarray
+            Stack of the n images, the first axis is the frame number. A view of the first n frames of out, if given.
+        metadata : np.ndarray
+            Structured array with the metadata of every frame, like metadata["hostTimestamp"]. See pyunicam.metadata.FRAME_METADATA_DTYPE.
+
+        Example
+        ------
+        To take a movie of 20 frames, run:
+
+        c = pyunicam.connect_cam('thor')
+        c.startCapture()
+        imgs, meta = c.grabFrames(20)
+        c.stopCapture()
+        """
+        metadata = emptyMetadata(n)
+        start = 0
+        if out is None:
+            first = self._getFrameInto(None, timeout, metadata[0, ...])
+            out = np.empty((n,) + first.shape, dtype=first.dtype)
+            out[0] = first
+            start = 1
+        elif out.shape[0] < n:
+            raise ValueError(f"out has room for {out.shape[0]} frames, but {n} frames were requested")
+        for i in range(start, n):
+            self._getFrameInto(out[i], timeout, metadata[i, ...])
+        return out[:n], metadata
+
     def setProperty(self, prop : str, value : str|bool|numbers.Number):
         """
-        Get the value of a camera property (like exposure time). You can select properties from a list printed by self.printProperties(). Watch the units!
+        Set the value of a camera property (like exposure time). You can select properties from a list printed by self.printProperties(). Watch the units!
         """
-        if not (prop in self.AVAILABLE_PROPERTIES):
-            raise NotImplementedError(f"the property '{prop}' is not implemented (or you made a spelling error). Available properties are listed below: \n{self.AVAILABLE_PROPERTIES}")
-        setValue = self.getProperty(prop) # To trigger any errors while not writing, just as a precaution
-        self._setPropertyDeep(prop,value)
+        return self.setProperties({prop : value})[prop]
+
+    def setProperties(self, properties : dict) -> dict:
+        """
+        Set several camera properties at once, like {'exposureTime' : 10000, 'gain' : 0}. All names are checked before anything is written, and values are verified once all of them are set, so this is the cheapest way to apply a whole configuration. If writing one of the properties fails, the properties that were already written are set back to their old values.
+
+        Returns
+        -------
+        dict
+            The values of the properties as read back from the camera.
+        """
+        for prop in properties:
+            if not (prop in self.AVAILABLE_PROPERTIES):
+                raise NotImplementedError(f"the property '{prop}' is not implemented (or you made a spelling error). Available properties are listed below: \n{self.AVAILABLE_PROPERTIES}")
+        oldValues = {prop : self.getProperty(prop) for prop in properties} # To trigger any errors while not writing, just as a precaution
+        written = list()
+        try:
+            for prop, value in properties.items():
+                start = self.instrumentation.start()
+                self._setPropertyOrFallback(prop,value)
+                self.instrumentation.stop("sdk.setProperty", start)
+                written.append(prop)
+                self.invalidatePropertyCache(prop)
+        except Exception:
+            for prop in reversed(written):
+                try:
+                    self._setPropertyOrFallback(prop, oldValues[prop])
+                except Exception:
+                    pass # we tried, the original error is more interesting
+                self.invalidatePropertyCache(prop)
+            raise
         # Now check if anything was actually set, and throw error if not. Needs some leeway, since some values (but not all) are some hexadecimal thing, so will not be set *exactly* (12 may become 12.02 or something)
-        setValue = self.getProperty(prop)
-        if not withinFrac(value,setValue,0.05) and value != -1: # Since -1 means automated
-           raise IOError(f'property not set correctly: tried setting {prop} to {value}, but upon inspection {prop} was set to {setValue}')
-        else:
-            return setValue
+        setValues = {prop : self.getProperty(prop) for prop in properties}
+        wrong = [f"tried setting {prop} to {value}, but upon inspection {prop} was set to {setValues[prop]}" for prop, value in properties.items() if not withinFrac(value,setValues[prop],0.05) and value != -1] # Since -1 means automated
+        if wrong:
+            raise IOError('property not set correctly: ' + '; '.join(wrong))
+        return setValues
 
     def getProperty(self, prop : str):
+        """
+        Get the value of a camera property (like exposure time). Values are cached, so asking again is cheap, unless the camera controls the property itself (its Auto setting is on).
+        """
         if not (prop in self.AVAILABLE_PROPERTIES):
             raise NotImplementedError(f"the property '{prop}' is not implemented (or you made a spelling error). Available properties are listed below: \n{self.AVAILABLE_PROPERTIES}")
-        return self._getPropertyDeep(prop)
+        if prop == "exposureTimeAuto" and self.autoExposureInSoftware:
+            return True
+        try:
+            return self.propertyCache[prop]
+        except KeyError:
+            pass
+        start = self.instrumentation.start()
+        try:
+            value = self._getPropertyDeep(prop)
+        except NotImplementedError:
+            if prop != "exposureTimeAuto":
+                raise
+            return False # the camera cannot do it, and it is not done in software either
+        self.instrumentation.stop("sdk.getProperty", start)
+        if not self._isAutomated(prop):
+            self.propertyCache[prop] = value
+        return value
+
+    def invalidatePropertyCache(self, prop : str|None = None):
+        """
+        Forget cached property values, so they are read from the camera again. Use this if you changed settings behind pyunicam's back (like through self.camConnection). Without prop, the whole cache is cleared, otherwise only prop, its Auto counterpart and the properties that follow prop (see self.DEPENDENT_PROPERTIES).
+        """
+        self.frameSettings = None
+        self.rawFrame = None # frame size or pixel format may have changed
+        self.colourFrame = None
+        self.uncalibratedFrame = None
+        if prop is None:
+            self.propertyCache.clear()
+            return
+        base = prop.removesuffix("Auto")
+        self.propertyCache.pop(base, None)
+        self.propertyCache.pop(base + "Auto", None)
+        self._forgetDependentProperties(base)
 
-    def takeOneImage(self) -> np.ndarray:
+    def _forgetDependentProperties(self, prop : str):
         """
-        Take a single image using the camera. This is mostly just a convenience function.
+        Drop the cached values of properties that follow prop (see self.DEPENDENT_PROPERTIES), after prop changed.
+        """
+        for dependent in self.DEPENDENT_PROPERTIES.get(prop, ()):
+            self.propertyCache.pop(dependent, None)
+
+    def takeOneImage(self, timeout : float|None = None) -> np.ndarray:
+        """
+        Take a single image using the camera. This is mostly just a convenience function. Raises a TimeoutError if no image arrived within timeout seconds (None waits as long as it takes).
         """
         self.startCapture()
-        d = self.getImages()
-        self.stopCapture()
+        try:
+            d = self.getImages(timeout)
+        finally:
+            self.stopCapture()
         return d
 
     def printProperties(self):
@@ -127,6 +502,20 @@ class UniversalCam(object):
         """
         _ = [print(prop) for prop in self.UNIVERSALPROPERTIES] # very naughty one-liner
 
+    def test_connection(self):
+        """
+        Check that the camera is actually connected, and raise a ConnectionError if not. Cameras that can silently lose their connection override this.
+        """
+        pass
+
+    def stats(self) -> dict:
+        """
+        Return the hot path counters and timings (see pyunicam.instrumentation) as a json serializable dict, plus what the camera itself keeps track of under "camera" (like frames dropped from its buffer). Switch the measurements on with cam.instrumentation.enabled = True. To have them sent somewhere regularly, use cam.instrumentation.addExporter(callback, interval, cam.stats).
+        """
+        stats = self.instrumentation.snapshot()
+        stats["camera"] = self._statsDeep()
+        return stats
+
     def getMetadata(self) -> dict:
         """
         Get camera metadata, to log what camera was actually used (usefull for like firmware or hardware updates).
@@ -143,12 +532,281 @@ class UniversalCam(object):
         }
         return cameraMetadata
 
+    def _isAutomated(self, prop : str) -> bool:
+        """
+        Check if the camera itself controls prop (so its Auto counterpart is on), in which case caching its value makes no sense.
+        """
+        autoProp = prop + "Auto"
+        if not autoProp in self.AVAILABLE_PROPERTIES:
+            return False
+        try:
+            return self.getProperty(autoProp) is True
+        except NotImplementedError:
+            return False
+
+    def _runAsync(self, function, *args):
+        """
+        Run a blocking function on the worker thread of this camera, and return an awaitable of its result. A single worker per camera keeps calls to the camera in order.
+        """
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        if self.asyncExecutor is None:
+            self.asyncExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"pyunicam-{self.camType}")
+        return asyncio.get_running_loop().run_in_executor(self.asyncExecutor, functools.partial(function, *args))
+
+    def _checkConnection(self):
+        """
+        Run test_connection, but at most once every self.connectionCheckInterval seconds (or only once per session if that is None), since checking costs a couple of round-trips to the camera.
+        """
+        now = time.monotonic()
+        if self.lastConnectionCheck is not None and (self.connectionCheckInterval is None or now - self.lastConnectionCheck < self.connectionCheckInterval):
+            return
+        self.test_connection()
+        self.lastConnectionCheck = now
+
+    def _startCaptureDeep(self):
+        """
+        Function that actually starts capturing with the camera, startCapture does the bookkeeping around it.
+        """
+        self.camConnection.start()
+
+    def _stopCaptureDeep(self):
+        """
+        Function that actually stops capturing with the camera, stopCapture does the bookkeeping around it.
+        """
+        self.camConnection.stop()
+
+    def _startAcquisitionThread(self):
+        for stage in self.captureStages:
+            stage.start(self)
+        self.acquisitionError = None
+        self.acquisitionPollTimeout = 0.5 # s, how often the thread checks if it should stop while no frames come in
+        self.killAcquisitionThread = threading.Event()
+        self.acquisitionThread = threading.Thread(target=self._acquisitionLoop, daemon=True)
+        self.acquisitionThread.start()
+
+    def _stopAcquisitionThread(self) -> Exception|None:
+        """
+        Stop the acquisition thread (if running) and the stages attached to it. Returns the exception that stopped the thread early, if any.
+        """
+        try:
+            thread = self.acquisitionThread
+        except AttributeError:
+            return None
+        self.killAcquisitionThread.set()
+        for stage in self.captureStages:
+            stage.interrupt() # a stage waiting for room would keep the thread from ever seeing the kill event
+        thread.join()
+        del self.acquisitionThread
+        for stage in self.captureStages:
+            stage.stop()
+        return self.acquisitionError
+
+    def _acquisitionLoop(self):
+        """
+        Pull frames from the camera and hand them to the capture stages until stopCapture is called. A single frame buffer is reused for all frames.
+        """
+        try:
+            frame = None
+            meta = emptyMetadata()
+            stages = [(stage, "stage." + type(stage).__name__) for stage in self.captureStages]
+            instrumentation = self.instrumentation
+            while not self.killAcquisitionThread.is_set():
+                try:
+                    frame = self._getFrameInto(frame, self.acquisitionPollTimeout, meta)
+                except TimeoutError:
+                    continue # check if we should stop, and wait again
+                for stage, name in stages:
+                    start = instrumentation.start()
+                    stage.process(frame, meta)
+                    instrumentation.stop(name, start)
+        except Exception as e:
+            # surfaces in stopCapture, an exception in a thread is never seen otherwise
+            self.acquisitionError = e
+
     def _setPropertyDeep(self, prop : str, value : str|bool|numbers.Number):
         """
         Function that actually sets a property is set using setProperty. setProperty just does input checking etc, the real nitty-gritty happens here.
         """
         self.propertyConvert[prop] = value
 
+    def _setPropertyOrFallback(self, prop : str, value : str|bool|numbers.Number):
+        """
+        Set a property on the camera, doing it in software if the camera cannot: auto exposure (see pyunicam.autoexposure). Setting the exposure time by hand switches the software auto exposure off, just like on cameras that do it themselves.
+        """
+        if prop == "exposureTime" and value != -1:
+            self.autoExposureInSoftware = False
+        if prop in ("exposureTime", "exposureTimeAuto") and self.exposureSequence is not None and value not in (-1, False):
+            self.setExposureSequence(None)
+        try:
+            self._setPropertyDeep(prop, value)
+        except NotImplementedError:
+            if prop != "exposureTimeAuto":
+                raise
+            if value and not self.autoExposureInSoftware:
+                self.softwareAutoExposure.reset(self.getProperty("exposureTime"), self._maxPixelValue())
+            self.autoExposureInSoftware = bool(value)
+            return
+        if prop == "exposureTimeAuto":
+            self.autoExposureInSoftware = False # the camera does it itself
+
+    def _autoExpose(self, frame : np.ndarray):
+        """
+        Meter a frame that is about to be handed out, and adjust the exposure time of the running camera if needed (see pyunicam.autoexposure).
+        """
+        exposureTime = self.softwareAutoExposure.update(frame)
+        if exposureTime is None:
+            return
+        self._setPropertyDeep("exposureTime", exposureTime)
+        self.invalidatePropertyCache("exposureTime")
+        self.instrumentation.count("autoExposureAdjustments")
+
+    def _setExposureSequenceDeep(self, exposureTimes : list|None):
+        """
+        Make the camera cycle through exposureTimes (µs) frame by frame from the start of every capture, or stop doing so if exposureTimes is None. Raise NotImplementedError if the camera cannot do this, then setExposureSequence changes the exposure time after every frame instead.
+        """
+        raise NotImplementedError("no hardware exposure sequences")
+
+    def _maxPixelValue(self) -> int|None:
+        """
+        Largest pixel value the camera produces, if it is less than the maximum of the pixel type of its frames (like 12 bit frames in 16 bit integers). None if it is not.
+        """
+        return None
+
+    def _statsDeep(self) -> dict:
+        """
+        Statistics the camera class keeps itself, added to stats() under "camera".
+        """
+        return dict()
+
+    def _setROIDeep(self, roi : tuple|None):
+        """
+        Set the region of interest (x, y, width, height) in sensor pixels on the camera, or read out the full sensor if roi is None. Raise NotImplementedError if the camera cannot do this, then setROI crops on the computer instead.
+        """
+        raise NotImplementedError("no hardware region of interest")
+
+    def _setBinningDeep(self, factor : int):
+        """
+        Set the binning factor on the camera. Raise NotImplementedError if the camera cannot do this, then setBinning bins on the computer instead.
+        """
+        raise NotImplementedError("no hardware binning")
+
+    def _getImageInto(self, out : np.ndarray|None, timeout : float|None = None, meta : np.ndarray|None = None):
+        """
+        Write the next image of a capturing camera into out (used by grabFrames), and return out. If out is None, a new array is made. If meta is given, the metadata record of the image is filled in (see _stampFrame).
+        By default this just copies the result of getImages, children can override this to write straight from the camera buffer.
+        """
+        frame = self.getImages(timeout)
+        self._stampFrame(meta)
+        if out is None:
+            return frame
+        np.copyto(out, frame)
+        return out
+
+    def _getFrameInto(self, out : np.ndarray|None, timeout : float|None = None, meta : np.ndarray|None = None) -> np.ndarray:
+        """
+        Same as _getImageInto, but frames are converted on the computer where needed (see _convertFrame), and metered for the software auto exposure (see _autoExpose). Everything that hands out frames should go through here.
+        """
+        if not self._needsConversion():
+            out = self._getImageInto(out, timeout, meta)
+        else:
+            if meta is None and self.calibration is not None:
+                meta = self.calibrationMeta # the calibration needs the settings the frame was taken with
+            self.rawFrame = self._getImageInto(self.rawFrame, timeout, meta) # reset when properties change, see invalidatePropertyCache
+            start = self.instrumentation.start()
+            out = self._convertFrame(self.rawFrame, out, meta)
+            self.instrumentation.stop("convertTime", start)
+        if self.exposureSequence is not None and not self.exposureSequenceInHardware:
+            # set up the next frame of the sequence
+            self._setPropertyDeep("exposureTime", self.exposureSequence[self.exposureSequenceIndex % len(self.exposureSequence)])
+            self.propertyCache.pop("exposureTime", None)
+            self._forgetDependentProperties("exposureTime")
+        elif self.autoExposureInSoftware:
+            self._autoExpose(out)
+        return out
+
+    def _needsConversion(self) -> bool:
+        if self.calibration is not None or self.binner is not None or (self.roi is not None and not self.roiInHardware):
+            return True
+        return self.demosaicer is not None and bayerPattern(self.getProperty('pixelFormat')) is not None
+
+    def _convertFrame(self, frame : np.ndarray, out : np.ndarray|None = None, meta : np.ndarray|None = None) -> np.ndarray:
+        """
+        Do what the camera could not do itself: crop to the region of interest (see setROI), demosaic raw Bayer frames (see self.demosaicer) and bin (see setBinning), in that order, and finally dark and flat correct (see setCalibration), with the masters for the exposure time and gain in the metadata record meta of the frame (or the current settings if there is none). The result is written into out, or a new array if out is None, never into frame.
+        """
+        if self.calibration is not None:
+            if self.roi is not None and not self.roiInHardware or self.binner is not None or self.demosaicer is not None:
+                frame = self.uncalibratedFrame = self._convertPixels(frame, self.uncalibratedFrame)
+            settings = self._currentFrameSettings() if meta is None else (float(meta["exposureTime"]), float(meta["gain"]))
+            return self.calibration.correct(frame, out, *settings)
+        return self._convertPixels(frame, out)
+
+    def _convertPixels(self, frame : np.ndarray, out : np.ndarray|None = None) -> np.ndarray:
+        """
+        _convertFrame, except for the calibration.
+        """
+        pattern = bayerPattern(self.getProperty('pixelFormat'))
+        if self.roi is not None and not self.roiInHardware:
+            scale = self.binning if self.binningInHardware else 1
+            x, y, width, height = (v // scale for v in self.roi)
+            frame = cropFrame(frame, (x, y, width, height))
+            if pattern is not None:
+                pattern = shiftPattern(pattern, x, y)
+        if pattern is not None and self.demosaicer is not None:
+            if self.binner is None:
+                return self.demosaicer(frame, pattern, out)
+            if self.colourFrame is None or self.colourFrame.shape != self.demosaicer.outputShape(frame.shape):
+                self.colourFrame = None
+            frame = self.colourFrame = self.demosaicer(frame, pattern, self.colourFrame)
+        elif pattern is not None and self.binner is not None:
+            raise ValueError("binning raw Bayer frames on the computer would mix the colours, pass demosaic to the camera to convert them first")
+        if self.binner is not None:
+            return self.binner(frame, out)
+        if out is None:
+            return frame.copy()
+        np.copyto(out, frame)
+        return out
+
+    def _stampFrame(self, meta : np.ndarray|None, hardwareTimestamp : int = -1, hardwareFrameNumber : int = -1, exposureTime : float|None = None, gain : float|None = None):
+        """
+        Count a frame that just arrived and, if meta is given, fill in its metadata record. Call this as soon as the camera hands over the frame. Exposure time and gain default to the current settings of the camera.
+        """
+        frameNumber = self.frameCounter
+        self.frameCounter += 1
+        if self.exposureSequence is not None:
+            if exposureTime is None:
+                exposureTime = self.exposureSequence[self.exposureSequenceIndex % len(self.exposureSequence)]
+            self.exposureSequenceIndex += 1
+        if self.instrumentation.enabled and hardwareFrameNumber is not None and hardwareFrameNumber >= 0:
+            if self.lastHardwareFrameNumber >= 0 and hardwareFrameNumber > self.lastHardwareFrameNumber + 1:
+                self.instrumentation.count("droppedFrames", hardwareFrameNumber - self.lastHardwareFrameNumber - 1)
+            self.lastHardwareFrameNumber = hardwareFrameNumber
+        if meta is None:
+            return
+        meta["hostTimestamp"] = time.perf_counter()
+        meta["frameNumber"] = frameNumber
+        meta["hardwareTimestamp"] = -1 if hardwareTimestamp is None else hardwareTimestamp
+        meta["hardwareFrameNumber"] = -1 if hardwareFrameNumber is None else hardwareFrameNumber
+        settings = self._currentFrameSettings()
+        meta["exposureTime"] = settings[0] if exposureTime is None else exposureTime
+        meta["gain"] = settings[1] if gain is None else gain
+
+    def _currentFrameSettings(self) -> tuple[float, float]:
+        """
+        Exposure time and gain (or NaNs) in effect for the frame that came in last. Cheap, since it is only read from the camera again after properties changed.
+        """
+        if self.frameSettings is None:
+            self.frameSettings = (self._getPropertyOrNan("exposureTime"), self._getPropertyOrNan("gain"))
+        if self.exposureSequence is not None:
+            return self.exposureSequence[(self.exposureSequenceIndex - 1) % len(self.exposureSequence)], self.frameSettings[1]
+        return self.frameSettings
+
+    def _getPropertyOrNan(self, prop : str) -> float:
+        try:
+            return float(self.getProperty(prop))
+        except (NotImplementedError, AttributeError, TypeError, ValueError):
+            return np.nan
+
     def _getPropertyDeep(self, prop : str) -> str|bool|numbers.Number:
         """
         Function that actually gets a property when using getProperty. getProperty just does input checking etc, the real nitty-gritty happens here.
@@ -0,0 +1,68 @@
+"""
+Waiting for frames. Some SDKs (like the Thorlabs one) can only be polled: you ask for a frame and get nothing until it is there. How you wait in between is a trade-off between latency and CPU usage, so it is configurable per camera through cam.waitStrategy:
+
+- "spin": poll as fast as possible. Lowest latency, but keeps a full core busy for the whole exposure.
+- "spinThenYield": spin for a short while, then give up the CPU between polls.
+- "backoff": spin for a short while, then sleep between polls, doubling the sleep up to BACKOFF_MAX_SLEEP. Good latency for short exposures, nearly free for long ones. The default.
+- "blocking": let the SDK wait for the frame itself (like the Thorlabs SDK does with image_poll_timeout_ms), so the thread sleeps until the frame is there. Lowest CPU usage without extra latency. For polls that cannot block, this falls back to polling every BLOCKING_POLL_INTERVAL, which adds up to that interval of latency.
+
+SDKs that always block by themselves (like Spinnaker) do not need this, they always use their own blocking wait.
+"""
+import time
+
+WAIT_STRATEGIES = ("spin", "spinThenYield", "backoff", "blocking")
+SPIN_POLLS = 200 # polls before "spinThenYield" and "backoff" stop spinning
+BACKOFF_MIN_SLEEP = 20e-6 # s
+BACKOFF_MAX_SLEEP = 2e-3 # s
+BLOCKING_POLL_INTERVAL = 5e-3 # s, for "blocking" without a blockingPoll
+BLOCKING_MAX_WAIT = 1.0 # s, longest single wait of a blockingPoll, longer waits are split up
+
+def waitFor(poll, timeout : float|None = None, strategy : str = "backoff", stats = None, blockingPoll = None):
+    """
+    Call poll until it returns something other than None, and return that.
+
+    Parameters
+    ----------
+    poll : callable
+        Function without arguments, returning None while there is nothing (yet).
+    timeout : float | None, optional
+        Maximum time to wait (s), None waits forever.
+    strategy : str, optional
+        How to wait between polls, one of WAIT_STRATEGIES, by default "backoff".
+    stats : pyunicam.instrumentation.Instrumentation | None, optional
+        If given, the number of polls is recorded in it as "pollIterations".
+    blockingPoll : callable | None, optional
+        Same as poll, but waits by itself for at most the time (s) it is called with. Used for the "blocking" strategy, if given.
+
+    Raises
+    ------
+    TimeoutError
+        If poll kept returning None for longer than timeout.
+    """
+    if strategy not in WAIT_STRATEGIES:
+        raise ValueError(f"strategy must be one of {WAIT_STRATEGIES}, not '{strategy}'")
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    polls = 0
+    sleep = BACKOFF_MIN_SLEEP
+    while True:
+        if strategy == "blocking" and blockingPoll is not None:
+            wait = BLOCKING_MAX_WAIT if deadline is None else min(max(deadline - time.perf_counter(), 1e-3), BLOCKING_MAX_WAIT)
+            result = blockingPoll(wait)
+        else:
+            result = poll()
+        polls += 1
+        if result is not None:
+            if stats is not None:
+                stats.record("pollIterations", polls)
+            return result
+        if deadline is not None and time.perf_counter() > deadline:
+            raise TimeoutError(f"nothing arrived within {timeout} s")
+        if strategy == "spin" or polls < SPIN_POLLS and strategy != "blocking" or blockingPoll is not None and strategy == "blocking":
+            continue
+        if strategy == "spinThenYield":
+            time.sleep(0)
+        elif strategy == "backoff":
+            time.sleep(sleep)
+            sleep = min(sleep * 2, BACKOFF_MAX_SLEEP)
+        else:
+            time.sleep(BLOCKING_POLL_INTERVAL)
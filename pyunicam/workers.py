@@ -0,0 +1,205 @@
+"""
+Analyse frames in worker processes while capturing, so CPU-heavy analysis is not held back by the GIL. A FrameWorkerPool is a capture stage (see pyunicam.stages) that copies every frame into a slot of a block of shared memory, and only sends the slot number and metadata record to the workers. Frames are never pickled, so this keeps up with the camera even for large frames.
+
+Every slot has a reference count: it is taken by the frame copied into it and released once a worker is done with the frame, after which the slot is reused.
+"""
+import multiprocessing
+import queue
+import threading
+import traceback
+from collections import deque
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from .stages import CaptureStage
+
+WORKER_OVERFLOW_POLICIES = ("block", "dropNewest") # dropping the oldest frame is not possible, workers may be using it
+
+class FrameWorkerPool(CaptureStage):
+    def __init__(self, function, workers : int|None = None, slots : int|None = None, overflowPolicy : str = "dropNewest", context : str|None = None):
+        """
+        Call function(frame, meta) on every captured frame, in a pool of worker processes. Attach to a camera using cam.addStage and collect the return values with getResult.
+
+        Parameters
+        ----------
+        function : callable
+            Called in a worker process as function(frame, meta) for every frame, where meta is the metadata record of the frame (see pyunicam.metadata.FRAME_METADATA_DTYPE). Must be picklable, so a function defined at the top level of a module. frame lives in shared memory and is reused once function returns, so copy (parts of) it if you want to return it.
+        workers : int | None, optional
+            Number of worker processes. By default one per CPU core.
+        slots : int | None, optional
+            Number of frames that fit in shared memory, so the number of frames that can be in flight at once. By default twice the number of workers.
+        overflowPolicy : str, optional
+            What to do with a new frame if all slots are in use, see WORKER_OVERFLOW_POLICIES. "dropNewest" (default) skips the frame, counted in droppedFrames, "block" makes the acquisition thread wait for a free slot.
+        context : str | None, optional
+            multiprocessing start method ("spawn", "fork", "forkserver"), by default the default of the platform.
+
+        Example
+        ------
+        def brightness(frame, meta):
+            return frame.mean()
+
+        if __name__ == "__main__":
+            with connect_cam("thor") as cam:
+                pool = FrameWorkerPool(brightness, workers = 4)
+                cam.addStage(pool)
+                cam.startCapture()
+                for _ in range(1000):
+                    meta, result = pool.getResult()
+                cam.stopCapture()
+        """
+        if overflowPolicy not in WORKER_OVERFLOW_POLICIES:
+            raise ValueError(f"overflowPolicy should be one of {WORKER_OVERFLOW_POLICIES}, not {overflowPolicy}")
+        self.function = function
+        self.nWorkers = workers or multiprocessing.cpu_count()
+        self.nSlots = slots or 2 * self.nWorkers
+        self.overflowPolicy = overflowPolicy
+        self.context = multiprocessing.get_context(context)
+        self.droppedFrames = 0
+        self.results = queue.Queue() # (meta, result, error) tuples, filled by the collector thread
+        self._shm = None
+        self._processes = list()
+
+    def start(self, cam):
+        self.droppedFrames = 0
+        self.pending = 0 # frames sent to the workers of which the result is not collected yet
+        self._slotLock = threading.Condition()
+        self._refCounts = np.zeros(self.nSlots, dtype=int)
+        self._freeSlots = deque(range(self.nSlots))
+        self._tasks = self.context.Queue()
+        self._done = self.context.Queue()
+        ready = self.context.Barrier(self.nWorkers + 1)
+        resource_tracker.ensure_running() # so the workers share the tracker of this process, instead of each cleaning up the shared memory on exit
+        self._processes = [
+            self.context.Process(target=_workerMain, args=(self.function, self._tasks, self._done, ready), daemon=True)
+            for _ in range(self.nWorkers)
+        ]
+        for process in self._processes:
+            process.start()
+        ready.wait() # starting processes can take a while, don't drop the first frames because of that
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def process(self, frame : np.ndarray, meta : np.ndarray):
+        if self._shm is None or self._frames.shape[1:] != frame.shape or self._frames.dtype != frame.dtype:
+            self._allocate(frame)
+        slot = self._acquireSlot()
+        if slot is None:
+            self.droppedFrames += 1
+            return
+        self._frames[slot] = frame
+        with self._slotLock:
+            self.pending += 1
+        self._tasks.put((self._shm.name, frame.shape, frame.dtype.str, slot, np.copy(meta)))
+
+    def stop(self):
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join()
+        self._collector.join()
+        self._processes = list()
+        self._tasks.close()
+        self._done.close()
+        self._free()
+
+    def getResult(self, timeout : float|None = None) -> tuple[np.ndarray, object]:
+        """
+        Return the oldest uncollected result as a (metadata record, return value of function) tuple. Results come in the order the workers finish, which is not necessarily the order of the frames; use the frameNumber of the metadata to sort them.
+        Raises a TimeoutError if no result came in within timeout seconds, and a RuntimeError (with the traceback of the worker) if function failed on the frame.
+        """
+        try:
+            meta, result, error = self.results.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("no result came in from the workers in time")
+        if error is not None:
+            raise RuntimeError(f"analysis of frame {int(meta['frameNumber'])} failed in a worker:\n{error}")
+        return meta, result
+
+    def getResults(self) -> list:
+        """
+        Return all results that came in so far, see getResult.
+        """
+        results = list()
+        while True:
+            try:
+                results.append(self.getResult(timeout=0))
+            except TimeoutError:
+                return results
+
+    def _acquireSlot(self) -> int|None:
+        with self._slotLock:
+            if self.overflowPolicy == "block":
+                self._slotLock.wait_for(lambda: len(self._freeSlots) > 0)
+            elif len(self._freeSlots) == 0:
+                return None
+            slot = self._freeSlots.popleft()
+            self._refCounts[slot] += 1
+            return slot
+
+    def _releaseSlot(self, slot : int):
+        with self._slotLock:
+            self._refCounts[slot] -= 1
+            if self._refCounts[slot] == 0:
+                self._freeSlots.append(slot)
+                self._slotLock.notify()
+
+    def _collect(self):
+        """
+        Runs on a thread, collects the results from the workers and releases their slots, until all workers have stopped.
+        """
+        running = len(self._processes)
+        while running > 0:
+            message = self._done.get()
+            if message is None:
+                running -= 1
+                continue
+            slot, meta, result, error = message
+            self._releaseSlot(slot)
+            with self._slotLock:
+                self.pending -= 1
+            self.results.put((meta, result, error))
+
+    def _allocate(self, frame : np.ndarray):
+        """
+        Make the shared memory for the frames, when the first frame arrives (or when the frame size changed). Workers attach to it when they see a new name in their task.
+        """
+        if self._shm is not None:
+            with self._slotLock: # wait until the workers are done with the old frames
+                self._slotLock.wait_for(lambda: len(self._freeSlots) == self.nSlots)
+            self._free()
+        self._shm = shared_memory.SharedMemory(create=True, size=max(self.nSlots * frame.nbytes, 1))
+        self._frames = np.ndarray((self.nSlots,) + frame.shape, dtype=frame.dtype, buffer=self._shm.buf)
+
+    def _free(self):
+        if self._shm is None:
+            return
+        del self._frames
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+def _workerMain(function, tasks, done, ready):
+    """
+    Main loop of a worker process: attach to the shared memory, analyse frames until told to stop (by a None task).
+    """
+    ready.wait()
+    shm = None
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        name, shape, dtype, slot, meta = task
+        if shm is None or shm.name != name:
+            if shm is not None:
+                shm.close()
+            shm = shared_memory.SharedMemory(name=name)
+        dtype = np.dtype(dtype)
+        frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=slot * int(np.prod(shape)) * dtype.itemsize)
+        try:
+            result, error = function(frame, meta), None
+        except Exception:
+            result, error = None, traceback.format_exc()
+        del frame
+        done.put((slot, meta, result, error))
+    if shm is not None:
+        shm.close()
+    done.put(None)
@@ -0,0 +1,21 @@
+import pytest
+import pyunicam
+from pyunicam.simulators import Simulation
+
+@pytest.fixture
+def simulation():
+    """
+    Simulated Thorlabs and FLIR SDKs, with small frames and a short readout so the tests run fast.
+    """
+    with Simulation(width=320, height=240, readoutTime=0.002, seed=0) as sim:
+        yield sim
+
+@pytest.fixture(params=["dummy", "thor", "flir"])
+def cam(request, simulation):
+    """
+    A connected camera of every type that works without hardware.
+    """
+    options = {"seed" : 0} if request.param == "dummy" else {}
+    cam = pyunicam.connect_cam(request.param, **options)
+    yield cam
+    cam.close()
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import time
+import numpy as np
+import pyunicam
+
+def finishesWithin(function, seconds : float) -> bool:
+    """
+    Call function on another thread, and tell whether it returned in time (a hanging stopCapture would otherwise hang the tests).
+    """
+    thread = threading.Thread(target=function, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    return not thread.is_alive()
+
+def test_grabFrames_shapes_and_metadata(cam):
+    cam.startCapture()
+    try:
+        frames, meta = cam.grabFrames(5, timeout=2)
+    finally:
+        cam.stopCapture()
+    height, width = cam.getProperty("height"), cam.getProperty("width")
+    assert frames.shape[:3] == (5, height, width)
+    assert meta.dtype == pyunicam.FRAME_METADATA_DTYPE
+    assert list(meta["frameNumber"]) == [0, 1, 2, 3, 4]
+    assert np.all(np.diff(meta["hostTimestamp"]) > 0)
+    assert np.allclose(meta["exposureTime"], cam.getProperty("exposureTime"), rtol=0.01)
+
+def test_grabFrames_into_larger_out(cam):
+    cam.startCapture()
+    try:
+        first = cam.getImages(timeout=2)
+        out = np.zeros((4,) + first.shape, dtype=first.dtype)
+        frames, meta = cam.grabFrames(3, out=out, timeout=2)
+    finally:
+        cam.stopCapture()
+    assert frames.shape == (3,) + first.shape
+    assert np.shares_memory(frames, out)
+    assert len(meta) == 3
+
+def test_stopCapture_with_blocking_subscription():
+    cam = pyunicam.DummyCam(seed=0)
+    broadcaster = pyunicam.FrameBroadcaster()
+    subscription = broadcaster.subscribe(maxQueuedFrames=2, overflowPolicy="block")
+    cam.addStage(broadcaster)
+    cam.startCapture()
+    subscription.get(timeout=2)
+    time.sleep(0.3) # nobody reads, so the acquisition thread waits for room
+    assert finishesWithin(cam.stopCapture, 5)
+    cam.close()
+
+def test_stopCapture_with_blocking_async_capture():
+    cam = pyunicam.DummyCam(seed=0)
+    async def main():
+        async with cam.capture(maxQueuedFrames=2, overflowPolicy="block") as capture:
+            async for _ in capture:
+                await asyncio.sleep(0.3) # the queue fills up while we are away
+                break
+    assert finishesWithin(lambda: asyncio.run(main()), 5)
+    cam.close()
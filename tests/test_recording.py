@@ -0,0 +1,34 @@
+import time
+import numpy as np
+import pyunicam
+
+def record(cam, path : str, seconds : float = 0.3) -> pyunicam.Recorder:
+    recorder = pyunicam.Recorder(path)
+    cam.addStage(recorder)
+    cam.startCapture()
+    time.sleep(seconds)
+    cam.stopCapture()
+    cam.removeStage(recorder)
+    return recorder
+
+def test_recording_round_trip(cam, tmp_path):
+    path = str(tmp_path / "movie.npy")
+    recorder = record(cam, path)
+    frames, index = pyunicam.openRecording(path)
+    assert len(frames) == recorder.framesWritten > 0
+    assert frames.shape[1:3] == (cam.getProperty("height"), cam.getProperty("width"))
+    assert list(index["frameNumber"]) == list(range(len(frames)))
+    assert np.all(np.diff(index["hostTimestamp"]) > 0)
+
+def test_replay_gives_back_the_recording(tmp_path):
+    path = str(tmp_path / "movie.npy")
+    with pyunicam.DummyCam(seed=0) as cam:
+        record(cam, path)
+    frames, index = pyunicam.openRecording(path)
+    with pyunicam.ReplayCam(path, rate="max") as replay:
+        replay.startCapture()
+        replayed, meta = replay.grabFrames(len(frames), timeout=2)
+        replay.stopCapture()
+    assert np.array_equal(replayed, frames)
+    assert np.array_equal(meta["hardwareTimestamp"], index["hardwareTimestamp"])
+    assert np.array_equal(meta["exposureTime"], index["exposureTime"])
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+import pyunicam
+
+@pytest.fixture
+def thor(simulation):
+    cam = pyunicam.connect_cam("thor")
+    cam.setProperty("exposureTime", 2000)
+    yield cam
+    cam.close()
+
+@pytest.mark.filterwarnings("ignore:Since framerate setting") # the simulated camera keeps up fine
+def test_framerate_schedule(thor):
+    thor.setProperty("acquisitionFramerate", 20)
+    thor.startCapture()
+    try:
+        _, meta = thor.grabFrames(10, timeout=1)
+    finally:
+        thor.stopCapture()
+    intervals = np.diff(meta["hardwareTimestamp"]) / 1e9
+    assert np.median(intervals) == pytest.approx(1 / 20, rel=0.1)
+    assert intervals.min() > 0.5 / 20 # no bursts
+
+def test_exposure_times_reach_the_sdk_as_int(thor):
+    from thorlabs_tsi_sdk.tl_camera import TLCameraError # the simulated one
+    thor.setProperty("exposureTime", 1234.6)
+    assert thor.camConnection.exposure_time_us == 1235
+    with pytest.raises(TLCameraError):
+        thor.camConnection.exposure_time_us = 1234.6 # refused like by the real SDK